@@ -1,18 +1,16 @@
 """Init module."""
+import argparse
 import asyncio
 import logging
 import os
 import socket
 import sys
 
-from bumper.db import (
-    bot_reset_connection_status,
-    client_reset_connection_status,
-    revoke_expired_oauths,
-    revoke_expired_tokens,
-)
+from bumper import db
+from bumper.db import aio as db_aio
 from bumper.mqtt.helper_bot import HelperBot
 from bumper.mqtt.server import MQTTServer
+from bumper.mqtt.shard import ShardedMQTTServer
 from bumper.util import get_logger, log_to_stdout
 from bumper.web.server import WebServer, WebserverBinding
 from bumper.xmppserver import XMPPServer
@@ -55,11 +53,43 @@ bumper_announce_ip = os.environ.get("BUMPER_ANNOUNCE_IP") or bumper_listen
 bumper_debug = strtobool(os.environ.get("BUMPER_DEBUG")) or False
 use_auth = False
 token_validity_seconds = 3600  # 1 hour
+# Least recently used tokens of a user above the limit are revoked, 0 to disable.
+# Disabled by default, as all devices without a user log in as tmpuser.
+token_limit_per_user = int(os.environ.get("BUMPER_TOKENS_PER_USER") or 0)
+# Signed tokens are verified without storage access, see bumper.db.signed_tokens
+# pylint: disable-next=invalid-name
+signed_tokens = strtobool(os.environ.get("BUMPER_SIGNED_TOKENS")) or False
+token_secret = os.environ.get("BUMPER_TOKEN_SECRET") or ""
 oauth_validity_days = 15
 bumper_proxy_mqtt = strtobool(os.environ.get("BUMPER_PROXY_MQTT")) or False
 bumper_proxy_web = strtobool(os.environ.get("BUMPER_PROXY_WEB")) or False
-
-mqtt_server: MQTTServer
+# Admission control of the MQTT and XMPP listeners, see bumper.admission
+max_handshakes = int(os.environ.get("BUMPER_MAX_HANDSHAKES") or 64)
+max_handshakes_waiting = int(os.environ.get("BUMPER_HANDSHAKE_QUEUE") or 256)
+connect_rate = float(os.environ.get("BUMPER_CONNECT_RATE") or 10)  # per second and ip
+connect_burst = int(os.environ.get("BUMPER_CONNECT_BURST") or 50)
+# Seconds a bot state event answers getters, 0 to always ask the bot
+bot_state_max_age = float(os.environ.get("BUMPER_STATE_MAX_AGE") or 300)
+# Unchanged bot events are sent to each app at most once per interval (seconds), 0 all
+mqtt_dedup_interval = float(os.environ.get("BUMPER_DEDUP_INTERVAL") or 0)
+# Number of MQTT broker processes, see bumper.mqtt.shard. 0 runs it in this process
+mqtt_workers = int(os.environ.get("BUMPER_MQTT_WORKERS") or 0)
+# Restrict bots and apps to their own topics, see bumper.mqtt.acl
+# pylint: disable-next=invalid-name
+mqtt_acl = strtobool(os.environ.get("BUMPER_MQTT_ACL")) or False
+# MQTT sessions stopped concurrently on shutdown and seconds until the rest is aborted
+mqtt_stop_parallel = int(os.environ.get("BUMPER_STOP_PARALLEL") or 32)
+mqtt_stop_timeout = float(os.environ.get("BUMPER_STOP_TIMEOUT") or 10)
+
+# Database
+db_backend = os.environ.get("DB_BACKEND") or "tinydb"  # tinydb or sqlite
+db_flush_interval = float(os.environ.get("DB_FLUSH_INTERVAL") or 1.0)  # seconds
+db_flush_threshold = int(os.environ.get("DB_FLUSH_THRESHOLD") or 100)
+# pylint: disable-next=invalid-name
+db_fsync = strtobool(os.environ.get("DB_FSYNC")) or False
+db_serializer = os.environ.get("DB_SERIALIZER") or ""  # json, orjson or fastest
+
+mqtt_server: MQTTServer | ShardedMQTTServer
 mqtt_helperbot: HelperBot
 web_server: WebServer
 xmpp_server: XMPPServer
@@ -80,10 +110,6 @@ web_server_bindings = [
 
 async def start() -> None:
     """Start bumper."""
-    # Reset xmpp/mqtt to false in database for bots and clients
-    bot_reset_connection_status()
-    client_reset_connection_status()
-
     try:
         loop = asyncio.get_event_loop()
     except:  # noqa: E722
@@ -115,6 +141,7 @@ async def start() -> None:
         return
 
     bumperlog.info("Starting Bumper")
+    db.hold()
 
     if bumper_proxy_mqtt:
         bumperlog.info("Proxy MQTT Enabled")
@@ -122,7 +149,10 @@ async def start() -> None:
         bumperlog.info("Proxy Web Enabled")
 
     global mqtt_server
-    mqtt_server = MQTTServer(bumper_listen, mqtt_listen_port)
+    if mqtt_workers > 1:
+        mqtt_server = ShardedMQTTServer(bumper_listen, mqtt_listen_port, mqtt_workers)
+    else:
+        mqtt_server = MQTTServer(bumper_listen, mqtt_listen_port)
     global mqtt_helperbot
     mqtt_helperbot = HelperBot(bumper_listen, mqtt_listen_port)
     global web_server
@@ -154,8 +184,8 @@ async def start() -> None:
 
 async def maintenance() -> None:
     """Run maintenance."""
-    revoke_expired_tokens()
-    revoke_expired_oauths()
+    await db_aio.revoke_expired_tokens()
+    await db_aio.revoke_expired_oauths()
 
 
 async def shutdown() -> None:
@@ -180,20 +210,61 @@ async def shutdown() -> None:
                 xmpp_server.server.close()
             await xmpp_server.server.wait_closed()
 
+        await db_aio.close()
+        db.release()
+
         bumperlog.info("Shutdown complete")
     except asyncio.CancelledError:
         bumperlog.info("Coroutine canceled")
 
 
+def snapshot(argv: list[str]) -> int:
+    """Write a snapshot of the database without starting the servers.
+
+    Return the exit code.
+    """
+    parser = argparse.ArgumentParser(prog="bumper snapshot")
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="snapshot file, defaults to the backups directory in the data directory",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="purge expired entries and compact the database",
+    )
+    args = parser.parse_args(args=argv)
+
+    if db.is_held():
+        bumperlog.error(
+            "Database is held by the running server, request /db/snapshot from it"
+        )
+        return 1
+
+    try:
+        result = db.snapshot(args.output, args.compact)
+    except Exception:  # pylint: disable=broad-except
+        bumperlog.exception("Database snapshot failed")
+        return 1
+    finally:
+        db.close()
+
+    bumperlog.info("Database snapshot written: %s", result)
+    return 0
+
+
 def main(argv: None | list[str] = None) -> None:
     """Start everything."""
-    import argparse
-
     global bumper_debug
     global bumper_listen
     global bumper_announce_ip
     if not argv:
         argv = sys.argv[1:]  # Set argv to argv[1:] if not passed into main
+    if argv and argv[0] == "snapshot":
+        sys.exit(snapshot(argv[1:]))
+
     try:
 
         if not (
@@ -0,0 +1,112 @@
+"""Admission control module.
+
+Limits the connection rate per source address and the number of concurrent
+handshakes, so a reconnect storm (e.g. after a restart) is worked off at a
+steady pace instead of overloading the server. Connections above the limits
+are rejected immediately with a hint, when to retry.
+"""
+import asyncio
+import time
+from collections import Counter
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from cachetools import TTLCache
+
+import bumper
+
+_MAX_SOURCES = 10000
+_DURATION_WEIGHT = 0.2  # Weight of the latest handshake in the average duration
+
+
+class AdmissionRejected(Exception):
+    """Connection rejected by admission control."""
+
+    def __init__(self, reason: str, retry_after: float) -> None:
+        super().__init__(f"{reason}, retry after {retry_after:.1f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Admission:
+    """Admission control of a listener.
+
+    rate and burst configure the token bucket of each source address, a rate
+    of 0 disables it. At most max_handshakes run concurrently and at most
+    max_waiting wait for a free slot.
+    """
+
+    def __init__(
+        self,
+        max_handshakes: int = 64,
+        max_waiting: int = 256,
+        rate: float = 10,
+        burst: int = 50,
+    ) -> None:
+        self._max_handshakes = max_handshakes
+        self._max_waiting = max_waiting
+        self._rate = rate
+        self._burst = burst
+        # A bucket is full again after burst / rate seconds, then it can be dropped
+        self._buckets: TTLCache[str, tuple[float, float]] = TTLCache(
+            maxsize=_MAX_SOURCES, ttl=burst / rate if rate > 0 else 1
+        )
+        self._semaphore = asyncio.Semaphore(max_handshakes)
+        self._waiting = 0
+        self._duration = 0.1  # Moving average of the handshake duration in seconds
+        self.stats: Counter[str] = Counter()
+
+    def admit(self, source: str) -> None:
+        """Take a token of the source's bucket or raise AdmissionRejected."""
+        if self._rate <= 0:
+            return
+        now = time.monotonic()
+        (tokens, updated) = self._buckets.get(source, (float(self._burst), now))
+        tokens = min(float(self._burst), tokens + (now - updated) * self._rate)
+        if tokens < 1:
+            self._buckets[source] = (tokens, now)
+            self._reject("rate")
+            raise AdmissionRejected(
+                f"Too many connections from {source}", (1 - tokens) / self._rate
+            )
+        self._buckets[source] = (tokens - 1, now)
+
+    @asynccontextmanager
+    async def handshake(self) -> AsyncIterator[None]:
+        """Hold a handshake slot. Raise AdmissionRejected, if too many are waiting."""
+        if self._semaphore.locked() and self._waiting >= self._max_waiting:
+            self._reject("busy")
+            # Estimated time until the queue is worked off
+            raise AdmissionRejected(
+                "Too many pending handshakes",
+                self._duration * self._waiting / self._max_handshakes,
+            )
+
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        start = time.monotonic()
+        try:
+            self.stats["admitted"] += 1
+            yield
+        finally:
+            self._semaphore.release()
+            self._duration += _DURATION_WEIGHT * (
+                time.monotonic() - start - self._duration
+            )
+
+    def _reject(self, reason: str) -> None:
+        self.stats[f"rejected_{reason}"] += 1
+
+
+def create_admission() -> Admission:
+    """Create admission control with the configured limits."""
+    return Admission(
+        max_handshakes=bumper.max_handshakes,
+        max_waiting=bumper.max_handshakes_waiting,
+        rate=bumper.connect_rate,
+        burst=bumper.connect_burst,
+    )
@@ -0,0 +1,178 @@
+"""Bot state module.
+
+Keeps the last known state of each bot in memory, as reported by its events
+(MQTT atr broadcasts, XMPP ctl events) and its responses to getters. Getters,
+whose answer is fully covered by an event (e.g. getBattery by onBattery), can
+be answered from here without a round trip to the bot.
+"""
+import json
+from dataclasses import dataclass
+from typing import Any
+
+import bumper
+from bumper import presence
+from bumper.mqtt.message import ATR, P2P, Payload, Topic
+from bumper.util import get_current_time_as_millis
+
+JSON = "j"
+XML = "x"
+
+# Getters, which have no arguments and whose response data equals the data of
+# the event on<Name>
+_CACHEABLE_GETTERS = frozenset(
+    (
+        "getBattery",
+        "getChargeState",
+        "getCleanInfo",
+        "getCleanInfo_V2",
+        "getError",
+        "getSpeed",
+        "getStats",
+        "getWaterInfo",
+    )
+)
+
+
+@dataclass(frozen=True, slots=True)
+class BotState:
+    """Last event of a bot."""
+
+    name: str
+    payload_type: str  # JSON or XML
+    payload: str
+    updated: int  # epoch millis
+
+    def asdict(self) -> dict[str, Any]:
+        """Return state as dict. JSON payloads are decoded."""
+        payload: Any = self.payload
+        if self.payload_type == JSON:
+            try:
+                payload = json.loads(self.payload)
+            except ValueError:
+                pass
+        return {
+            "name": self.name,
+            "payloadType": self.payload_type,
+            "payload": payload,
+            "updated": self.updated,
+        }
+
+
+_states: dict[str, dict[str, BotState]] = {}
+_stats = {"hits": 0, "misses": 0}
+
+
+def update(did: str, name: str, payload_type: str, payload: str) -> bool:
+    """Store the latest event of a bot. Return False, if it is unchanged."""
+    states = _states.setdefault(did, {})
+    last = states.get(name)
+    states[name] = BotState(name, payload_type, payload, get_current_time_as_millis())
+    return last is None or (last.payload_type, last.payload) != (payload_type, payload)
+
+
+def update_from_response(did: str, name: str, payload_type: str, payload: str) -> None:
+    """Store the response of a bot to a cacheable getter as its event."""
+    if name not in _CACHEABLE_GETTERS or payload_type != JSON:
+        return
+    try:
+        response = json.loads(payload)
+        if response["body"]["code"] != 0:
+            return
+        data = response["body"]["data"]
+    except (ValueError, KeyError, TypeError):
+        return
+    event = {"header": response.get("header", {}), "body": {"data": data}}
+    update(did, f"on{name[3:]}", payload_type, json.dumps(event))
+
+
+def update_from_mqtt(topic: Topic, payload: Payload, client_id: str) -> bool:
+    """Store event or getter response of a MQTT message, if sent by the bot itself.
+
+    Return False for an event, which is equal to the last one of the bot.
+    """
+    if not client_id.startswith(f"{topic.sender_id}@"):
+        return True
+    if topic.kind == ATR:
+        return update(topic.sender_id, topic.name, topic.payload_type, payload.text)
+    if topic.kind == P2P and topic.direction == "p":
+        update_from_response(
+            topic.sender_id, topic.name, topic.payload_type, payload.text
+        )
+    return True
+
+
+def get(did: str, name: str, max_age: float | None = None) -> BotState | None:
+    """Return the latest event of a bot, if it isn't older than max_age seconds."""
+    state = _states.get(did, {}).get(name)
+    if state is None:
+        return None
+    if max_age is None:
+        max_age = bumper.bot_state_max_age
+    if get_current_time_as_millis() - state.updated > max_age * 1000:
+        return None
+    return state
+
+
+def get_all(did: str) -> dict[str, BotState]:
+    """Return all known events of a bot by name."""
+    return dict(_states.get(did, {}))
+
+
+def remove(did: str) -> None:
+    """Forget the state of a bot."""
+    _states.pop(did, None)
+
+
+def clear() -> None:
+    """Forget all states."""
+    _states.clear()
+    _stats.update(hits=0, misses=0)
+
+
+def stats() -> dict[str, int]:
+    """Return number of bots, events and getters answered from the cache."""
+    return {
+        "bots": len(_states),
+        "events": sum(len(states) for states in _states.values()),
+        **_stats,
+    }
+
+
+def getter_response(command: dict[str, Any], request_id: str) -> dict[str, Any] | None:
+    """Answer a devmanager getter from the cache.
+
+    Return the response as the bot would have sent it, None if the state is
+    unknown or outdated. A max age of 0 disables answering from the cache.
+    """
+    name = command.get("cmdName", "")
+    if (
+        bumper.bot_state_max_age <= 0
+        or name not in _CACHEABLE_GETTERS
+        or command.get("payloadType") != JSON
+    ):
+        return None
+
+    state = get(command.get("toId", ""), f"on{name[3:]}")
+    event = state.asdict()["payload"] if state else None
+    if not isinstance(event, dict) or "data" not in event.get("body", {}):
+        _stats["misses"] += 1
+        return None
+
+    _stats["hits"] += 1
+    return {
+        "id": request_id,
+        "ret": "ok",
+        "resp": {
+            "header": event.get("header", {}),
+            "body": {"code": 0, "msg": "ok", "data": event["body"]["data"]},
+        },
+    }
+
+
+def _on_presence(kind: str, key: str, _: str, connected: bool) -> None:
+    # The state of a disconnected bot is outdated
+    if kind == presence.BOT and not connected and not presence.bot_is_connected(key):
+        remove(key)
+
+
+presence.subscribe(_on_presence)
@@ -0,0 +1,803 @@
+"""Database module."""
+import atexit
+import fcntl
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import IO, Any
+
+from tinydb.table import Document
+
+import bumper
+from bumper.models import BumperToken, BumperUser, OAuth, VacBotClient, VacBotDevice
+from bumper.util import convert_to_millis, get_current_time_as_millis, get_logger
+
+from . import signed_tokens
+from .expiry import ExpiryIndex
+from .repository import Repository, normalize_userid
+from .serializer import get_serializer
+from .sqlite_repository import SQLiteRepository, migrate_json
+from .tinydb_repository import TinyDBRepository
+
+_LOGGER = get_logger("db")
+
+_JSON_DB_NAME = "bumper.db"
+_SQLITE_DB_NAME = "bumper.sqlite"
+
+
+def _db_file() -> str:
+    return os.environ.get("DB_FILE") or _os_db_path()
+
+
+def _os_db_path() -> str:  # createdir=True):
+    if bumper.db_backend == "sqlite":
+        return os.path.join(bumper.data_dir, _SQLITE_DB_NAME)
+    return os.path.join(bumper.data_dir, _JSON_DB_NAME)
+
+
+def _open_repository() -> Repository:
+    path = _db_file()
+    if bumper.db_backend == "tinydb":
+        return TinyDBRepository(
+            path,
+            flush_interval=bumper.db_flush_interval,
+            flush_threshold=bumper.db_flush_threshold,
+            fsync=bumper.db_fsync,
+            serializer=get_serializer(bumper.db_serializer),
+        )
+
+    if bumper.db_backend == "sqlite":
+        repository = SQLiteRepository(path)
+        json_file = os.path.join(bumper.data_dir, _JSON_DB_NAME)
+        if os.path.exists(json_file):
+            # Migration of an existing TinyDB database, until it completed once
+            migrate_json(repository, json_file)
+        return repository
+
+    raise ValueError(f"Unknown database backend: {bumper.db_backend}")
+
+
+# Tables with expiring documents: index, key field and expiration field. All
+# timestamps are stored as epoch millis (UTC).
+_EXPIRING_TABLES = {
+    "tokens": ("token", "token", "expiration"),
+    "oauth": ("userid", "userId", "expire_at"),
+    "revoked": ("token", "token", "expiration"),
+}
+
+_db: Repository | None = None
+_expiry: dict[str, ExpiryIndex] | None = None
+# Revoked signed tokens, loaded once from the revoked table
+_denied: set[str] | None = None
+# Prefix of the deny list entries of signed tokens, whose authcode is revoked
+_AUTHCODE_DENIED = "authcode:"
+# Evictions and reuse hits of stored tokens, revocations of tokens and authcodes
+_token_stats: Counter[str] = Counter()
+# Called with the deny list entry or "" on every revocation
+_revocation_callbacks: list[Callable[[str], None]] = []
+# Guards opening and closing, as the database is also used from aio's thread
+_db_lock = threading.RLock()
+
+
+def _db_get() -> Repository:
+    global _db  # pylint: disable=global-statement
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                repository = _open_repository()
+                _migrate_timestamps(repository)
+                _db = repository
+
+    return _db
+
+
+# Timestamps, which older versions stored as datetime strings. True if the
+# string was in UTC, False if in local time.
+_LEGACY_TIMESTAMPS = {
+    "tokens": {"expiration": False, "last_used": False},
+    "oauth": {"expire_at": True},
+    "revoked": {"expiration": False},
+}
+
+
+def _legacy_to_millis(value: str, utc: bool) -> int:
+    if not value:
+        return 0
+    parsed = datetime.fromisoformat(value)
+    if utc:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return convert_to_millis(parsed.timestamp())
+
+
+def _migrate_timestamps(repository: Repository) -> None:
+    """Convert datetime strings to epoch millis. A no-op for migrated databases."""
+    count = 0
+    for table, fields in _LEGACY_TIMESTAMPS.items():
+        for doc in repository.all(table):
+            changes = {
+                field: _legacy_to_millis(doc[field], utc)
+                for field, utc in fields.items()
+                if isinstance(doc.get(field), str)
+            }
+            if changes:
+                repository.update(table, [doc.doc_id], changes)
+                count += 1
+
+    if count:
+        _LOGGER.info(f"Migrated timestamps of {count} document(s) to epoch millis")
+
+
+def _expiry_get(table: str) -> ExpiryIndex:
+    global _expiry  # pylint: disable=global-statement
+    if _expiry is None:
+        with _db_lock:
+            if _expiry is None:
+                # Built once with a full scan, afterwards maintained on every insert
+                expiry = {}
+                for name, (_, key_field, _) in _EXPIRING_TABLES.items():
+                    expiry[name] = ExpiryIndex()
+                    for doc in _db_get().all(name):
+                        expiry[name].push(_expiration_of(name, doc), doc[key_field])
+                _expiry = expiry
+
+    return _expiry[table]
+
+
+def _expiration_of(table: str, doc: dict[str, Any]) -> int:
+    return int(doc[_EXPIRING_TABLES[table][2]])
+
+
+def _token_expiration() -> int:
+    return get_current_time_as_millis() + convert_to_millis(
+        bumper.token_validity_seconds
+    )
+
+
+def _insert_expiring(table: str, doc: dict[str, Any]) -> None:
+    _db_get().insert(table, doc)
+    _push_expiry(table, _expiration_of(table, doc), doc[_EXPIRING_TABLES[table][1]])
+
+
+def _push_expiry(table: str, expiration: int, key: str) -> None:
+    # Superseded entries are skipped, when they become due
+    if _expiry is not None:
+        _expiry[table].push(expiration, key)
+
+
+def _revoke_due(table: str) -> None:
+    """Remove the documents, which are due according to the expiry index."""
+    index = _EXPIRING_TABLES[table][0]
+    now = get_current_time_as_millis()
+    doc_ids = set()
+    for key in _expiry_get(table).pop_due(now):
+        for doc in _db_get().lookup(table, index, key):
+            # The entry may be stale, if the document was renewed meanwhile
+            if _expiration_of(table, doc) <= now:
+                _LOGGER.debug(f"Removing {table} entry {key} due to expiration")
+                doc_ids.add(doc.doc_id)
+                if table == "revoked" and _denied is not None:
+                    _denied.discard(key)
+
+    if doc_ids:
+        _db_get().remove(table, doc_ids)
+        if table == "tokens":
+            _revoked()
+
+
+def flush() -> None:
+    """Write all pending changes to the database file."""
+    if _db is not None:
+        _db.flush()
+
+
+@contextmanager
+def transaction() -> Iterator[None]:
+    """Run all database calls of the block as one unit of work, committed once.
+
+    Blocks other threads from the database meanwhile, so keep it short.
+    """
+    with _db_get().transaction():
+        yield
+
+
+def _backup_path() -> str:
+    name, ext = os.path.splitext(os.path.basename(_db_file()))
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return os.path.join(bumper.data_dir, "backups", f"{name}-{timestamp}{ext}")
+
+
+def snapshot(path: str | None = None, compact: bool = False) -> dict[str, Any]:
+    """Write a point-in-time copy of the database. Return path, size and duration.
+
+    With compact, expired entries are purged and the store is compacted first.
+    """
+    start = time.perf_counter()
+    if compact:
+        for table in _EXPIRING_TABLES:
+            _revoke_due(table)
+        _db_get().compact()
+
+    path = path or _backup_path()
+    _db_get().backup(path)
+    seconds = time.perf_counter() - start
+    _LOGGER.info(f"Wrote snapshot {path} in {seconds * 1000:.1f} ms")
+    return {
+        "path": path,
+        "size": os.path.getsize(path),
+        "compacted": compact,
+        "duration_ms": round(seconds * 1000, 2),
+    }
+
+
+def close() -> None:
+    """Flush and close the database. It will be reopened on next access."""
+    global _db, _expiry, _denied  # pylint: disable=global-statement
+    with _db_lock:
+        if _db is not None:
+            _db.close()
+            _db = None
+            _expiry = None
+            _denied = None
+
+
+atexit.register(close)
+
+# Lock file held by the serving process, see hold
+_server_lock: IO[bytes] | None = None
+
+
+def _lock_file() -> str:
+    return f"{_db_file()}.lock"
+
+
+def hold() -> None:
+    """Hold the database for this serving process until release or exit.
+
+    Other processes, like bumper snapshot, must not open it meanwhile, as the
+    server keeps the TinyDB data in memory and overwrites their changes.
+    """
+    global _server_lock  # pylint: disable=global-statement
+    if _server_lock is not None:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(_lock_file())), exist_ok=True)
+    lock = open(_lock_file(), "ab")  # pylint: disable=consider-using-with
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock.close()
+        _LOGGER.warning(f"The database {_db_file()} is held by another process")
+        return
+    _server_lock = lock
+
+
+def release() -> None:
+    """Release the database held by hold."""
+    global _server_lock  # pylint: disable=global-statement
+    if _server_lock is not None:
+        _server_lock.close()  # Closing releases the lock
+        _server_lock = None
+
+
+def is_held() -> bool:
+    """Return True, if a serving process holds the database."""
+    if not os.path.exists(_lock_file()):
+        return False
+    with open(_lock_file(), "ab") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        fcntl.flock(lock, fcntl.LOCK_UN)
+    return False
+
+
+def user_add(userid: str) -> None:
+    """Add user."""
+    newuser = BumperUser(userid)
+
+    user = user_get(userid)
+    if not user:
+        _LOGGER.info(f"Adding new user with userid: {newuser.userid}")
+        _user_full_upsert(newuser.asdict())
+
+
+def user_get(userid: str) -> None | BumperUser:
+    """Get user."""
+    doc = _db_get().get_by("users", "userid", userid)
+    return BumperUser.from_row(doc) if doc else None
+
+
+def user_by_device_id(deviceid: str) -> None | BumperUser:
+    """Get user by device id."""
+    doc = _db_get().get_by("users", "devices", deviceid)
+    return BumperUser.from_row(doc) if doc else None
+
+
+def _user_full_upsert(user: dict[str, Any]) -> None:
+    _db_get().upsert_by("users", "userid", user["userid"], user)
+
+
+def user_add_device(userid: str, devid: str) -> None:
+    """Add device to user."""
+    user = _db_get().get_by("users", "userid", userid)
+    if user:
+        userdevices = list(user["devices"])
+        if devid not in userdevices:
+            userdevices.append(devid)
+
+    _db_get().upsert_by("users", "userid", userid, {"devices": userdevices})
+
+
+def user_remove_device(userid: str, devid: str) -> None:
+    """Remove device from user."""
+    user = _db_get().get_by("users", "userid", userid)
+    if user:
+        userdevices = list(user["devices"])
+        if devid in userdevices:
+            userdevices.remove(devid)
+
+    _db_get().upsert_by("users", "userid", userid, {"devices": userdevices})
+
+
+def user_add_bot(userid: str, did: str) -> None:
+    """Add bot to user."""
+    user = _db_get().get_by("users", "userid", userid)
+    if user:
+        userbots = list(user["bots"])
+        if did not in userbots:
+            userbots.append(did)
+
+    _db_get().upsert_by("users", "userid", userid, {"bots": userbots})
+
+
+def user_add_bots(userid: str, dids: Iterable[str]) -> None:
+    """Add bots to user with one write."""
+    user = _db_get().get_by("users", "userid", userid)
+    if user:
+        userbots = list(user["bots"])
+        new_bots = [did for did in dict.fromkeys(dids) if did not in userbots]
+        if new_bots:
+            _db_get().update("users", [user.doc_id], {"bots": userbots + new_bots})
+
+
+def user_remove_bot(userid: str, did: str) -> None:
+    """Remove bot from user."""
+    user = _db_get().get_by("users", "userid", userid)
+    if user:
+        userbots = list(user["bots"])
+        if did in userbots:
+            userbots.remove(did)
+
+    _db_get().upsert_by("users", "userid", userid, {"bots": userbots})
+
+
+def _user_token_docs(userid: str) -> list[Document]:
+    tokens = _db_get().lookup("tokens", "userid", normalize_userid(userid))
+    return [token for token in tokens if token["userid"] == userid]
+
+
+def _user_token_doc(userid: str, token: str) -> Document | None:
+    for tmptoken in _db_get().lookup("tokens", "token", token):
+        if tmptoken["userid"] == userid:
+            return tmptoken
+    return None
+
+
+def _denied_get() -> set[str]:
+    global _denied  # pylint: disable=global-statement
+    if _denied is None:
+        with _db_lock:
+            if _denied is None:
+                _denied = {doc["token"] for doc in _db_get().all("revoked")}
+    return _denied
+
+
+def signed_tokens_ready() -> bool:
+    """Return True, if tokens can be checked without any storage access."""
+    return bumper.signed_tokens and _denied is not None
+
+
+def _signed_token_get(token: str, authcode: str = "") -> BumperToken | None:
+    """Return the signed token, if it is valid and not revoked."""
+    result = signed_tokens.verify_token(token, get_current_time_as_millis())
+    denied = _denied_get()
+    if result is None or token in denied:
+        return None
+    if authcode and _AUTHCODE_DENIED + token in denied:
+        return None
+    userid, expires_at = result
+    return BumperToken(userid, token, expires_at, authcode)
+
+
+def _signed_authcode_get(authcode: str) -> BumperToken | None:
+    token = signed_tokens.token_of_authcode(authcode)
+    return _signed_token_get(token, authcode) if token else None
+
+
+def user_create_token(userid: str, devid: str = "") -> str:
+    """Create and return a new token for given user.
+
+    A still valid token of the same device is reused and renewed instead.
+    """
+    if bumper.signed_tokens:
+        return signed_tokens.create_token(userid, _token_expiration())
+
+    if devid:
+        now = get_current_time_as_millis()
+        for doc in _user_token_docs(userid):
+            if doc.get("devid") == devid and doc["expiration"] > now:
+                _token_stats["reuse_hits"] += 1
+                # A login renews the validity of the reused token
+                expiration = _token_expiration()
+                _db_get().update(
+                    "tokens",
+                    [doc.doc_id],
+                    {"last_used": now, "expiration": expiration},
+                )
+                _push_expiry("tokens", expiration, doc["token"])
+                return str(doc["token"])
+
+    token = uuid.uuid4().hex
+    user_add_token(userid, token, devid)
+    return token
+
+
+def user_create_authcode(userid: str, token: str, countrycode: str) -> str:
+    """Create and return a new authcode for the token of given user."""
+    if bumper.signed_tokens:
+        return signed_tokens.create_authcode(countrycode, token)
+
+    authcode = f"{countrycode}_{uuid.uuid4().hex}"
+    user_add_authcode(userid, token, authcode)
+    return authcode
+
+
+def user_get_tokens(userid: str) -> list[BumperToken]:
+    """Get all tokens by given user."""
+    return [BumperToken.from_row(doc) for doc in _user_token_docs(userid)]
+
+
+def user_get_token(userid: str, token: str) -> BumperToken | None:
+    """Get token by user."""
+    if bumper.signed_tokens:
+        signed = _signed_token_get(token)
+        return signed if signed and signed.userid == userid else None
+
+    doc = _user_token_doc(userid, token)
+    return BumperToken.from_row(doc) if doc else None
+
+
+def user_add_token(userid: str, token: str, devid: str = "") -> None:
+    """Ass token for given user."""
+    tmptoken = _user_token_doc(userid, token)
+    if not tmptoken:
+        _LOGGER.debug(f"Adding token {token} for userid {userid}")
+        _insert_expiring(
+            "tokens",
+            BumperToken(
+                userid,
+                token,
+                _token_expiration(),
+                devid=devid,
+                last_used=get_current_time_as_millis(),
+            ).asdict(),
+        )
+        _evict_tokens(userid)
+
+
+def _evict_tokens(userid: str) -> None:
+    """Revoke the least recently used tokens of the user above the limit."""
+    limit = bumper.token_limit_per_user
+    if limit <= 0:
+        return
+    docs = _user_token_docs(userid)
+    if len(docs) <= limit:
+        return
+
+    docs.sort(key=lambda doc: doc.get("last_used") or doc["expiration"])
+    evicted = docs[: len(docs) - limit]
+    _LOGGER.debug(f"Evicting {len(evicted)} token(s) of userid {userid}")
+    _db_get().remove("tokens", [doc.doc_id for doc in evicted])
+    _token_stats["evictions"] += len(evicted)
+    _revoked()
+
+
+def token_stats() -> dict[str, int]:
+    """Get statistics of the stored tokens."""
+    return {
+        "tokens": _db_get().count("tokens"),
+        "revoked": _db_get().count("revoked"),
+        "limit_per_user": bumper.token_limit_per_user,
+        "evictions": _token_stats["evictions"],
+        "reuse_hits": _token_stats["reuse_hits"],
+    }
+
+
+def revocation_count() -> int:
+    """Return the number of revocations of tokens and authcodes so far.
+
+    Caches of successful checks are outdated, when it changed.
+    """
+    return _token_stats["revocations"]
+
+
+def _revoked(token: str = "") -> None:
+    _token_stats["revocations"] += 1
+    for callback in list(_revocation_callbacks):
+        callback(token)
+
+
+def subscribe_revocations(callback: Callable[[str], None]) -> Callable[[], None]:
+    """Call callback on every revocation. Return the unsubscribe function.
+
+    The callback gets the new deny list entry of signed tokens or "" and may be
+    called on the database thread.
+    """
+    _revocation_callbacks.append(callback)
+    return lambda: _revocation_callbacks.remove(callback)
+
+
+def apply_revocation(token: str) -> None:
+    """Apply a revocation made by another process sharing the database."""
+    if token:
+        _denied_get().add(token)
+    _token_stats["revocations"] += 1
+
+
+def user_revoke_all_tokens(userid: str) -> None:
+    """Revoke all tokens for given user.
+
+    Signed tokens aren't stored, so they can only be revoked one by one and
+    stay valid until they expire.
+    """
+    if bumper.signed_tokens:
+        _LOGGER.warning(
+            f"Revoking all tokens of {userid} isn't supported with signed tokens"
+        )
+        return
+
+    tsearch = _user_token_docs(userid)
+    if tsearch:
+        _db_get().remove("tokens", [i.doc_id for i in tsearch])
+        _revoked()
+
+
+def user_revoke_expired_tokens(userid: str) -> None:
+    """Revoke expired user tokens."""
+    tsearch = _user_token_docs(userid)
+    now = get_current_time_as_millis()
+    for i in tsearch:
+        if now >= i["expiration"]:
+            _LOGGER.debug("Removing token {} due to expiration".format(i["token"]))
+            _db_get().remove("tokens", [i.doc_id])
+            _revoked()
+
+
+def _signed_deny(userid: str, token: str, entry: str) -> None:
+    """Add entry to the deny list, if token is a valid signed token of userid."""
+    signed = _signed_token_get(token)
+    if signed and signed.userid == userid:
+        _insert_expiring("revoked", {"token": entry, "expiration": signed.expiration})
+        _denied_get().add(entry)
+        _revoked(entry)
+
+
+def user_revoke_token(userid: str, token: str) -> None:
+    """Revoke user token."""
+    if bumper.signed_tokens:
+        _signed_deny(userid, token, token)
+        return
+
+    tmptoken = _user_token_doc(userid, token)
+    if tmptoken:
+        _db_get().remove("tokens", [tmptoken.doc_id])
+        _revoked()
+
+
+def user_add_authcode(userid: str, token: str, authcode: str) -> None:
+    """Add user authcode."""
+    tmptoken = _user_token_doc(userid, token)
+    if tmptoken:
+        if tmptoken.get("authcode") not in ("", None, authcode):
+            _revoked()  # The previous authcode is replaced
+        _db_get().update("tokens", [tmptoken.doc_id], {"authcode": authcode})
+
+
+def user_revoke_authcode(userid: str, token: str) -> None:
+    """Revoke user authcode.
+
+    The authcode of a signed token is derived from it, so it can't be replaced
+    afterwards. A new token is required.
+    """
+    if bumper.signed_tokens:
+        _signed_deny(userid, token, _AUTHCODE_DENIED + token)
+        return
+
+    tmptoken = _user_token_doc(userid, token)
+    if tmptoken:
+        _db_get().update("tokens", [tmptoken.doc_id], {"authcode": ""})
+        _revoked()
+
+
+def revoke_expired_oauths() -> None:
+    """Revoke expired oauths."""
+    _revoke_due("oauth")
+
+
+def user_revoke_expired_oauths(userid: str) -> None:
+    """Revoke expired oauths by user."""
+    search = _db_get().lookup("oauth", "userid", userid)
+    now = get_current_time_as_millis()
+    for i in search:
+        oauth = OAuth.from_row(i)
+        if now >= oauth.expire_at:
+            _LOGGER.debug(f"Removing oauth {oauth.access_token} due to expiration")
+            _db_get().remove("oauth", [i.doc_id])
+
+
+def user_add_oauth(userid: str) -> OAuth:
+    """Add oauth for user."""
+    user_revoke_expired_oauths(userid)
+    entry = _db_get().get_by("oauth", "userid", userid)
+    if entry:
+        return OAuth.from_row(entry)
+    else:
+        oauth = OAuth.create_new(userid)
+        _LOGGER.debug(f"Adding oauth {oauth.access_token} for userid {userid}")
+        _insert_expiring("oauth", oauth.toDB())
+        return oauth
+
+
+def token_by_authcode(authcode: str) -> BumperToken | None:
+    """Get token by authcode."""
+    if bumper.signed_tokens:
+        return _signed_authcode_get(authcode)
+
+    doc = _db_get().get_by("tokens", "authcode", authcode)
+    return BumperToken.from_row(doc) if doc else None
+
+
+def _same_user(userid: str, uid: str) -> bool:
+    return normalize_userid(userid) == normalize_userid(uid)
+
+
+def _token_matches_user(tokens: list[Document], uid: str) -> Document | None:
+    """Return the first token of the given user (with or without fuid_)."""
+    userid = normalize_userid(uid)
+    for token in tokens:
+        if normalize_userid(token["userid"]) == userid:
+            return token
+    return None
+
+
+def check_authcode(uid: str, authcode: str) -> bool:
+    """Check authcode."""
+    _LOGGER.debug(f"Checking for authcode: {authcode}")
+    if bumper.signed_tokens:
+        signed = _signed_authcode_get(authcode)
+        return signed is not None and _same_user(signed.userid, uid)
+
+    tokens = _db_get().lookup("tokens", "authcode", authcode)
+    if _token_matches_user(tokens, uid):
+        return True
+
+    return False
+
+
+def login_by_it_token(authcode: str) -> dict[str, str]:
+    """Login by token."""
+    _LOGGER.debug(f"Checking for authcode: {authcode}")
+    if bumper.signed_tokens:
+        signed = _signed_authcode_get(authcode)
+        return {"token": signed.token, "userid": signed.userid} if signed else {}
+
+    tmpauth = _db_get().get_by("tokens", "authcode", authcode)
+    if tmpauth:
+        return {"token": tmpauth["token"], "userid": tmpauth["userid"]}
+
+    return {}
+
+
+def check_token(uid: str, token: str) -> bool:
+    """Check token."""
+    _LOGGER.debug(f"Checking for token: {token}")
+    if bumper.signed_tokens:
+        signed = _signed_token_get(token)
+        return signed is not None and _same_user(signed.userid, uid)
+
+    tokens = _db_get().lookup("tokens", "token", token)
+    if _token_matches_user(tokens, uid):
+        return True
+
+    return False
+
+
+def revoke_expired_tokens() -> None:
+    """Revoke expired tokens."""
+    _revoke_due("tokens")
+    _revoke_due("revoked")
+
+
+def bot_add(sn: str, did: str, dev_class: str, resource: str, company: str) -> None:
+    """Add bot."""
+    new_bot = VacBotDevice()
+    new_bot.did = did
+    new_bot.name = sn
+    new_bot.vac_bot_device_class = dev_class
+    new_bot.resource = resource
+    new_bot.company = company
+
+    if (not dev_class) or "@" in sn or "tmp" in sn:
+        # try to prevent bad additions to the bot list
+        _LOGGER.warning(f"Skipping new bot with DID: {new_bot.did}: {new_bot.asdict()}")
+        return
+
+    _LOGGER.info(f"Adding new bot with SN: {new_bot.name} DID: {new_bot.did}")
+    bot_full_upsert(new_bot.asdict())
+
+
+def bot_remove(did: str) -> None:
+    """Remove bot."""
+    _db_get().remove_by("bots", "did", did)
+
+
+def bot_get(did: str) -> VacBotDevice | None:
+    """Get bot."""
+    doc = _db_get().get_by("bots", "did", did)
+    return VacBotDevice.from_row(doc) if doc else None
+
+
+def bot_get_all() -> list[VacBotDevice]:
+    """Get all bots."""
+    return [VacBotDevice.from_row(doc) for doc in _db_get().all("bots")]
+
+
+def bot_full_upsert(vacbot: dict[str, Any]) -> None:
+    """Upsert bot."""
+    if "did" in vacbot:
+        _db_get().upsert_by("bots", "did", vacbot["did"], vacbot)
+    else:
+        _LOGGER.error(f"No DID in vacbot: {vacbot}")
+
+
+def bot_set_nick(did: str, nick: str) -> None:
+    """Bot set nickname."""
+    _db_get().upsert_by("bots", "did", did, {"nick": nick})
+
+
+def client_add(userid: str, realm: str, resource: str) -> None:
+    """Add client."""
+    new_client = VacBotClient()
+    new_client.userid = userid
+    new_client.realm = realm
+    new_client.resource = resource
+
+    client = client_get(resource)
+    if not client:
+        _LOGGER.info(f"Adding new client with resource {new_client.resource}")
+        _client_full_upsert(new_client.asdict())
+
+
+def client_remove(resource: str) -> None:
+    """Remove client."""
+    _db_get().remove_by("clients", "resource", resource)
+
+
+def client_get(resource: str) -> VacBotClient | None:
+    """Get client by resource."""
+    doc = _db_get().get_by("clients", "resource", resource)
+    return VacBotClient.from_row(doc) if doc else None
+
+
+def client_get_all() -> list[VacBotClient]:
+    """Get all clients."""
+    return [VacBotClient.from_row(doc) for doc in _db_get().all("clients")]
+
+
+def _client_full_upsert(client: dict[str, Any]) -> None:
+    _db_get().upsert_by("clients", "resource", client["resource"], client)
@@ -0,0 +1,129 @@
+"""Async database module.
+
+Awaitable versions of the database functions. All of them run on one dedicated
+thread, so the storage I/O never blocks the event loop and the calls are
+executed in the order in which they were made.
+"""
+import asyncio
+import functools
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, ParamSpec, TypeVar
+
+from bumper import db
+from bumper.util import get_logger
+
+_LOGGER = get_logger("db")
+
+_P = ParamSpec("_P")
+_T = TypeVar("_T")
+
+_executor: ThreadPoolExecutor | None = None
+# Seconds between probes of the event loop latency
+_LOOP_PROBE_INTERVAL = 0.01
+
+
+def _executor_get() -> ThreadPoolExecutor:
+    global _executor  # pylint: disable=global-statement
+    if _executor is None:
+        # A single worker guarantees the call order
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bumper_db")
+    return _executor
+
+
+async def run(func: Callable[_P, _T], *args: _P.args, **kwargs: _P.kwargs) -> _T:
+    """Run func on the database thread and return its result.
+
+    Use it to run several database calls as one job.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor_get(), functools.partial(func, *args, **kwargs)
+    )
+
+
+def submit(func: Callable[_P, Any], *args: _P.args, **kwargs: _P.kwargs) -> None:
+    """Queue func on the database thread without waiting for its result.
+
+    For writes from synchronous code, like protocol callbacks. They are still
+    executed in order with all other calls.
+    """
+    future = _executor_get().submit(func, *args, **kwargs)
+    future.add_done_callback(_log_exception)
+
+
+def _log_exception(future: Future) -> None:
+    if (exc := future.exception()) is not None:
+        _LOGGER.error("Database call failed", exc_info=exc)
+
+
+async def close() -> None:
+    """Wait for all pending calls, then flush and close the database."""
+    global _executor  # pylint: disable=global-statement
+    await run(db.close)
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+
+
+async def snapshot(path: str | None = None, compact: bool = False) -> dict[str, Any]:
+    """Write a snapshot of the database, see db.snapshot.
+
+    Additionally reports the longest time the event loop was blocked meanwhile.
+    """
+    loop = asyncio.get_running_loop()
+    future = asyncio.ensure_future(run(db.snapshot, path, compact))
+    blocked = 0.0
+    while not future.done():
+        start = loop.time()
+        await asyncio.wait({future}, timeout=_LOOP_PROBE_INTERVAL)
+        if not future.done():
+            blocked = max(blocked, loop.time() - start - _LOOP_PROBE_INTERVAL)
+
+    result = future.result()
+    result["loop_blocked_ms"] = round(blocked * 1000, 2)
+    return result
+
+
+def _async(func: Callable[_P, _T]) -> Callable[_P, Awaitable[_T]]:
+    @functools.wraps(func)
+    async def wrapper(*args: _P.args, **kwargs: _P.kwargs) -> _T:
+        return await run(func, *args, **kwargs)
+
+    return wrapper
+
+
+def _async_token(func: Callable[_P, _T]) -> Callable[_P, Awaitable[_T]]:
+    """Like _async, but signed tokens are checked right away (CPU only)."""
+
+    @functools.wraps(func)
+    async def wrapper(*args: _P.args, **kwargs: _P.kwargs) -> _T:
+        if db.signed_tokens_ready():
+            return func(*args, **kwargs)
+        return await run(func, *args, **kwargs)
+
+    return wrapper
+
+
+bot_add = _async(db.bot_add)
+bot_get = _async(db.bot_get)
+bot_get_all = _async(db.bot_get_all)
+bot_remove = _async(db.bot_remove)
+bot_set_nick = _async(db.bot_set_nick)
+check_authcode = _async_token(db.check_authcode)
+check_token = _async_token(db.check_token)
+client_add = _async(db.client_add)
+client_get = _async(db.client_get)
+client_get_all = _async(db.client_get_all)
+client_remove = _async(db.client_remove)
+login_by_it_token = _async_token(db.login_by_it_token)
+revoke_expired_oauths = _async(db.revoke_expired_oauths)
+revoke_expired_tokens = _async(db.revoke_expired_tokens)
+token_by_authcode = _async_token(db.token_by_authcode)
+token_stats = _async(db.token_stats)
+user_add_oauth = _async(db.user_add_oauth)
+user_by_device_id = _async(db.user_by_device_id)
+user_get = _async(db.user_get)
+user_get_token = _async_token(db.user_get_token)
+user_revoke_expired_tokens = _async(db.user_revoke_expired_tokens)
+user_revoke_token = _async(db.user_revoke_token)
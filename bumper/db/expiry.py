@@ -0,0 +1,29 @@
+"""Expiry index module."""
+import heapq
+from collections.abc import Hashable
+
+
+class ExpiryIndex:
+    """Min-heap of expiration times.
+
+    Entries are never removed from the heap directly. A popped entry only
+    names the key of a document, which may have been removed or renewed in the
+    meantime, so callers must check the document before acting on it.
+    """
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[float, Hashable]] = []
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, expires_at: float, key: Hashable) -> None:
+        """Add key, which expires at the given timestamp."""
+        heapq.heappush(self._heap, (expires_at, key))
+
+    def pop_due(self, now: float) -> list[Hashable]:
+        """Remove and return all keys, which are due at the given timestamp."""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[1])
+        return due
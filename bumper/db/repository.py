@@ -0,0 +1,130 @@
+"""Repository module."""
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Hashable, Iterable, Iterator, Mapping
+from contextlib import contextmanager
+from typing import Any
+
+from tinydb.table import Document
+
+IndexKeyFunc = Callable[[Mapping[str, Any]], Iterable[Hashable]]
+
+
+def normalize_userid(userid: str) -> str:
+    """Return userid without fuid_ prefix."""
+    return userid.removeprefix("fuid_")
+
+
+def _field_key(field: str) -> IndexKeyFunc:
+    def key_func(doc: Mapping[str, Any]) -> Iterable[Hashable]:
+        value = doc.get(field)
+        return (value,) if value else ()
+
+    return key_func
+
+
+def _userid_key(doc: Mapping[str, Any]) -> Iterable[Hashable]:
+    userid = doc.get("userid")
+    return (normalize_userid(userid),) if userid else ()
+
+
+def _devices_key(doc: Mapping[str, Any]) -> Iterable[Hashable]:
+    return tuple(doc.get("devices", ()))
+
+
+# Tables and their indexes. A key function returns all keys of a document for
+# an index, which allows to index list fields and normalized values.
+INDEXES: dict[str, dict[str, IndexKeyFunc]] = {
+    "users": {"userid": _field_key("userid"), "devices": _devices_key},
+    "clients": {"resource": _field_key("resource")},
+    "bots": {"did": _field_key("did")},
+    "tokens": {
+        "token": _field_key("token"),
+        "authcode": _field_key("authcode"),
+        "userid": _userid_key,
+    },
+    "oauth": {"userid": _field_key("userId")},
+    # Deny list of revoked signed tokens
+    "revoked": {"token": _field_key("token")},
+    # Completed migrations, see sqlite_repository.migrate_json
+    "migrations": {},
+}
+
+
+class Repository(ABC):
+    """Storage backend for the bumper tables.
+
+    All lookups go through the indexes defined in ``INDEXES``.
+    Returned documents are copies and carry their ``doc_id``.
+    """
+
+    @abstractmethod
+    def all(self, table: str) -> list[Document]:
+        """Get all documents of a table."""
+
+    def count(self, table: str) -> int:
+        """Get the number of documents of a table."""
+        return len(self.all(table))
+
+    @abstractmethod
+    def lookup(self, table: str, index: str, key: Hashable) -> list[Document]:
+        """Get all documents with the given key from the index."""
+
+    def get_by(self, table: str, index: str, key: Hashable) -> Document | None:
+        """Get the first document with the given key from the index."""
+        docs = self.lookup(table, index, key)
+        return docs[0] if docs else None
+
+    @abstractmethod
+    def insert(self, table: str, doc: Mapping[str, Any]) -> int:
+        """Insert document and return its id."""
+
+    @abstractmethod
+    def update(
+        self, table: str, doc_ids: Iterable[int], fields: Mapping[str, Any]
+    ) -> None:
+        """Update the given fields of the documents.
+
+        Documents, which already store the given values, must not be written.
+        """
+
+    def upsert_by(
+        self, table: str, index: str, key: Hashable, fields: Mapping[str, Any]
+    ) -> None:
+        """Update all documents with the given key, insert fields otherwise."""
+        # One transaction, so no other writer can insert the key meanwhile
+        with self.transaction():
+            doc_ids = [doc.doc_id for doc in self.lookup(table, index, key)]
+            if doc_ids:
+                self.update(table, doc_ids, fields)
+            else:
+                self.insert(table, fields)
+
+    @abstractmethod
+    def remove(self, table: str, doc_ids: Iterable[int]) -> None:
+        """Remove the documents."""
+
+    def remove_by(self, table: str, index: str, key: Hashable) -> None:
+        """Remove all documents with the given key."""
+        with self.transaction():
+            doc_ids = [doc.doc_id for doc in self.lookup(table, index, key)]
+            if doc_ids:
+                self.remove(table, doc_ids)
+
+    def flush(self) -> None:
+        """Write pending changes to disk."""
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Run all calls of the block as one unit of work, committed once."""
+        yield
+
+    @abstractmethod
+    def backup(self, path: str) -> None:
+        """Write a consistent copy of all tables to path."""
+
+    def compact(self) -> None:
+        """Reclaim the space of removed documents."""
+
+    @abstractmethod
+    def close(self) -> None:
+        """Flush and close the repository."""
@@ -0,0 +1,38 @@
+"""Serializer module."""
+import json
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
+
+@dataclass(frozen=True, slots=True)
+class Serializer:
+    """JSON codec for the database file."""
+
+    name: str
+    dumps: Callable[[Any], bytes]
+    loads: Callable[[bytes], Any]
+
+
+def _json_dumps(data: Any) -> bytes:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+JSON = Serializer("json", _json_dumps, json.loads)
+ORJSON = Serializer("orjson", orjson.dumps, orjson.loads) if orjson else None
+
+
+def get_serializer(name: str = "") -> Serializer:
+    """Return serializer by name. The fastest available one, if no name is given."""
+    if name in ("", "orjson") and ORJSON is not None:
+        return ORJSON
+    if name in ("", "json"):
+        return JSON
+    if name == "orjson":
+        raise ValueError("Serializer orjson requested, but orjson is not installed")
+    raise ValueError(f"Unknown serializer: {name}")
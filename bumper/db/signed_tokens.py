@@ -0,0 +1,129 @@
+"""Signed tokens module.
+
+Stateless access tokens and authcodes. A token carries the userid and its
+expiration, an authcode carries its token. Both are signed with a server
+secret, so they can be verified without any storage access.
+
+    token:    <base64 userid>.<expiration in epoch millis as hex>.<signature>
+    authcode: <countrycode>_<base64 token>.<signature>
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+
+import bumper
+from bumper.util import get_logger
+
+_LOGGER = get_logger("db")
+
+_SECRET_FILE_NAME = "token_secret"
+_SIGNATURE_SIZE = 16
+# Domain separation, a token signature must never be valid for an authcode
+_TOKEN_PREFIX = b"token:"
+_AUTHCODE_PREFIX = b"authcode:"
+
+_secret: bytes | None = None
+_secret_lock = threading.Lock()
+
+
+def _secret_get() -> bytes:
+    """Return the secret from the settings or the data dir (created once)."""
+    global _secret  # pylint: disable=global-statement
+    if _secret is None:
+        with _secret_lock:
+            if _secret is None:
+                _secret = (
+                    bumper.token_secret.encode()
+                    if bumper.token_secret
+                    else _load_or_create_secret()
+                )
+    return _secret
+
+
+def _load_or_create_secret() -> bytes:
+    path = os.path.join(bumper.data_dir, _SECRET_FILE_NAME)
+    try:
+        with open(path, "rb") as file:
+            return file.read()
+    except FileNotFoundError:
+        pass
+
+    secret = secrets.token_bytes(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as file:
+        file.write(secret)
+    _LOGGER.info("Created token secret %s", path)
+    return secret
+
+
+def reset_secret() -> None:
+    """Forget the secret. It will be loaded again on next use."""
+    global _secret  # pylint: disable=global-statement
+    _secret = None
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(prefix: bytes, message: str) -> str:
+    digest = hmac.new(_secret_get(), prefix + message.encode(), hashlib.sha256)
+    return _b64encode(digest.digest()[:_SIGNATURE_SIZE])
+
+
+def _verify(prefix: bytes, signed: str) -> str | None:
+    """Return the message of a signed value, None if the signature is invalid."""
+    message, _, signature = signed.rpartition(".")
+    # Compare bytes, as compare_digest rejects str with non-ASCII characters
+    expected = _sign(prefix, message).encode()
+    if not message or not hmac.compare_digest(signature.encode(), expected):
+        return None
+    return message
+
+
+def create_token(userid: str, expires_at: int) -> str:
+    """Create token for userid, which expires at the given epoch millis."""
+    message = f"{_b64encode(userid.encode())}.{expires_at:x}"
+    return f"{message}.{_sign(_TOKEN_PREFIX, message)}"
+
+
+def verify_token(token: str, now: int) -> tuple[str, int] | None:
+    """Return userid and expiration of a valid token, None otherwise."""
+    message = _verify(_TOKEN_PREFIX, token)
+    if message is None:
+        return None
+    try:
+        userid, expiration = message.split(".")
+        expires_at = int(expiration, 16)
+        result = (_b64decode(userid).decode(), expires_at)
+    except (ValueError, binascii.Error):
+        return None
+    return result if now < expires_at else None
+
+
+def create_authcode(countrycode: str, token: str) -> str:
+    """Create authcode for token. The same token always gets the same authcode."""
+    message = f"{countrycode}_{_b64encode(token.encode())}"
+    return f"{message}.{_sign(_AUTHCODE_PREFIX, message)}"
+
+
+def token_of_authcode(authcode: str) -> str | None:
+    """Return the token of an authcode with a valid signature, None otherwise.
+
+    The token itself must still be verified.
+    """
+    message = _verify(_AUTHCODE_PREFIX, authcode)
+    if message is None or "_" not in message:
+        return None
+    try:
+        return _b64decode(message.partition("_")[2]).decode()
+    except (ValueError, binascii.Error):
+        return None
@@ -0,0 +1,226 @@
+"""SQLite repository module."""
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Hashable, Iterable, Iterator, Mapping
+from contextlib import contextmanager
+from typing import Any
+
+from tinydb.table import Document
+
+from bumper.util import get_logger
+
+from .repository import INDEXES, Repository
+
+_LOGGER = get_logger("db")
+
+# Seconds a write waits for the transaction of another process sharing the file
+_BUSY_TIMEOUT = 30
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tbl TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_tbl ON documents (tbl, id);
+CREATE TABLE IF NOT EXISTS document_keys (
+    tbl TEXT NOT NULL,
+    idx TEXT NOT NULL,
+    key TEXT NOT NULL,
+    doc_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS document_keys_lookup ON document_keys (tbl, idx, key);
+CREATE INDEX IF NOT EXISTS document_keys_doc ON document_keys (doc_id);
+"""
+
+# Statements are constant, so sqlite3 prepares each of them only once
+_SQL_ALL = "SELECT id, data FROM documents WHERE tbl = ? ORDER BY id"
+_SQL_COUNT = "SELECT COUNT(*) FROM documents WHERE tbl = ?"
+_SQL_LOOKUP = (
+    "SELECT d.id, d.data FROM document_keys k JOIN documents d ON d.id = k.doc_id"
+    " WHERE k.tbl = ? AND k.idx = ? AND k.key = ? ORDER BY d.id"
+)
+_SQL_GET = "SELECT data FROM documents WHERE tbl = ? AND id = ?"
+_SQL_INSERT = "INSERT INTO documents (tbl, data) VALUES (?, ?)"
+_SQL_UPDATE = "UPDATE documents SET data = ? WHERE id = ?"
+_SQL_DELETE = "DELETE FROM documents WHERE tbl = ? AND id = ?"
+_SQL_INSERT_KEY = (
+    "INSERT INTO document_keys (tbl, idx, key, doc_id) VALUES (?, ?, ?, ?)"
+)
+_SQL_DELETE_KEYS = "DELETE FROM document_keys WHERE doc_id = ?"
+
+
+class SQLiteRepository(Repository):
+    """Repository, which stores the tables in a SQLite database in WAL mode.
+
+    Documents are stored as JSON. The index keys defined in ``INDEXES`` are
+    kept in an indexed side table, so every write only touches the changed rows.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._lock = threading.RLock()
+        self._depth = 0  # Nesting level of transactions
+        self._conn = sqlite3.connect(
+            path, timeout=_BUSY_TIMEOUT, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Cursor]:
+        with self._lock:
+            cursor = self._conn.cursor()
+            if self._depth:  # Part of an outer transaction
+                yield cursor
+                return
+
+            # Takes the write lock right away. A deferred transaction, which
+            # reads before it writes, fails if another process wrote meanwhile.
+            cursor.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield cursor
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            else:
+                cursor.execute("COMMIT")
+            finally:
+                self._depth -= 1
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Run all calls of the block in one transaction, rolled back on errors."""
+        with self._transaction():
+            yield
+
+    def _query(self, sql: str, params: tuple[Any, ...]) -> list[Document]:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [Document(json.loads(data), doc_id) for (doc_id, data) in rows]
+
+    def all(self, table: str) -> list[Document]:
+        """Get all documents of a table."""
+        return self._query(_SQL_ALL, (table,))
+
+    def count(self, table: str) -> int:
+        """Get the number of documents of a table."""
+        with self._lock:
+            return int(self._conn.execute(_SQL_COUNT, (table,)).fetchone()[0])
+
+    def lookup(self, table: str, index: str, key: Hashable) -> list[Document]:
+        """Get all documents with the given key from the index."""
+        return self._query(_SQL_LOOKUP, (table, index, str(key)))
+
+    def insert(self, table: str, doc: Mapping[str, Any]) -> int:
+        """Insert document and return its id."""
+        with self._transaction() as cursor:
+            return self._insert(cursor, table, doc)
+
+    def insert_multiple(self, table: str, docs: Iterable[Mapping[str, Any]]) -> None:
+        """Insert multiple documents in one transaction."""
+        with self._transaction() as cursor:
+            for doc in docs:
+                self._insert(cursor, table, doc)
+
+    def update(
+        self, table: str, doc_ids: Iterable[int], fields: Mapping[str, Any]
+    ) -> None:
+        """Update the given fields of the documents."""
+        with self._transaction() as cursor:
+            for doc_id in doc_ids:
+                row = cursor.execute(_SQL_GET, (table, doc_id)).fetchone()
+                if row is None:
+                    continue
+                doc = json.loads(row[0])
+                if all(
+                    key in doc and doc[key] == value for key, value in fields.items()
+                ):
+                    continue  # Nothing changed, skip the write
+                doc.update(fields)
+                cursor.execute(_SQL_UPDATE, (json.dumps(doc), doc_id))
+                cursor.execute(_SQL_DELETE_KEYS, (doc_id,))
+                self._insert_keys(cursor, table, doc_id, doc)
+
+    def remove(self, table: str, doc_ids: Iterable[int]) -> None:
+        """Remove the documents."""
+        with self._transaction() as cursor:
+            for doc_id in doc_ids:
+                cursor.execute(_SQL_DELETE_KEYS, (doc_id,))
+                cursor.execute(_SQL_DELETE, (table, doc_id))
+
+    def backup(self, path: str) -> None:
+        """Write a consistent copy of all tables to path (online backup API)."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        target = sqlite3.connect(tmp_path)
+        try:
+            with self._lock:
+                self._conn.backup(target)
+        finally:
+            target.close()
+        os.replace(tmp_path, path)
+
+    def compact(self) -> None:
+        """Reclaim the space of removed documents and truncate the WAL."""
+        with self._lock:
+            self._conn.execute("VACUUM")
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._conn.close()
+
+    def _insert(
+        self, cursor: sqlite3.Cursor, table: str, doc: Mapping[str, Any]
+    ) -> int:
+        cursor.execute(_SQL_INSERT, (table, json.dumps(doc)))
+        doc_id = cursor.lastrowid
+        assert doc_id is not None
+        self._insert_keys(cursor, table, doc_id, doc)
+        return doc_id
+
+    @staticmethod
+    def _insert_keys(
+        cursor: sqlite3.Cursor, table: str, doc_id: int, doc: Mapping[str, Any]
+    ) -> None:
+        cursor.executemany(
+            _SQL_INSERT_KEY,
+            [
+                (table, index, str(key), doc_id)
+                for index, key_func in INDEXES[table].items()
+                for key in key_func(doc)
+            ],
+        )
+
+
+def migrate_json(repository: SQLiteRepository, json_file: str) -> int:
+    """Import all tables of a TinyDB JSON file. Return the number of documents.
+
+    The import and a completion marker are written in one transaction, so a
+    failed migration leaves the database empty and is retried on next call. A
+    database with any documents is skipped and 0 returned.
+    """
+    with open(json_file, encoding="utf-8") as file:
+        content = file.read()
+    data = json.loads(content) if content else {}
+
+    with repository.transaction():
+        # Checked in the transaction, as the workers open the database at once
+        if any(repository.count(table) for table in INDEXES):
+            return 0
+
+        count = 0
+        for table in INDEXES:
+            docs = list(data.get(table, {}).values())
+            repository.insert_multiple(table, docs)
+            count += len(docs)
+        repository.insert("migrations", {"source": json_file, "documents": count})
+
+    _LOGGER.info("Migrated %d document(s) from %s", count, json_file)
+    return count
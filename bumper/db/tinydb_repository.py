@@ -0,0 +1,465 @@
+"""TinyDB repository module."""
+import os
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Hashable, Iterable, Iterator, Mapping
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any
+
+from tinydb import TinyDB
+from tinydb.queries import QueryLike
+from tinydb.storages import Storage
+from tinydb.table import Document, Table
+
+from bumper.util import get_logger
+
+from .repository import INDEXES, IndexKeyFunc, Repository
+from .serializer import Serializer, get_serializer
+
+_LOGGER = get_logger("db")
+
+
+@dataclass(frozen=True, slots=True)
+class FlushStats:
+    """Statistics of a database file write."""
+
+    writes: int
+    serialize_seconds: float
+    size: int
+
+
+class BufferedJSONStorage(Storage):
+    """JSON storage, which keeps the data in memory and writes it back lazily.
+
+    Every write only marks the storage as dirty. The file is rewritten atomically
+    (temp file and rename) after ``flush_interval`` seconds or as soon as
+    ``flush_threshold`` writes are pending, whatever comes first. Delayed flushes
+    run on a timer thread and hold ``lock``, which must also be held by everyone
+    modifying the data. The file is written compactly by ``serializer``, which
+    defaults to the fastest available one.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_interval: float = 1.0,
+        flush_threshold: int = 100,
+        fsync: bool = False,
+        lock: "threading.RLock | None" = None,
+        serializer: Serializer | None = None,
+    ) -> None:
+        super().__init__()
+        self.path = path
+        self.serializer = serializer or get_serializer()
+        self.last_flush: FlushStats | None = None
+        self._lock = lock or threading.RLock()
+        self._flush_interval = flush_interval
+        self._flush_threshold = flush_threshold
+        self._fsync = fsync
+        self._data: dict[str, dict[str, Any]] | None = None
+        self._pending_writes = 0
+        self._flush_timer: threading.Timer | None = None
+        self._batch_depth = 0
+
+    @property
+    def pending_writes(self) -> int:
+        """Return the number of writes, which are not yet flushed to the file."""
+        return self._pending_writes
+
+    def read(self) -> dict[str, dict[str, Any]]:
+        """Read data from memory and load it from file on first access."""
+        with self._lock:
+            if self._data is None:
+                try:
+                    with open(self.path, "rb") as file:
+                        content = file.read()
+                    self._data = self.serializer.loads(content) if content else {}
+                except FileNotFoundError:
+                    self._data = {}
+
+            return self._data
+
+    def write(self, data: dict[str, dict[str, Any]]) -> None:
+        """Write data to memory and schedule the flush."""
+        with self._lock:
+            self._data = data
+            self._pending_writes += 1
+            if self._batch_depth == 0:
+                self._schedule_flush()
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Hold the lock and defer flushes until all writes of the block are done.
+
+        Changes aren't rolled back on errors, as the data is modified in place.
+        """
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield
+            finally:
+                self._batch_depth -= 1
+                if self._batch_depth == 0 and self._pending_writes:
+                    self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if self._pending_writes >= self._flush_threshold:
+            self.flush()
+        elif self._flush_timer is None:
+            self._flush_timer = threading.Timer(self._flush_interval, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self) -> None:
+        """Write all pending changes to the file."""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+
+            if self._pending_writes == 0 or self._data is None:
+                return
+
+            self._write_file(self._data)
+
+    def _write_file(self, data: dict[str, dict[str, Any]]) -> None:
+        start = time.perf_counter()
+        content = self.serializer.dumps(data)
+        serialize_seconds = time.perf_counter() - start
+        _write_atomic(self.path, content, self._fsync)
+
+        self.last_flush = FlushStats(
+            self._pending_writes, serialize_seconds, len(content)
+        )
+        _LOGGER.debug(
+            "Flushed %d write(s) to %s: %d bytes, serialized in %.2f ms (%s)",
+            self._pending_writes,
+            self.path,
+            len(content),
+            serialize_seconds * 1000,
+            self.serializer.name,
+        )
+        self._pending_writes = 0
+
+    def compact(self) -> None:
+        """Rewrite the file from the data in memory, even without pending writes.
+
+        The file never keeps removed documents, so it is as small as possible then.
+        """
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            self._write_file(self.read())
+
+    def backup(self, path: str) -> None:
+        """Write a point-in-time copy of the data to path.
+
+        Only copying the data holds the lock, not the serialization.
+        """
+        with self._lock:
+            data = {
+                table: {doc_id: dict(doc) for doc_id, doc in docs.items()}
+                for table, docs in self.read().items()
+            }
+        _write_atomic(path, self.serializer.dumps(data), self._fsync)
+
+    def close(self) -> None:
+        """Flush pending changes."""
+        self.flush()
+
+
+def _write_atomic(path: str, content: bytes, fsync: bool) -> None:
+    """Write content to a temp file and rename it to path."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    handle, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as file:
+            file.write(content)
+            if fsync:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        _LOGGER.exception("Could not write database file %s", path)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class IndexedTable(Table):
+    """Table, which maintains hash indexes for O(1) lookups.
+
+    The indexes are updated on every insert, update, upsert and remove. A key
+    function returns all keys of a document for an index, which allows to index
+    list fields and normalized values.
+    """
+
+    def __init__(self, storage: Storage, name: str, cache_size: int = 10) -> None:
+        super().__init__(storage, name, cache_size)
+        self._key_funcs: dict[str, IndexKeyFunc] = {}
+        self._indexes: dict[str, dict[Hashable, dict[int, None]]] = {}
+        # Keys of every document per index, required to unindex changed documents
+        self._doc_keys: dict[int, dict[str, tuple[Hashable, ...]]] = {}
+
+    def create_index(self, name: str, key_func: IndexKeyFunc) -> None:
+        """Create index and add all existing documents to it."""
+        self._key_funcs[name] = key_func
+        self._indexes[name] = {}
+        for doc_id, doc in self._read_table().items():
+            self._index_document(int(doc_id), doc, [name])
+
+    def lookup(self, index: str, key: Hashable) -> list[Document]:
+        """Get all documents with the given key from the index."""
+        docs = []
+        for doc_id in self._indexes[index].get(key, {}):
+            doc = self.get(doc_id=doc_id)
+            if doc is not None:
+                docs.append(doc)
+        return docs
+
+    def get_by(self, index: str, key: Hashable) -> Document | None:
+        """Get the first document with the given key from the index."""
+        for doc_id in self._indexes[index].get(key, {}):
+            return self.get(doc_id=doc_id)
+        return None
+
+    def upsert_by(self, index: str, key: Hashable, fields: Mapping) -> None:
+        """Update all documents with the given key, insert fields otherwise."""
+        doc_ids = list(self._indexes[index].get(key, {}))
+        if doc_ids:
+            self.update(fields, doc_ids=doc_ids)
+        else:
+            self.insert(fields)
+
+    def remove_by(self, index: str, key: Hashable) -> list[int]:
+        """Remove all documents with the given key."""
+        doc_ids = list(self._indexes[index].get(key, {}))
+        if not doc_ids:
+            return []
+        return self.remove(doc_ids=doc_ids)
+
+    def insert(self, document: Mapping) -> int:
+        """Insert document."""
+        doc_id = super().insert(document)
+        self._reindex([doc_id])
+        return doc_id
+
+    def insert_multiple(self, documents: Iterable[Mapping]) -> list[int]:
+        """Insert multiple documents."""
+        doc_ids = super().insert_multiple(documents)
+        self._reindex(doc_ids)
+        return doc_ids
+
+    def update(
+        self,
+        fields: Mapping | Callable[[Mapping], None],
+        cond: QueryLike | None = None,
+        doc_ids: Iterable[int] | None = None,
+    ) -> list[int]:
+        """Update documents. Documents, which wouldn't change, aren't written."""
+        if not callable(fields):
+            doc_ids = self._changed_doc_ids(fields, cond, doc_ids)
+            if not doc_ids:
+                return []
+            cond = None
+
+        updated = super().update(fields, cond, doc_ids)
+        self._reindex(updated)
+        return updated
+
+    def update_multiple(
+        self,
+        updates: Iterable[tuple[Mapping | Callable[[Mapping], None], QueryLike]],
+    ) -> list[int]:
+        """Update multiple documents."""
+        updated = super().update_multiple(updates)
+        self._reindex(updated)
+        return updated
+
+    def remove(
+        self, cond: QueryLike | None = None, doc_ids: Iterable[int] | None = None
+    ) -> list[int]:
+        """Remove documents."""
+        removed = super().remove(cond, doc_ids)
+        for doc_id in removed:
+            self._unindex_document(doc_id)
+        return removed
+
+    def truncate(self) -> None:
+        """Remove all documents."""
+        super().truncate()
+        self._doc_keys.clear()
+        for index in self._indexes.values():
+            index.clear()
+
+    def _changed_doc_ids(
+        self,
+        fields: Mapping,
+        cond: QueryLike | None,
+        doc_ids: Iterable[int] | None,
+    ) -> list[int]:
+        table = self._read_table()
+        if doc_ids is None:
+            doc_ids = (int(doc_id) for doc_id in table)
+
+        changed = []
+        for doc_id in doc_ids:
+            doc = table.get(str(doc_id))
+            if doc is None or (cond is not None and not cond(doc)):
+                continue
+            if any(
+                key not in doc or doc[key] != value for key, value in fields.items()
+            ):
+                changed.append(doc_id)
+        return changed
+
+    def _reindex(self, doc_ids: Iterable[int]) -> None:
+        table = self._read_table()
+        for doc_id in doc_ids:
+            self._unindex_document(doc_id)
+            doc = table.get(str(doc_id))
+            if doc is not None:
+                self._index_document(doc_id, doc, self._key_funcs)
+
+    def _index_document(
+        self, doc_id: int, doc: Mapping[str, Any], indexes: Iterable[str]
+    ) -> None:
+        doc_keys = self._doc_keys.setdefault(doc_id, {})
+        for name in indexes:
+            keys = tuple(self._key_funcs[name](doc))
+            doc_keys[name] = keys
+            for key in keys:
+                self._indexes[name].setdefault(key, {})[doc_id] = None
+
+    def _unindex_document(self, doc_id: int) -> None:
+        for name, keys in self._doc_keys.pop(doc_id, {}).items():
+            index = self._indexes[name]
+            for key in keys:
+                doc_ids = index.get(key)
+                if doc_ids is not None:
+                    doc_ids.pop(doc_id, None)
+                    if not doc_ids:
+                        del index[key]
+
+
+class _IndexedTinyDB(TinyDB):
+    table_class = IndexedTable
+
+
+class TinyDBRepository(Repository):
+    """Repository, which stores all tables in one JSON file using TinyDB."""
+
+    def __init__(
+        self,
+        path: str,
+        flush_interval: float = 1.0,
+        flush_threshold: int = 100,
+        fsync: bool = False,
+        serializer: Serializer | None = None,
+    ) -> None:
+        # Serializes table access with the delayed flushes of the storage
+        self._lock = threading.RLock()
+        # Will create the database if it doesn't exist
+        self._db = _IndexedTinyDB(
+            path,
+            storage=BufferedJSONStorage,
+            flush_interval=flush_interval,
+            flush_threshold=flush_threshold,
+            fsync=fsync,
+            lock=self._lock,
+            serializer=serializer,
+        )
+        self._tables: dict[str, IndexedTable] = {}
+
+        # Will create the tables and indexes if they don't exist
+        for name, indexes in INDEXES.items():
+            table = self._db.table(name, cache_size=0)
+            assert isinstance(table, IndexedTable)
+            for index, key_func in indexes.items():
+                table.create_index(index, key_func)
+            self._tables[name] = table
+
+    @property
+    def storage(self) -> BufferedJSONStorage:
+        """Return the storage."""
+        storage = self._db.storage
+        assert isinstance(storage, BufferedJSONStorage)
+        return storage
+
+    def all(self, table: str) -> list[Document]:
+        """Get all documents of a table."""
+        with self._lock:
+            return self._tables[table].all()
+
+    def count(self, table: str) -> int:
+        """Get the number of documents of a table."""
+        with self._lock:
+            return len(self._tables[table])
+
+    def lookup(self, table: str, index: str, key: Hashable) -> list[Document]:
+        """Get all documents with the given key from the index."""
+        with self._lock:
+            return self._tables[table].lookup(index, key)
+
+    def get_by(self, table: str, index: str, key: Hashable) -> Document | None:
+        """Get the first document with the given key from the index."""
+        with self._lock:
+            return self._tables[table].get_by(index, key)
+
+    def insert(self, table: str, doc: Mapping[str, Any]) -> int:
+        """Insert document and return its id."""
+        with self._lock:
+            return self._tables[table].insert(doc)
+
+    def update(
+        self, table: str, doc_ids: Iterable[int], fields: Mapping[str, Any]
+    ) -> None:
+        """Update the given fields of the documents."""
+        with self._lock:
+            self._tables[table].update(fields, doc_ids=doc_ids)
+
+    def upsert_by(
+        self, table: str, index: str, key: Hashable, fields: Mapping[str, Any]
+    ) -> None:
+        """Update all documents with the given key, insert fields otherwise."""
+        with self._lock:
+            self._tables[table].upsert_by(index, key, fields)
+
+    def remove(self, table: str, doc_ids: Iterable[int]) -> None:
+        """Remove the documents."""
+        with self._lock:
+            self._tables[table].remove(doc_ids=doc_ids)
+
+    def remove_by(self, table: str, index: str, key: Hashable) -> None:
+        """Remove all documents with the given key."""
+        with self._lock:
+            self._tables[table].remove_by(index, key)
+
+    def flush(self) -> None:
+        """Write pending changes to the file."""
+        with self._lock:
+            self.storage.flush()
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Run all calls of the block as one batch, which is flushed once."""
+        with self._lock, self.storage.batch():
+            yield
+
+    def backup(self, path: str) -> None:
+        """Write a consistent copy of all tables to path."""
+        self.storage.backup(path)
+
+    def compact(self) -> None:
+        """Write the tables to the file right away, without removed documents."""
+        with self._lock:
+            self.storage.compact()
+
+    def close(self) -> None:
+        """Flush and close the database."""
+        with self._lock:
+            self._db.close()
@@ -1,34 +1,38 @@
 """Models module."""
 import uuid
-from datetime import datetime, timedelta
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from datetime import timedelta
 from typing import Any
 
 import bumper
-from bumper.util import convert_to_millis
+from bumper.util import convert_to_millis, get_current_time_as_millis
 
 
+@dataclass(slots=True)
 class VacBotDevice:
     """Vacuum device."""
 
-    def __init__(
-        self,
-        did: str = "",
-        vac_bot_device_class: str = "",
-        resource: str = "",
-        name: str = "",
-        nick: str = "",
-        company: str = "",
-    ):
-        self.vac_bot_device_class = vac_bot_device_class
-        self.company = company
-        self.did = did
-        self.name = name
-        self.nick = nick
-        self.resource = resource
-        self.mqtt_connection = False
-        self.xmpp_connection = False
-
-    def asdict(self) -> dict[str, str | bool]:
+    did: str = ""
+    vac_bot_device_class: str = ""
+    resource: str = ""
+    name: str = ""
+    nick: str = ""
+    company: str = ""
+
+    @classmethod
+    def from_row(cls, row: Mapping[str, Any]) -> "VacBotDevice":
+        """Create from db row."""
+        return cls(
+            row.get("did", ""),
+            row.get("class", ""),
+            row.get("resource", ""),
+            row.get("name", ""),
+            row.get("nick", ""),
+            row.get("company", ""),
+        )
+
+    def asdict(self) -> dict[str, str]:
         """Convert to dict."""
         return {
             "class": self.vac_bot_device_class,
@@ -37,24 +41,9 @@ class VacBotDevice:
             "name": self.name,
             "nick": self.nick,
             "resource": self.resource,
-            "mqtt_connection": self.mqtt_connection,
-            "xmpp_connection": self.xmpp_connection,
         }
 
 
-class BumperUser:
-    """Bumper user."""
-
-    def __init__(self, userid: str = ""):
-        self.userid = userid
-        self.devices: list[str] = []
-        self.bots: list[str] = []
-
-    def asdict(self) -> dict[str, Any]:
-        """Convert to dict."""
-        return {"userid": self.userid, "devices": self.devices, "bots": self.bots}
-
-
 class GlobalVacBotDevice(VacBotDevice):
     """Global vacuum device."""
 
@@ -65,15 +54,40 @@ class GlobalVacBotDevice(VacBotDevice):
     deviceName = ""
 
 
+@dataclass(slots=True)
+class BumperUser:
+    """Bumper user."""
+
+    userid: str = ""
+    devices: list[str] = field(default_factory=list)
+    bots: list[str] = field(default_factory=list)
+
+    @classmethod
+    def from_row(cls, row: Mapping[str, Any]) -> "BumperUser":
+        """Create from db row."""
+        return cls(
+            row.get("userid", ""),
+            list(row.get("devices", ())),
+            list(row.get("bots", ())),
+        )
+
+    def asdict(self) -> dict[str, Any]:
+        """Convert to dict."""
+        return {"userid": self.userid, "devices": self.devices, "bots": self.bots}
+
+
+@dataclass(slots=True)
 class VacBotClient:
     """Vacuum client."""
 
-    def __init__(self, userid: str = "", realm: str = "", token: str = ""):
-        self.userid = userid
-        self.realm = realm
-        self.resource = token
-        self.mqtt_connection = False
-        self.xmpp_connection = False
+    userid: str = ""
+    realm: str = ""
+    resource: str = ""
+
+    @classmethod
+    def from_row(cls, row: Mapping[str, Any]) -> "VacBotClient":
+        """Create from db row."""
+        return cls(row.get("userid", ""), row.get("realm", ""), row.get("resource", ""))
 
     def asdict(self) -> dict[str, Any]:
         """Convert to dict."""
@@ -81,45 +95,89 @@ class VacBotClient:
             "userid": self.userid,
             "realm": self.realm,
             "resource": self.resource,
-            "mqtt_connection": self.mqtt_connection,
-            "xmpp_connection": self.xmpp_connection,
         }
 
 
+@dataclass(slots=True)
+class BumperToken:
+    """Bumper token."""
+
+    userid: str = ""
+    token: str = ""
+    expiration: int = 0  # Epoch millis (UTC)
+    authcode: str = ""
+    devid: str = ""
+    last_used: int = 0  # Epoch millis (UTC)
+
+    @classmethod
+    def from_row(cls, row: Mapping[str, Any]) -> "BumperToken":
+        """Create from db row."""
+        return cls(
+            row.get("userid", ""),
+            row.get("token", ""),
+            row.get("expiration", 0),
+            row.get("authcode", ""),
+            row.get("devid", ""),
+            row.get("last_used", 0),
+        )
+
+    def asdict(self) -> dict[str, Any]:
+        """Convert to dict."""
+        data: dict[str, Any] = {
+            "userid": self.userid,
+            "token": self.token,
+            "expiration": self.expiration,
+        }
+        for name in ("authcode", "devid", "last_used"):
+            if value := getattr(self, name):
+                data[name] = value
+        return data
+
+
+@dataclass(slots=True)
 class OAuth:
     """Oauth."""
 
-    access_token = ""
-    expire_at = ""
-    refresh_token = ""
-    userId = ""
-
-    def __init__(self, **entries: str):
-        self.__dict__.update(entries)
+    access_token: str = ""
+    expire_at: int = 0  # Epoch millis (UTC)
+    refresh_token: str = ""
+    userId: str = ""
 
     @classmethod
     def create_new(cls, userId: str) -> "OAuth":
         """Create new."""
-        oauth = OAuth()
-        oauth.userId = userId
-        oauth.access_token = uuid.uuid4().hex
-        oauth.expire_at = (
-            f"{datetime.utcnow() + timedelta(days=bumper.oauth_validity_days)}"
+        return cls(
+            access_token=uuid.uuid4().hex,
+            expire_at=get_current_time_as_millis()
+            + convert_to_millis(
+                timedelta(days=bumper.oauth_validity_days).total_seconds()
+            ),
+            refresh_token=uuid.uuid4().hex,
+            userId=userId,
         )
-        oauth.refresh_token = uuid.uuid4().hex
-        return oauth
 
-    def toDB(self) -> dict:
+    @classmethod
+    def from_row(cls, row: Mapping[str, Any]) -> "OAuth":
+        """Create from db row."""
+        return cls(
+            row.get("access_token", ""),
+            row.get("expire_at", 0),
+            row.get("refresh_token", ""),
+            row.get("userId", ""),
+        )
+
+    def toDB(self) -> dict[str, Any]:
         """Convert for db."""
-        return self.__dict__
+        return {
+            "access_token": self.access_token,
+            "expire_at": self.expire_at,
+            "refresh_token": self.refresh_token,
+            "userId": self.userId,
+        }
 
-    def toResponse(self) -> dict:
+    def toResponse(self) -> dict[str, Any]:
         """Convert to response."""
-        data = self.__dict__
-        data["expire_at"] = convert_to_millis(
-            datetime.fromisoformat(self.expire_at).timestamp()
-        )
-        return data
+        return self.toDB()
 
 
 RETURN_API_SUCCESS = "0000"
@@ -0,0 +1,99 @@
+"""Topic ACL module.
+
+Topics of Ecovacs devices name sender and receiver:
+
+    iot/p2p/{name}/{sender}/{class}/{resource}/{receiver}/{class}/{resource}/...
+    iot/atr/{name}/{sender}/{class}/{resource}/{j|x}
+
+A bot may only send as itself and receive what is addressed to it. A client
+(app) may only send as its user to the bots of the user, and receive their
+events and what is addressed to it.
+"""
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from typing import Any
+
+from bumper import presence
+from bumper.mqtt.client_id import parse_client_id
+
+_END = "\0"  # Marks the end of a pattern, can't be part of a topic
+
+
+class TopicTrie:
+    """Set of topic patterns with + and # wildcards, stored by level."""
+
+    def __init__(self, patterns: Iterable[str] = ()) -> None:
+        self._root: dict[str, Any] = {}
+        for pattern in patterns:
+            self.add(pattern)
+
+    def add(self, pattern: str) -> None:
+        """Add pattern."""
+        node = self._root
+        for level in pattern.split("/"):
+            node = node.setdefault(level, {})
+        node[_END] = {}
+
+    def matches(self, topic: str) -> bool:
+        """Return True, if a pattern matches the topic.
+
+        The topic may be a subscription filter. Its wildcards are only matched
+        by the same or broader wildcards of a pattern.
+        """
+        return self._matches(self._root, topic.split("/"), 0)
+
+    def _matches(self, node: dict[str, Any], levels: list[str], index: int) -> bool:
+        if "#" in node:
+            return True
+        if index == len(levels):
+            return _END in node
+        level = levels[index]
+        if level != "#" and "+" in node and self._matches(node["+"], levels, index + 1):
+            return True
+        if level not in ("+", "#") and level in node:
+            return self._matches(node[level], levels, index + 1)
+        return False
+
+
+@dataclass(frozen=True)
+class TopicAcl:
+    """Allowed topics of a session."""
+
+    publish: TopicTrie = field(default_factory=TopicTrie)
+    subscribe: TopicTrie = field(default_factory=TopicTrie)
+
+
+def bot_acl(did: str) -> TopicAcl:
+    """Return the ACL of a bot."""
+    return TopicAcl(
+        publish=TopicTrie([f"iot/+/+/{did}/#"]),
+        subscribe=TopicTrie([f"iot/+/+/+/+/+/{did}/#"]),
+    )
+
+
+def client_acl(userid: str, resource: str, bots: Iterable[str]) -> TopicAcl:
+    """Return the ACL of a client of a user with the given bots."""
+    bots = list(bots)
+    return TopicAcl(
+        publish=TopicTrie(f"iot/p2p/+/{userid}/+/{resource}/{did}/#" for did in bots),
+        subscribe=TopicTrie(
+            [
+                f"iot/p2p/+/+/+/+/{userid}/+/{resource}/#",
+                *(f"iot/atr/+/{did}/#" for did in bots),
+            ]
+        ),
+    )
+
+
+def session_kind(client_id: str) -> tuple[str, str, str] | None:
+    """Return kind, id (did or userid) and resource of a bot or client session.
+
+    None for other sessions (helper bot, file authenticated users), which are
+    not restricted.
+    """
+    key = parse_client_id(client_id)
+    if key is None:
+        return None
+    if key[0] == presence.BOT:
+        return (presence.BOT, key[1], "")
+    return (presence.CLIENT, client_id.split("@", maxsplit=1)[0], key[1])
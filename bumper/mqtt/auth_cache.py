@@ -0,0 +1,76 @@
+"""Auth cache module."""
+import asyncio
+import hashlib
+import hmac
+import secrets
+from collections.abc import Awaitable, Callable
+
+from cachetools import TTLCache
+
+
+class AuthCache:
+    """Bounded cache of authentication decisions.
+
+    Credentials are only kept as salted digests. Failed decisions expire
+    sooner, so a fixed password is accepted again quickly. Concurrent checks
+    of the same credentials share one verification.
+    """
+
+    def __init__(
+        self, maxsize: int = 1024, ttl: float = 300, failure_ttl: float = 30
+    ) -> None:
+        self._salt = secrets.token_bytes(16)
+        self._success: TTLCache[bytes, bool] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._failure: TTLCache[bytes, bool] = TTLCache(
+            maxsize=maxsize, ttl=failure_ttl
+        )
+        self._pending: dict[bytes, asyncio.Future[bool]] = {}
+
+    def key(self, *credentials: str) -> bytes:
+        """Return the cache key of the credentials."""
+        message = "\0".join(credentials).encode()
+        return hmac.new(self._salt, message, hashlib.sha256).digest()
+
+    def get(self, key: bytes) -> bool | None:
+        """Return the cached decision or None."""
+        if key in self._success:
+            return True
+        if key in self._failure:
+            return False
+        return None
+
+    def set(self, key: bytes, success: bool) -> None:
+        """Cache a decision."""
+        (self._success if success else self._failure)[key] = True
+        (self._failure if success else self._success).pop(key, None)
+
+    def clear(self) -> None:
+        """Forget all decisions, e.g. after the credentials changed."""
+        self._success.clear()
+        self._failure.clear()
+
+    async def verify(self, key: bytes, check: Callable[[], Awaitable[bool]]) -> bool:
+        """Return the cached decision. Otherwise run check and cache its result."""
+        if (cached := self.get(key)) is not None:
+            return cached
+
+        if (pending := self._pending.get(key)) is not None:
+            return await asyncio.shield(pending)
+
+        future: asyncio.Future[bool] = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            success = await check()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as err:
+            future.set_exception(err)
+            future.exception()  # Mark as retrieved, if nobody else is waiting
+            raise
+        finally:
+            del self._pending[key]
+
+        self.set(key, success)
+        future.set_result(success)
+        return success
@@ -0,0 +1,20 @@
+"""Client id module."""
+from bumper import presence
+from bumper.mqtt.helper_bot import HELPER_BOT_CLIENT_ID
+
+
+def parse_client_id(client_id: str) -> tuple[str, str] | None:
+    """Return kind (bot or client) and key (did or resource) of a client id.
+
+    Bots connect as did@class/resource, clients as userid@ecouser/resource.
+    """
+    if client_id == HELPER_BOT_CLIENT_ID or "@" not in client_id:
+        return None
+
+    (did, details) = client_id.split("@", maxsplit=1)
+    if "ecouser" not in details:
+        # if ecouser aren't in details it is a bot
+        return (presence.BOT, did)
+    if "/" in details:
+        return (presence.CLIENT, details.split("/")[1])
+    return None
@@ -0,0 +1,54 @@
+"""Event deduplication module."""
+import time
+from collections import Counter
+
+from cachetools import LRUCache
+
+from bumper.mqtt.message import ATR, parse_topic
+
+_MAX_SUBSCRIBERS = 16384
+
+
+class EventDedup:
+    """Suppress unchanged bot events (atr broadcasts) per subscriber.
+
+    An event, whose payload equals the last one of its topic sent to the
+    subscriber, is sent to it at most once per interval seconds. Changed events
+    are always sent, so are the events to subscribers, which didn't get them yet.
+    An interval of 0 disables the deduplication.
+    """
+
+    def __init__(self, interval: float = 0) -> None:
+        self.interval = interval
+        # client id -> topic -> (payload, monotonic time it was sent)
+        self._last: LRUCache[str, dict[str, tuple[bytes, float]]] = LRUCache(
+            maxsize=_MAX_SUBSCRIBERS
+        )
+        self.stats: Counter[str] = Counter()
+
+    def forward(self, client_id: str, topic: str, data: bytes | bytearray) -> bool:
+        """Return True, if the message should be sent to the subscriber."""
+        if self.interval <= 0 or parse_topic(topic).kind != ATR:
+            return True
+
+        self.stats["events"] += 1
+        now = time.monotonic()
+        events = self._last.get(client_id)
+        if events is None:
+            events = self._last[client_id] = {}
+        last = events.get(topic)
+        if last is not None and last[0] == data and now - last[1] < self.interval:
+            self.stats["suppressed"] += 1
+            self.stats["suppressed_bytes"] += len(data)
+            return False
+
+        events[topic] = (bytes(data), now)
+        return True
+
+    def forget(self, client_id: str) -> None:
+        """Forget the events sent to a subscriber, e.g. as it disconnected."""
+        self._last.pop(client_id, None)
+
+    def clear(self) -> None:
+        """Forget all events."""
+        self._last.clear()
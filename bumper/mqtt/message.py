@@ -0,0 +1,73 @@
+"""Message module."""
+import functools
+from dataclasses import dataclass
+
+P2P = "p2p"
+ATR = "atr"
+
+
+@dataclass(frozen=True, slots=True)
+class Topic:
+    """Parsed topic.
+
+    iot/p2p/{name}/{sender}/{class}/{resource}/{receiver}/{class}/{resource}/{q|p}/{request_id}/{j|x}
+    iot/atr/{name}/{sender}/{class}/{resource}/{j|x}
+    """
+
+    topic: str
+    kind: str = ""  # P2P, ATR or empty for unknown topics
+    name: str = ""  # Command or event
+    sender_id: str = ""
+    sender_class: str = ""
+    sender_resource: str = ""
+    receiver_id: str = ""
+    receiver_class: str = ""
+    receiver_resource: str = ""
+    direction: str = ""  # q for requests, p for responses
+    request_id: str = ""
+    payload_type: str = ""  # j for json, x for xml
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_topic(topic: str) -> Topic:
+    """Parse topic. Topics repeat a lot, therefore the result is cached."""
+    parts = topic.split("/")
+    if len(parts) == 12 and parts[1] == P2P:
+        return Topic(topic, *parts[1:])
+    if len(parts) == 7 and parts[1] == ATR:
+        (_, kind, name, sender_id, sender_class, sender_resource, payload_type) = parts
+        return Topic(
+            topic,
+            kind,
+            name,
+            sender_id,
+            sender_class,
+            sender_resource,
+            payload_type=payload_type,
+        )
+    return Topic(topic)
+
+
+class Payload:
+    """Message payload, which is only decoded on first access of its text."""
+
+    __slots__ = ("_data", "_text")
+
+    def __init__(self, data: bytes | bytearray | memoryview) -> None:
+        self._data = data
+        self._text: str | None = None
+
+    @property
+    def data(self) -> bytes:
+        """Return the raw payload."""
+        return bytes(self._data)
+
+    @property
+    def text(self) -> str:
+        """Return the payload decoded as UTF-8."""
+        if self._text is None:
+            self._text = str(self._data, "utf-8")
+        return self._text
+
+    def __str__(self) -> str:
+        return self.text
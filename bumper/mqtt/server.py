@@ -1,38 +1,61 @@
 """Server module."""
+import asyncio
+import copy
+import logging
 import os
+import ssl
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from functools import partial
 from typing import Any
 
-import amqtt
-import pkg_resources
-from amqtt.broker import Broker, BrokerContext
+from amqtt.adapters import StreamReaderAdapter, StreamWriterAdapter
+from amqtt.broker import Action, Broker, BrokerContext, Server
+from amqtt.mqtt.connack import SERVER_UNAVAILABLE, ConnackPacket
+from amqtt.mqtt.connect import ConnectPacket
 from amqtt.mqtt.constants import QOS_0, QOS_1, QOS_2
+from amqtt.plugins.manager import Plugin
 from amqtt.session import IncomingApplicationMessage, Session
+from cachetools import TTLCache
 from passlib.apps import custom_app_context as pwd_context
 
 import bumper
-from bumper import dns
-from bumper.db import (
-    bot_add,
-    bot_get,
-    bot_set_mqtt,
-    check_authcode,
-    client_add,
-    client_get,
-    client_set_mqtt,
-)
+from bumper import bot_state, dns, presence
+from bumper.admission import Admission, AdmissionRejected, create_admission
+from bumper.db import aio as db_aio
+from bumper.db import normalize_userid, revocation_count
+from bumper.mqtt.acl import TopicAcl, bot_acl, client_acl, session_kind
+from bumper.mqtt.auth_cache import AuthCache
+from bumper.mqtt.client_id import parse_client_id
+from bumper.mqtt.dedup import EventDedup
 from bumper.mqtt.helper_bot import HELPER_BOT_CLIENT_ID
+from bumper.mqtt.message import ATR, Payload, parse_topic
 from bumper.mqtt.proxy import _LOGGER as _LOGGER_PROXY
 from bumper.mqtt.proxy import ProxyClient
+from bumper.mqtt.shard import ShardBus
 from bumper.util import get_logger
 
 _LOGGER = get_logger("mqtt_server")
 _LOGGER_MESSAGES = get_logger("mqtt_messages")
+# Authcodes expire and can be revoked, so their checks are only cached shortly
+_AUTHCODE_TTL = 5  # seconds
+_UNCACHED = object()  # ACL of the session isn't compiled yet
+_CONNECT_TIMEOUT = 5  # seconds a rejected connection may take to send CONNECT
+# Writer of the connection handled by the current task
+_connection_writer: ContextVar[StreamWriterAdapter] = ContextVar("connection_writer")
 
 
 class MQTTServer:
     """Mqtt server."""
 
-    def __init__(self, host: str, port: int, **kwargs: dict[str, Any]) -> None:
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        bus: ShardBus | None = None,
+        **kwargs: dict[str, Any],
+    ) -> None:
         try:
             self._host = host
             self._port = port
@@ -44,13 +67,9 @@ class MQTTServer:
             )
             allow_anon = kwargs.get("allow_anonymous", False)
 
-            # The below adds a plugin to the amqtt.broker.plugins without having to futz with setup.py
-            distribution = pkg_resources.Distribution("amqtt.broker.plugins")
-            bumper_plugin = pkg_resources.EntryPoint.parse(
-                "bumper = bumper.mqtt.server:BumperMQTTServerPlugin", dist=distribution
-            )
-            distribution._ep_map = {"amqtt.broker.plugins": {"bumper": bumper_plugin}}  # type: ignore[attr-defined]
-            pkg_resources.working_set.add(distribution)
+            self._dedup = EventDedup(bumper.mqtt_dedup_interval)
+            # Workers of a sharded server share the ports, see bumper.mqtt.shard
+            reuse_port = bus is not None
 
             # Initialize bot server
             config = {
@@ -61,9 +80,11 @@ class MQTTServer:
                         "ssl": "on",
                         "certfile": bumper.server_cert,
                         "keyfile": bumper.server_key,
+                        "reuse_port": reuse_port,
                     },
                     "tcp-insecure": {
                         "bind": f"{host}:1883",
+                        "reuse_port": reuse_port,
                     }
                 },
                 "sys_interval": 0,
@@ -76,11 +97,15 @@ class MQTTServer:
                 },
                 "topic-check": {
                     "enabled": True,  # Workaround until https://github.com/Yakifo/amqtt/pull/93 is merged
-                    "plugins": [],
+                    # The bumper plugin checks the topics against the ACL of the session
+                    "plugins": ["bumper"],
                 },
+                "bumper": {"dedup": self._dedup},
             }
 
-            self._broker = amqtt.broker.Broker(config=config)
+            self._admission = create_admission()
+            self._broker = _BumperBroker(config, self._admission, self._dedup, bus)
+            self._shutdown_stats: dict[str, int] = {}
 
         except Exception:
             _LOGGER.exception("An exception occurred during initialize", exc_info=True)
@@ -97,6 +122,27 @@ class MQTTServer:
         # pylint: disable-next=protected-access
         return [session for (session, _) in self._broker._sessions.values()]
 
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Get session counts, admission, deduplication and shutdown counters."""
+        return {
+            "sessions": dict(self.session_counts()),
+            "admission": dict(self._admission.stats),
+            "dedup": dict(self._dedup.stats),
+            "shutdown": dict(self._shutdown_stats),
+        }
+
+    def session_counts(self) -> Counter[str]:
+        """Get the number of sessions by state."""
+        return Counter(
+            session.transitions.state
+            # pylint: disable-next=protected-access
+            for (session, _) in self._broker._sessions.values()
+        )
+
+    async def deliver(self, topic: str, data: bytes) -> None:
+        """Deliver a message of another worker to the local subscribers."""
+        await self._broker.deliver(topic, data)
+
     async def start(self) -> None:
         """Start MQTT server."""
         _LOGGER.info("Starting MQTT Server at %s:%d", self._host, self._port)
@@ -107,17 +153,236 @@ class MQTTServer:
             raise
 
     async def shutdown(self) -> None:
-        """Shutdown server."""
+        """Shutdown server.
+
+        The sessions are stopped concurrently, at most BUMPER_STOP_PARALLEL at a
+        time. Connections not closed after BUMPER_STOP_TIMEOUT seconds are aborted.
+        """
+        start = time.monotonic()
         # stop session handler manually otherwise connection will not be closed correctly
-        for (
-            _,
-            handler,
-        ) in self._broker._sessions.values():  # pylint: disable=protected-access
-            await handler.stop()
+        # pylint: disable-next=protected-access
+        handlers = [handler for (_, handler) in self._broker._sessions.values()]
+        semaphore = asyncio.Semaphore(max(1, bumper.mqtt_stop_parallel))
+
+        async def stop(handler: Any) -> None:
+            async with semaphore:
+                await handler.stop()
+
+        tasks = {asyncio.create_task(stop(handler)): handler for handler in handlers}
+        pending: set[asyncio.Task[None]] = set()
+        if tasks:
+            (_, pending) = await asyncio.wait(tasks, timeout=bumper.mqtt_stop_timeout)
+        for task in pending:
+            task.cancel()
+            await _abort(tasks[task])
         await self._broker.shutdown()
 
+        duration = time.monotonic() - start
+        self._shutdown_stats = {
+            "sessions": len(handlers),
+            "aborted": len(pending),
+            "duration_ms": round(duration * 1000),
+        }
+        _LOGGER.info(
+            "MQTT Server stopped in %.2fs - Sessions: %d - Aborted: %d",
+            duration,
+            len(handlers),
+            len(pending),
+        )
+
+
+async def _abort(handler: Any) -> None:
+    """Close the connection of a session handler, which didn't stop in time."""
+    writer = getattr(handler, "writer", None)
+    if isinstance(writer, StreamWriterAdapter):
+        # pylint: disable-next=protected-access
+        writer._writer.transport.abort()
+    # Let the broker finish the session as disconnected
+    await handler.handle_connection_closed()
+
+
+class _BumperBroker(Broker):  # type: ignore[misc]
+    """Broker, which admits new connections only within the configured limits."""
+
+    def __init__(
+        self,
+        config: dict[str, Any],
+        admission: Admission,
+        dedup: EventDedup,
+        bus: ShardBus | None = None,
+    ) -> None:
+        super().__init__(config=config)
+        # Register the bumper plugin directly instead of as entry point, which
+        # would require an installed distribution or patching the working set
+        manager = self.plugins_manager
+        context = copy.copy(manager.app_context)
+        context.logger = manager.logger.getChild("bumper")
+        manager.plugins.append(Plugin("bumper", None, BumperMQTTServerPlugin(context)))
+        self._admission = admission
+        self._dedup = dedup
+        self._bus = bus
+
+    async def start(self) -> None:
+        """Start the broker.
+
+        amqtt can't bind with SO_REUSEPORT, so the listeners with reuse_port are
+        hidden from it and bound here.
+        """
+        shared = {
+            name: listener
+            for (name, listener) in self.listeners_config.items()
+            if listener.get("reuse_port") and "bind" in listener
+        }
+        binds = {name: listener.pop("bind") for (name, listener) in shared.items()}
+        try:
+            await super().start()
+        finally:
+            for (name, bind) in binds.items():
+                shared[name]["bind"] = bind
+
+        for (name, listener) in shared.items():
+            (address, port) = listener["bind"].rsplit(":", 1)
+            instance = await asyncio.start_server(
+                partial(self.stream_connected, listener_name=name),
+                address,
+                int(port),
+                reuse_address=True,
+                reuse_port=True,
+                ssl=_ssl_context(listener),
+            )
+            self._servers[name] = Server(
+                name, instance, listener.get("max_connections", -1)
+            )
+            _LOGGER.info("Listener '%s' bound to %s", name, listener["bind"])
+
+    async def stream_connected(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        listener_name: str,
+    ) -> None:
+        """Reject connections above the rate of their source before reading anything."""
+        peer = writer.get_extra_info("peername")
+        try:
+            self._admission.admit(peer[0] if peer else "")
+        except AdmissionRejected as err:
+            _LOGGER.info("Connection from %s rejected: %s", peer, err)
+            await _refuse_connection(reader, writer)
+            return
+        writer_adapter = StreamWriterAdapter(writer)
+        _connection_writer.set(writer_adapter)
+        await self.client_connected(
+            listener_name, StreamReaderAdapter(reader), writer_adapter
+        )
+
+    async def _broadcast_message(
+        self,
+        session: Session,
+        topic: str,
+        data: bytes | bytearray,
+        force_qos: int | None = None,
+    ) -> None:
+        """Broadcast message to the subscribers and route it to the other workers."""
+        await super()._broadcast_message(session, topic, data, force_qos)
+        if self._bus is not None and session is not None:
+            self._bus.publish(topic, session.client_id, data)
+
+    async def _run_broadcast(self, running_tasks: deque[asyncio.Task[Any]]) -> None:
+        """Send the next broadcast like amqtt, but skip unchanged events.
+
+        They are deduplicated per subscriber. The helper bot gets all of them.
+        """
+        broadcast = await self._broadcast_queue.get()
+        topic = broadcast["topic"]
+        data = broadcast["data"]
+        for (k_filter, subscriptions) in list(self._subscriptions.items()):
+            # [MQTT-4.7.2-1] $ topics aren't matched by wildcards at the start
+            if topic.startswith("$") and k_filter.startswith(("+", "#")):
+                continue
+            if not self.matches(topic, k_filter):
+                continue
+
+            for (target_session, qos) in subscriptions:
+                qos = broadcast.get("qos", qos)
+                client_id = target_session.client_id
+                if target_session.transitions.state != "connected":
+                    # Sent, when the session is connected again
+                    await self._retain_broadcast_message(broadcast, qos, target_session)
+                elif client_id == HELPER_BOT_CLIENT_ID or self._dedup.forward(
+                    client_id, topic, data
+                ):
+                    handler = self._get_handler(target_session)
+                    running_tasks.append(
+                        asyncio.ensure_future(
+                            handler.mqtt_publish(topic, data, qos, retain=False)
+                        )
+                    )
+
+    async def deliver(self, topic: str, data: bytes) -> None:
+        """Broadcast message of another worker, without routing it back."""
+        await super()._broadcast_message(None, topic, data)
 
-def _log__helperbot_message(custom_log_message: str, topic: str, data: str) -> None:
+    async def authenticate(self, session: Session, listener: dict[str, Any]) -> bool:
+        """Authenticate within a handshake slot, reject if too many are pending."""
+        try:
+            async with self._admission.handshake():
+                return bool(await super().authenticate(session, listener))
+        except AdmissionRejected as err:
+            _LOGGER.info("Client %s rejected: %s", session.client_id, err)
+            # The broker closes the connection without CONNACK otherwise
+            writer = _connection_writer.get(None)
+            if writer is not None:
+                await _send_server_unavailable(writer)
+            return False
+
+
+def _ssl_context(listener: dict[str, Any]) -> ssl.SSLContext | None:
+    """Create the SSL context of a listener like amqtt, None without SSL."""
+    ssl_active = listener.get("ssl", False)
+    if isinstance(ssl_active, str):
+        ssl_active = ssl_active.upper() == "ON"
+    if not ssl_active:
+        return None
+    context = ssl.create_default_context(
+        ssl.Purpose.CLIENT_AUTH,
+        cafile=listener.get("cafile"),
+        capath=listener.get("capath"),
+        cadata=listener.get("cadata"),
+    )
+    context.load_cert_chain(listener["certfile"], listener["keyfile"])
+    context.verify_mode = ssl.CERT_OPTIONAL
+    return context
+
+
+async def _refuse_connection(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+) -> None:
+    """Answer the CONNECT of a rejected connection with server unavailable."""
+    try:
+        await asyncio.wait_for(
+            ConnectPacket.from_stream(StreamReaderAdapter(reader)), _CONNECT_TIMEOUT
+        )
+        await _send_server_unavailable(StreamWriterAdapter(writer))
+    except Exception:  # pylint: disable=broad-except
+        _LOGGER.debug("No CONNECT received from rejected connection", exc_info=True)
+    finally:
+        writer.close()
+
+
+async def _send_server_unavailable(writer: StreamWriterAdapter) -> None:
+    """Send CONNACK 0x03, so the client retries later instead of failing its login.
+
+    MQTT 3.1.1 has no field for a retry delay, it is only logged.
+    """
+    try:
+        await ConnackPacket.build(0, SERVER_UNAVAILABLE).to_stream(writer)
+    except ConnectionError:
+        _LOGGER.debug("Sending CONNACK to rejected connection failed", exc_info=True)
+
+
+def _log__helperbot_message(
+    custom_log_message: str, topic: str, data: str | Payload
+) -> None:
     _LOGGER_MESSAGES.debug(
         "%s - Topic: %s - Message: %s", custom_log_message, topic, data
     )
@@ -128,7 +393,15 @@ class BumperMQTTServerPlugin:
 
     def __init__(self, context: BrokerContext) -> None:
         self._proxy_clients: dict[str, ProxyClient] = {}
+        self._auth_cache = AuthCache()
+        self._authcode_cache = AuthCache(ttl=_AUTHCODE_TTL)
+        self._revocations = revocation_count()
+        # Compiled ACLs by client id, renewed to pick up new bots of a user
+        self._acls: TTLCache[str, TopicAcl | None] = TTLCache(maxsize=4096, ttl=60)
+        self._password_file_mtime: int | None = None
         self.context = context
+        bumper_config = self.context.config.get("bumper", {})
+        self._dedup: EventDedup = bumper_config.get("dedup", EventDedup())
         try:
             self.auth_config = self.context.config["auth"]
             self._users = self._read_password_file()
@@ -159,7 +432,7 @@ class BumperMQTTServerPlugin:
                 client_details_split = client_id_split[1].split("/")
                 if "ecouser" not in client_id_split[1]:
                     # if ecouser aren't in details it is a bot
-                    bot_add(
+                    await db_aio.bot_add(
                         username,
                         client_id_split[0],
                         client_details_split[0],
@@ -188,8 +461,10 @@ class BumperMQTTServerPlugin:
 
                     return True
 
-                if check_authcode(client_id_split[0], password) or not bumper.use_auth:
-                    client_add(
+                if not bumper.use_auth or await self._verify_authcode(
+                    client_id_split[0], password
+                ):
+                    await db_aio.client_add(
                         client_id_split[0],
                         client_details_split[0],
                         client_details_split[1],
@@ -204,10 +479,10 @@ class BumperMQTTServerPlugin:
             # Check for File Auth
             if username:
                 # If there is a username and it isn't already authenticated
-                password_hash = self._users.get(username, None)
+                password_hash = self._get_users().get(username, None)
                 message_suffix = f"- Username: {username} - ClientID: {client_id}"
                 if password_hash:  # If there is a matching entry in passwd, check hash
-                    if pwd_context.verify(password, password_hash):
+                    if await self._verify_password(username, password, password_hash):
                         _LOGGER.info("File Authentication Success %s", message_suffix)
                         return True
 
@@ -229,11 +504,92 @@ class BumperMQTTServerPlugin:
 
         return False
 
+    async def topic_filtering(
+        self, session: Session, topic: str, action: Action, **kwargs: dict[str, Any]
+    ) -> bool:
+        """Check, if the session may publish or subscribe to the topic."""
+        if not bumper.mqtt_acl:
+            return True
+
+        acl = await self._acl_get(session.client_id)
+        if acl is None:
+            return True
+        trie = acl.subscribe if action == Action.subscribe else acl.publish
+        if trie.matches(topic):
+            return True
+
+        _LOGGER.info(
+            "Topic denied - Action: %s - Topic: %s - ClientID: %s",
+            action.value,
+            topic,
+            session.client_id,
+        )
+        return False
+
+    async def _acl_get(self, client_id: str) -> TopicAcl | None:
+        """Return the compiled ACL of a session, None if it isn't restricted."""
+        self._check_revocations()
+        # get() as the entry may expire between a membership test and the lookup
+        cached = self._acls.get(client_id, _UNCACHED)
+        if cached is None or isinstance(cached, TopicAcl):
+            return cached
+
+        acl: TopicAcl | None = None
+        kind = session_kind(client_id)
+        if kind is not None and kind[0] == presence.BOT:
+            acl = bot_acl(kind[1])
+        elif kind is not None:
+            # Apps connect as fuid_<userid>, the user is stored without prefix
+            user = await db_aio.user_get(normalize_userid(kind[1]))
+            acl = client_acl(kind[1], kind[2], user.bots if user else [])
+        self._acls[client_id] = acl
+        return acl
+
+    def _check_revocations(self) -> None:
+        # Cached authcodes and ACLs are outdated by any revocation since
+        if (revocations := revocation_count()) != self._revocations:
+            self._revocations = revocations
+            self._authcode_cache.clear()
+            self._acls.clear()
+
+    async def _verify_authcode(self, userid: str, authcode: str) -> bool:
+        self._check_revocations()
+        return await self._authcode_cache.verify(
+            self._authcode_cache.key(userid, authcode),
+            lambda: db_aio.check_authcode(userid, authcode),
+        )
+
+    async def _verify_password(
+        self, username: str, password: str, password_hash: str
+    ) -> bool:
+        """Verify password (cached). The slow hash runs in a worker thread."""
+        loop = asyncio.get_running_loop()
+        return await self._auth_cache.verify(
+            self._auth_cache.key("file", username, password_hash, password),
+            lambda: loop.run_in_executor(
+                None, pwd_context.verify, password, password_hash
+            ),
+        )
+
+    def _get_users(self) -> dict[str, str]:
+        """Return the users and reload them, if the password file has changed."""
+        password_file = self.auth_config.get("password-file", None)
+        if password_file:
+            try:
+                mtime: int | None = os.stat(password_file).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime != self._password_file_mtime:
+                self._users = self._read_password_file()
+                self._auth_cache.clear()
+        return self._users
+
     def _read_password_file(self) -> dict[str, str]:
         password_file = self.auth_config.get("password-file", None)
         users: dict[str, str] = {}
         if password_file:
             try:
+                self._password_file_mtime = os.stat(password_file).st_mtime_ns
                 with open(password_file, encoding="utf-8") as file:
                     self.context.logger.debug(
                         f"Reading user database from {password_file}"
@@ -251,6 +607,7 @@ class BumperMQTTServerPlugin:
                     f"{(len(users))} user(s) read from file {password_file}"
                 )
             except FileNotFoundError:
+                self._password_file_mtime = None
                 self.context.logger.warning(f"Password file {password_file} not found")
 
         return users
@@ -281,68 +638,75 @@ class BumperMQTTServerPlugin:
         self._set_client_connected(client_id, True)
 
     def _set_client_connected(self, client_id: str, connected: bool) -> None:
-        didsplit = str(client_id).split("@")
-
-        bot = bot_get(didsplit[0])
-        if bot:
-            bot_set_mqtt(bot["did"], connected)
+        key = parse_client_id(str(client_id))
+        if key is None:
             return
 
-        clientresource = didsplit[1].split("/")[1]
-        client = client_get(clientresource)
-        if client:
-            client_set_mqtt(client["resource"], connected)
+        (kind, did_or_resource) = key
+        if kind == presence.BOT:
+            presence.bot_set_connected(did_or_resource, presence.MQTT, connected)
+        else:
+            presence.client_set_connected(did_or_resource, presence.MQTT, connected)
 
     async def on_broker_message_received(
         self, message: IncomingApplicationMessage, client_id: str
     ) -> None:
         """On message received."""
-        topic = message.topic
-        topic_split = str(topic).split("/")
-        data_decoded = str(message.data.decode("utf-8"))
-
-        if topic_split[6] == "helperbot":
-            # Response to command
-            _log__helperbot_message("Received Response", topic, data_decoded)
-        elif topic_split[3] == "helperbot":
-            # Helperbot sending command
-            _log__helperbot_message("Send Command", topic, data_decoded)
-        elif topic_split[1] == "atr":
-            # Broadcast message received on atr
-            _log__helperbot_message("Received Broadcast", topic, data_decoded)
-        else:
-            _log__helperbot_message("Received Message", topic, data_decoded)
+        topic = parse_topic(message.topic)
+        payload = Payload(message.data)  # Decoded only if needed
+        changed = bot_state.update_from_mqtt(topic, payload, client_id)
+
+        # Unchanged events are only logged, if they are forwarded as well
+        log_messages = _LOGGER_MESSAGES.isEnabledFor(logging.DEBUG) and (
+            changed or bumper.mqtt_dedup_interval <= 0
+        )
+        proxy = bumper.bumper_proxy_mqtt and client_id in self._proxy_clients
+        if not (log_messages or proxy):
+            return
 
-        if bumper.bumper_proxy_mqtt and client_id in self._proxy_clients:
-            if not topic_split[3] == "proxyhelper":
+        if log_messages:
+            if topic.receiver_id == "helperbot":
+                # Response to command
+                _log__helperbot_message("Received Response", topic.topic, payload)
+            elif topic.sender_id == "helperbot":
+                # Helperbot sending command
+                _log__helperbot_message("Send Command", topic.topic, payload)
+            elif topic.kind == ATR:
+                # Broadcast message received on atr
+                _log__helperbot_message("Received Broadcast", topic.topic, payload)
+            else:
+                _log__helperbot_message("Received Message", topic.topic, payload)
+
+        if proxy:
+            if not topic.sender_id == "proxyhelper":
                 # if from proxyhelper, don't send back to ecovacs...yet
-                if topic_split[6] == "proxyhelper":
-                    ttopic = message.topic.split("/")
+                if topic.receiver_id == "proxyhelper":
+                    ttopic = topic.topic.split("/")
                     ttopic[6] = self._proxy_clients[client_id].request_mapper.pop(
-                        ttopic[10], ""
+                        topic.request_id, ""
                     )
                     if ttopic[6] == "":
                         _LOGGER_PROXY.warning(
                             "Request mapper is missing entry, probably request took to"
                             " long... Client_id: %s - Request_id: %s",
                             client_id,
-                            ttopic[10],
+                            topic.request_id,
                         )
                         return
 
                     ttopic_join = "/".join(ttopic)
                     _LOGGER_PROXY.info(
                         "Bot Message Converted Topic From %s TO %s with message: %s",
-                        message.topic,
+                        topic.topic,
                         ttopic_join,
-                        data_decoded,
+                        payload,
                     )
                 else:
-                    ttopic_join = message.topic
+                    ttopic_join = topic.topic
                     _LOGGER_PROXY.info(
                         "Bot Message From %s with message: %s",
                         ttopic_join,
-                        data_decoded,
+                        payload,
                     )
 
                 try:
@@ -350,10 +714,10 @@ class BumperMQTTServerPlugin:
                     _LOGGER_PROXY.info(
                         "Proxy Forward Message to Ecovacs - Topic: %s - Message: %s",
                         ttopic_join,
-                        data_decoded,
+                        payload,
                     )
                     await self._proxy_clients[client_id].publish(
-                        ttopic_join, data_decoded.encode(), message.qos
+                        ttopic_join, payload.data, message.qos
                     )
                 except Exception:  # pylint: disable=broad-except
                     _LOGGER_PROXY.error(
@@ -365,4 +729,6 @@ class BumperMQTTServerPlugin:
         """On client disconnect."""
         if bumper.bumper_proxy_mqtt and client_id in self._proxy_clients:
             await self._proxy_clients.pop(client_id).disconnect()
+        self._acls.pop(client_id, None)
+        self._dedup.forget(client_id)  # It gets the current events on reconnect
         self._set_client_connected(client_id, False)
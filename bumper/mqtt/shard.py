@@ -0,0 +1,363 @@
+"""Shard module.
+
+Optional multi-process MQTT broker. Each worker process runs its own broker
+on the same listeners (SO_REUSEPORT), so the kernel spreads the connections
+and with them the TLS and message handling over the cores. The workers are
+connected to a hub in the main process by a bus over a Unix socket:
+
+- publishes are routed to the other workers, which deliver them to their
+  own subscribers, so requests and responses between apps, the helper bot
+  and bots work across workers
+- presence changes and counters of the workers are reported to the hub,
+  which serves them to the web server
+- revocations of tokens and authcodes by the web server are sent to the
+  workers, which drop their cached checks
+- log records of the workers are written by the main process
+
+The sessions are held by the workers, so sessions of the main process is empty.
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import struct
+import time
+from collections import Counter
+from collections.abc import AsyncIterator, Callable
+from logging.handlers import QueueListener
+from typing import Any
+
+import bumper
+from bumper import bot_state, db, presence
+from bumper.db import aio as db_aio
+from bumper.mqtt.message import Payload, parse_topic
+from bumper.util import get_logger, log_from_queue, log_to_queue
+
+_LOGGER = get_logger("mqtt_server")
+
+# Frame header: kind, length of topic, client id and data
+_HEADER = struct.Struct("!cHHI")
+PUBLISH = b"P"
+PRESENCE = b"C"
+STATS = b"S"
+REVOKE = b"R"
+
+_SOCKET_NAME = "mqtt_bus.sock"
+_STATS_INTERVAL = 5  # seconds
+_START_TIMEOUT = 30  # seconds
+_STOP_TIMEOUT = 10  # seconds a worker may take beyond BUMPER_STOP_TIMEOUT
+
+
+def encode_frame(kind: bytes, topic: str, client_id: str, data: bytes) -> bytes:
+    """Encode a bus frame."""
+    topic_bytes = topic.encode()
+    client_id_bytes = client_id.encode()
+    return (
+        _HEADER.pack(kind, len(topic_bytes), len(client_id_bytes), len(data))
+        + topic_bytes
+        + client_id_bytes
+        + data
+    )
+
+
+async def read_frames(
+    reader: asyncio.StreamReader,
+) -> AsyncIterator[tuple[bytes, str, str, bytes]]:
+    """Yield kind, topic, client id and data of the frames until EOF."""
+    while True:
+        try:
+            header = await reader.readexactly(_HEADER.size)
+            (kind, topic_size, client_id_size, data_size) = _HEADER.unpack(header)
+            body = await reader.readexactly(topic_size + client_id_size + data_size)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+        yield (
+            kind,
+            body[:topic_size].decode(),
+            body[topic_size : topic_size + client_id_size].decode(),
+            body[topic_size + client_id_size :],
+        )
+
+
+class ShardBus:
+    """Connection of a worker to the hub."""
+
+    def __init__(self, writer: asyncio.StreamWriter) -> None:
+        self._writer = writer
+
+    def publish(self, topic: str, client_id: str, data: bytes | bytearray) -> None:
+        """Route a message to the other workers."""
+        self._writer.write(encode_frame(PUBLISH, topic, client_id, bytes(data)))
+
+    def presence(self, kind: str, key: str, connected: bool) -> None:
+        """Report a presence change."""
+        self._writer.write(
+            encode_frame(PRESENCE, kind, key, b"1" if connected else b"")
+        )
+
+    def stats(self, stats: dict[str, Any]) -> None:
+        """Report the counters of the worker."""
+        self._writer.write(encode_frame(STATS, "", "", json.dumps(stats).encode()))
+
+
+class ShardedMQTTServer:
+    """Mqtt server, which runs the broker in several worker processes."""
+
+    def __init__(
+        self, host: str, port: int, workers: int, **kwargs: dict[str, Any]
+    ) -> None:
+        if bumper.db_backend != "sqlite":
+            # Only sqlite can be shared by processes
+            raise ValueError("Multiple MQTT workers require DB_BACKEND=sqlite")
+        if not hasattr(socket, "SO_REUSEPORT"):
+            raise ValueError("Multiple MQTT workers require SO_REUSEPORT")
+
+        self._host = host
+        self._port = port
+        self._workers = workers
+        self._kwargs = kwargs
+        self._socket_path = os.path.join(bumper.data_dir, _SOCKET_NAME)
+        self._state = "new"
+        self._server: asyncio.AbstractServer | None = None
+        self._processes: list[multiprocessing.process.BaseProcess] = []
+        # Connected workers with their presences and counters
+        self._presences: dict[asyncio.StreamWriter, set[tuple[str, str]]] = {}
+        self._stats: dict[asyncio.StreamWriter, dict[str, dict[str, int]]] = {}
+        self._routed: Counter[str] = Counter()
+        self._shutdown_stats: dict[str, int] = {}
+        self._log_listener: QueueListener | None = None
+        self._unsubscribe: Callable[[], None] | None = None
+
+    @property
+    def state(self) -> str:
+        """Return the state of the server."""
+        return self._state
+
+    @property
+    def sessions(self) -> list[Any]:
+        """Get sessions. They are held by the workers, therefore none."""
+        return []
+
+    def session_counts(self) -> Counter[str]:
+        """Get the number of sessions of all workers by state."""
+        return self._sum_stats("sessions")
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Get the summed counters of all workers and the bus."""
+        return {
+            "sessions": dict(self._sum_stats("sessions")),
+            "admission": dict(self._sum_stats("admission")),
+            "dedup": dict(self._sum_stats("dedup")),
+            "bus": {"workers": len(self._presences), **self._routed},
+            "shutdown": dict(self._shutdown_stats),
+        }
+
+    def _sum_stats(self, name: str) -> Counter[str]:
+        result: Counter[str] = Counter()
+        for stats in self._stats.values():
+            result.update(stats.get(name, {}))
+        return result
+
+    async def start(self) -> None:
+        """Start the hub and the workers."""
+        _LOGGER.info(
+            "Starting MQTT Server at %s:%d with %d workers",
+            self._host,
+            self._port,
+            self._workers,
+        )
+        self._state = "starting"
+        try:
+            if os.path.exists(self._socket_path):
+                os.remove(self._socket_path)  # Left over by a crash
+            self._server = await asyncio.start_unix_server(
+                self._handle_worker, path=self._socket_path
+            )
+            os.chmod(self._socket_path, 0o600)
+            loop = asyncio.get_running_loop()
+
+            def revoked(token: str) -> None:
+                # Revocations happen on the database thread
+                loop.call_soon_threadsafe(self._revoke, token)
+
+            self._unsubscribe = db.subscribe_revocations(revoked)
+
+            context = multiprocessing.get_context("spawn")
+            log_queue = context.Queue()
+            self._log_listener = log_from_queue(log_queue)
+            self._processes = [
+                context.Process(
+                    target=_run_worker,
+                    args=(
+                        self._host,
+                        self._port,
+                        self._socket_path,
+                        log_queue,
+                        logging.getLogger().getEffectiveLevel(),
+                        self._kwargs,
+                    ),
+                    name=f"bumper-mqtt-{index}",
+                    daemon=True,
+                )
+                for index in range(self._workers)
+            ]
+            for process in self._processes:
+                process.start()
+
+            await asyncio.wait_for(self._wait_for_workers(), _START_TIMEOUT)
+            self._state = "started"
+        except Exception:
+            _LOGGER.exception("An exception occurred during startup", exc_info=True)
+            await self.shutdown()
+            raise
+
+    async def _wait_for_workers(self) -> None:
+        # A worker reports its counters, as soon as its broker is started
+        while len(self._stats) < self._workers:
+            if any(process.exitcode is not None for process in self._processes):
+                raise RuntimeError("MQTT worker stopped during startup")
+            await asyncio.sleep(0.1)
+
+    async def shutdown(self) -> None:
+        """Shutdown hub and workers."""
+        start = time.monotonic()
+        self._state = "stopping"
+        # Workers shut down concurrently, when their bus connection is closed
+        for writer in list(self._presences):
+            writer.close()
+        deadline = start + bumper.mqtt_stop_timeout + _STOP_TIMEOUT
+        loop = asyncio.get_running_loop()
+        terminated = 0
+        for process in self._processes:
+            timeout = max(0.0, deadline - time.monotonic())
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                _LOGGER.warning("Terminating MQTT worker %s", process.name)
+                process.terminate()
+                terminated += 1
+        workers = len(self._processes)
+        self._processes = []
+
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self._socket_path):
+            os.remove(self._socket_path)
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+            self._unsubscribe = None
+        if self._log_listener is not None:
+            self._log_listener.stop()
+            self._log_listener = None
+        self._state = "stopped"
+
+        duration = time.monotonic() - start
+        self._shutdown_stats = {
+            "workers": workers,
+            "terminated": terminated,
+            "duration_ms": round(duration * 1000),
+        }
+        _LOGGER.info(
+            "MQTT Server stopped in %.2fs - Workers: %d - Terminated: %d",
+            duration,
+            workers,
+            terminated,
+        )
+
+    async def _handle_worker(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        presences = self._presences[writer] = set()
+        try:
+            async for (kind, topic, client_id, data) in read_frames(reader):
+                if kind == PUBLISH:
+                    await self._route(
+                        writer, encode_frame(kind, topic, client_id, data)
+                    )
+                    bot_state.update_from_mqtt(
+                        parse_topic(topic), Payload(data), client_id
+                    )
+                elif kind == PRESENCE:
+                    connected = data == b"1"
+                    presence.set_connected(topic, client_id, presence.MQTT, connected)
+                    if connected:
+                        presences.add((topic, client_id))
+                    else:
+                        presences.discard((topic, client_id))
+                elif kind == STATS:
+                    self._stats[writer] = json.loads(data)
+        finally:
+            # Connections of a stopped worker are gone
+            for (presence_kind, key) in presences:
+                presence.set_connected(presence_kind, key, presence.MQTT, False)
+            del self._presences[writer]
+            self._stats.pop(writer, None)
+            writer.close()
+
+    def _revoke(self, token: str) -> None:
+        """Send a revocation to all workers."""
+        frame = encode_frame(REVOKE, "", "", token.encode())
+        for writer in self._presences:
+            writer.write(frame)
+
+    async def _route(self, source: asyncio.StreamWriter, frame: bytes) -> None:
+        """Send frame to all other workers. A slow worker slows down the source."""
+        targets = [writer for writer in self._presences if writer is not source]
+        for writer in targets:
+            writer.write(frame)
+        await asyncio.gather(
+            *(writer.drain() for writer in targets), return_exceptions=True
+        )
+        self._routed["routed"] += 1
+        self._routed["routed_bytes"] += len(frame)
+
+
+def _run_worker(
+    host: str,
+    port: int,
+    socket_path: str,
+    log_queue: "multiprocessing.queues.Queue[Any]",
+    log_level: int,
+    kwargs: dict[str, Any],
+) -> None:
+    """Entry point of a worker process."""
+    log_to_queue(log_queue, log_level)
+    asyncio.run(_worker(host, port, socket_path, kwargs))
+
+
+async def _worker(
+    host: str, port: int, socket_path: str, kwargs: dict[str, Any]
+) -> None:
+    # pylint: disable-next=import-outside-toplevel
+    from bumper.mqtt.server import MQTTServer
+
+    (reader, writer) = await asyncio.open_unix_connection(socket_path)
+    bus = ShardBus(writer)
+    presence.subscribe(
+        lambda kind, key, protocol, connected: bus.presence(kind, key, connected)
+        if protocol == presence.MQTT
+        else None
+    )
+
+    mqtt_server = MQTTServer(host, port, bus=bus, **kwargs)
+    await mqtt_server.start()
+
+    async def report_stats() -> None:
+        while True:
+            bus.stats(mqtt_server.stats())
+            await asyncio.sleep(_STATS_INTERVAL)
+
+    stats_task = asyncio.create_task(report_stats())
+    try:
+        async for (kind, topic, _, data) in read_frames(reader):
+            if kind == PUBLISH:
+                await mqtt_server.deliver(topic, data)
+            elif kind == REVOKE:
+                await db_aio.run(db.apply_revocation, data.decode())
+    finally:
+        stats_task.cancel()
+        await mqtt_server.shutdown()
+        writer.close()
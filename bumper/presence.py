@@ -0,0 +1,100 @@
+"""Presence module.
+
+Keeps track of the connected bots (by DID) and clients (by resource) in memory.
+Connection state is volatile, therefore it isn't persisted in the database.
+"""
+from collections import Counter
+from collections.abc import Callable
+from typing import Any
+
+from bumper.util import get_logger
+
+_LOGGER = get_logger("presence")
+
+MQTT = "mqtt"
+XMPP = "xmpp"
+PROTOCOLS = (MQTT, XMPP)
+
+BOT = "bot"
+CLIENT = "client"
+
+# Called with kind (BOT or CLIENT), key (DID or resource), protocol and connected
+PresenceCallback = Callable[[str, str, str, bool], None]
+
+# Number of open connections per kind, protocol and key. A counter, as a bot may
+# reconnect before its old connection is closed.
+_connections: dict[tuple[str, str], Counter[str]] = {
+    (kind, protocol): Counter() for kind in (BOT, CLIENT) for protocol in PROTOCOLS
+}
+_callbacks: list[PresenceCallback] = []
+
+
+def set_connected(kind: str, key: str, protocol: str, connected: bool) -> None:
+    """Add or remove a connection of a bot or client."""
+    counter = _connections[(kind, protocol)]
+    was_connected = counter[key] > 0
+    if connected:
+        counter[key] += 1
+    elif was_connected:
+        counter[key] -= 1
+        if counter[key] == 0:
+            del counter[key]
+
+    if was_connected != (key in counter):
+        for callback in list(_callbacks):
+            try:
+                callback(kind, key, protocol, connected)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Presence callback failed")
+
+
+def bot_set_connected(did: str, protocol: str, connected: bool) -> None:
+    """Set bot connection state."""
+    set_connected(BOT, did, protocol, connected)
+
+
+def client_set_connected(resource: str, protocol: str, connected: bool) -> None:
+    """Set client connection state."""
+    set_connected(CLIENT, resource, protocol, connected)
+
+
+def is_connected(kind: str, key: str, protocol: str | None = None) -> bool:
+    """Return True, if bot or client is connected (with the given protocol)."""
+    protocols = PROTOCOLS if protocol is None else (protocol,)
+    return any(key in _connections[(kind, p)] for p in protocols)
+
+
+def bot_is_connected(did: str, protocol: str | None = None) -> bool:
+    """Return True, if bot is connected (with the given protocol)."""
+    return is_connected(BOT, did, protocol)
+
+
+def client_is_connected(resource: str, protocol: str | None = None) -> bool:
+    """Return True, if client is connected (with the given protocol)."""
+    return is_connected(CLIENT, resource, protocol)
+
+
+def connected(kind: str, protocol: str) -> set[str]:
+    """Return the keys of all connected bots or clients."""
+    return set(_connections[(kind, protocol)])
+
+
+def with_status(kind: str, doc: dict[str, Any]) -> dict[str, Any]:
+    """Return copy of a bot or client document with its connection state."""
+    key = doc.get("did" if kind == BOT else "resource", "")
+    result = dict(doc)
+    for protocol in PROTOCOLS:
+        result[f"{protocol}_connection"] = is_connected(kind, key, protocol)
+    return result
+
+
+def subscribe(callback: PresenceCallback) -> Callable[[], None]:
+    """Call callback on every presence change. Return the unsubscribe function."""
+    _callbacks.append(callback)
+    return lambda: _callbacks.remove(callback)
+
+
+def clear() -> None:
+    """Forget all connections."""
+    for counter in _connections.values():
+        counter.clear()
@@ -4,8 +4,10 @@ import logging
 import os
 import sys
 from collections.abc import MutableMapping
-from datetime import datetime
-from logging.handlers import RotatingFileHandler
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from multiprocessing.queues import Queue
+from typing import Any
 
 logformat = logging.Formatter(
     "[%(asctime)s] :: %(levelname)s :: %(name)s :: %(module)s :: %(funcName)s :: %(lineno)d :: %(message)s"
@@ -13,6 +15,8 @@ logformat = logging.Formatter(
 
 __loggers: MutableMapping[str, logging.Logger] = {}
 log_to_stdout = os.environ.get("LOG_TO_STDOUT")
+# Set in worker processes, which leave writing the log files to the main process
+__queue_handler: QueueHandler | None = None
 
 
 def get_logger(name: str, rotate: RotatingFileHandler | None = None) -> logging.Logger:
@@ -23,7 +27,9 @@ def get_logger(name: str, rotate: RotatingFileHandler | None = None) -> logging.
 
     logger = logging.getLogger(name)
 
-    if not log_to_stdout:
+    if __queue_handler is not None:
+        logger.addHandler(__queue_handler)
+    elif not log_to_stdout:
         if not rotate:
             rotate = RotatingFileHandler(
                 f"logs/{name}.log", maxBytes=5000000, backupCount=5
@@ -50,6 +56,39 @@ def get_logger(name: str, rotate: RotatingFileHandler | None = None) -> logging.
     return logger
 
 
+def log_to_queue(queue: "Queue[Any]", level: int) -> None:
+    """Send the records of all loggers to queue instead of to their handlers.
+
+    Used in worker processes with the level of the main process, see log_from_queue.
+    """
+    global __queue_handler  # pylint: disable=global-statement
+    logging.getLogger().setLevel(level)
+    __queue_handler = QueueHandler(queue)
+    for logger in __loggers.values():
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+        logger.addHandler(__queue_handler)
+
+
+class _LoggerHandler(logging.Handler):
+    """Pass records to the handlers of the logger they were logged with."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        logging.getLogger(record.name).handle(record)
+
+
+def log_from_queue(queue: "Queue[Any]") -> QueueListener:
+    """Log the records of worker processes sent to queue. Return the started listener.
+
+    Only one process may write to a rotating log file, else the rotation of the
+    others corrupts it.
+    """
+    listener = QueueListener(queue, _LoggerHandler())
+    listener.start()
+    return listener
+
+
 def convert_to_millis(seconds: int | float) -> int:
     """Convert seconds to milliseconds."""
     return int(round(seconds * 1000))
@@ -57,4 +96,4 @@ def convert_to_millis(seconds: int | float) -> int:
 
 def get_current_time_as_millis() -> int:
     """Get current time in millis."""
-    return convert_to_millis(datetime.utcnow().timestamp())
+    return convert_to_millis(datetime.now(timezone.utc).timestamp())
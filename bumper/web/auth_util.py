@@ -1,6 +1,5 @@
 """Auth util module."""
 import logging
-import uuid
 from typing import Any
 
 from aiohttp import web
@@ -9,16 +8,17 @@ from aiohttp.web_request import Request
 from aiohttp.web_response import Response
 
 from bumper import db, use_auth
+from bumper.db import aio as db_aio
 from bumper.db import (
-    _db_get,
+    bot_get_all,
+    transaction,
     user_add,
-    user_add_authcode,
-    user_add_bot,
+    user_add_bots,
     user_add_device,
-    user_add_token,
     user_by_device_id,
+    user_create_authcode,
+    user_create_token,
     user_get,
-    user_get_token,
     user_revoke_expired_tokens,
 )
 from bumper.models import (
@@ -26,24 +26,29 @@ from bumper.models import (
     ERR_TOKEN_INVALID,
     ERR_USER_NOT_ACTIVATED,
     RETURN_API_SUCCESS,
+    BumperUser,
 )
 from bumper.util import get_current_time_as_millis
 from bumper.web.plugins import get_success_response
 from bumper.web.server import _LOGGER
 
 
-def _generate_token(user: dict[str, Any]) -> str:
-    """Generate token."""
-    token = uuid.uuid4().hex
-    user_add_token(user["userid"], token)
-    return token
+def _generate_token(user: BumperUser, devid: str) -> str:
+    """Generate token or reuse the valid one of the device."""
+    return user_create_token(user.userid, devid)
 
 
-def _generate_authcode(user: dict[str, Any], countrycode: str, token: str) -> str:
+def _renew_token(user: BumperUser, devid: str) -> str:
+    """Revoke expired tokens and generate a new one. Runs on the database thread."""
+    with transaction():
+        # Deactivate old tokens and authcodes
+        user_revoke_expired_tokens(user.userid)
+        return _generate_token(user, devid)
+
+
+def _generate_authcode(user: BumperUser, countrycode: str, token: str) -> str:
     """Generate auth token."""
-    tmpauthcode = f"{countrycode}_{uuid.uuid4().hex}"
-    user_add_authcode(user["userid"], token, tmpauthcode)
-    return tmpauthcode
+    return user_create_authcode(user.userid, token, countrycode)
 
 
 async def login(request: Request) -> Response:
@@ -56,23 +61,22 @@ async def login(request: Request) -> Response:
         if use_auth:
             if user_devid != "":
                 # Performing basic "auth" using devid, super insecure
-                user = user_by_device_id(user_devid)
+                user = await db_aio.user_by_device_id(user_devid)
                 if user:
                     if "checkLogin" in request.path:
-                        return web.json_response(
-                            _check_token(
-                                apptype, countrycode, user, request.query["accessToken"]
-                            )[1]
+                        (_, body) = await db_aio.run(
+                            _check_token,
+                            apptype,
+                            countrycode,
+                            user,
+                            request.query["accessToken"],
                         )
+                        return web.json_response(body)
 
-                    # Deactivate old tokens and authcodes
-                    user_revoke_expired_tokens(user["userid"])
-
+                    token = await db_aio.run(_renew_token, user, user_devid)
                     body = {
                         "code": API_ERRORS[RETURN_API_SUCCESS],
-                        "data": _get_login_details(
-                            apptype, countrycode, user, _generate_token(user)
-                        ),
+                        "data": _get_login_details(apptype, countrycode, user, token),
                         "msg": "操作成功",
                         "time": get_current_time_as_millis(),
                     }
@@ -87,7 +91,9 @@ async def login(request: Request) -> Response:
                 }
             )
 
-        return web.json_response(_auth_any(user_devid, apptype, countrycode, request))
+        return web.json_response(
+            await db_aio.run(_auth_any, user_devid, apptype, countrycode, request)
+        )
     except Exception:  # pylint: disable=broad-except
         _LOGGER.exception("An exception occurred", exc_info=True)
 
@@ -102,15 +108,18 @@ async def get_authcode(request: Request) -> Response:
             user_devid = request.query["deviceId"]  # Ecovacs Home
 
         if user_devid:
-            user = user_by_device_id(user_devid)
+            user = await db_aio.user_by_device_id(user_devid)
             if user:
                 if "accessToken" in request.query:
-                    token = user_get_token(user["userid"], request.query["accessToken"])
+                    token = await db_aio.user_get_token(
+                        user.userid, request.query["accessToken"]
+                    )
                     if token:
-                        if "authcode" in token:
-                            authcode = token["authcode"]
+                        if token.authcode:
+                            authcode = token.authcode
                         else:
-                            authcode = _generate_authcode(
+                            authcode = await db_aio.run(
+                                _generate_authcode,
                                 user,
                                 request.match_info.get("country", "us"),
                                 request.query["accessToken"],
@@ -139,9 +148,9 @@ async def get_authcode(request: Request) -> Response:
 
 
 def _check_token(
-    apptype: str, countrycode: str, user: dict[str, Any], token: str
+    apptype: str, countrycode: str, user: BumperUser, token: str
 ) -> tuple[bool, dict[str, Any]]:
-    if db.check_token(user["userid"], token):
+    if db.check_token(user.userid, token):
         return (
             True,
             {
@@ -166,53 +175,57 @@ def _check_token(
 def _auth_any(
     devid: str, apptype: str, country: str, request: Request
 ) -> dict[str, Any]:
-    user_devid = devid
-    countrycode = country
-    user = user_by_device_id(user_devid)
-    bots = _db_get().table("bots").all()
-
-    if not user:
-        user_add("tmpuser")  # Add a new user
-        tmp = user_get("tmpuser")
-        assert tmp
-        user = tmp
-
-    token = _generate_token(user)
-    user_add_device(user["userid"], user_devid)
-
-    for bot in bots:  # Add all bots to the user
-        if "did" in bot:
-            user_add_bot(user["userid"], bot["did"])
-        else:
-            _LOGGER.error("No DID for bot: %s", bot)
-
-    if "checkLogin" in request.path:  # If request was to check a token do so
-        (success, body) = _check_token(
-            apptype, countrycode, user, request.query["accessToken"]
-        )
-        if success:
-            return body
+    """Login any device as one unit of work. Runs on the database thread."""
+    with transaction():
+        user_devid = devid
+        countrycode = country
+        user = user_by_device_id(user_devid)
+        bots = bot_get_all()
+
+        if not user:
+            user_add("tmpuser")  # Add a new user
+            tmp = user_get("tmpuser")
+            assert tmp
+            user = tmp
+
+        user_add_device(user.userid, user_devid)
+
+        dids = []
+        for bot in bots:  # Add all bots to the user
+            if bot.did:
+                dids.append(bot.did)
+            else:
+                _LOGGER.error("No DID for bot: %s", bot)
+        user_add_bots(user.userid, dids)
+
+        if "checkLogin" in request.path:  # If request was to check a token do so
+            (success, body) = _check_token(
+                apptype, countrycode, user, request.query["accessToken"]
+            )
+            if success:
+                return body
 
-    # Deactivate old tokens and authcodes
-    user_revoke_expired_tokens(user["userid"])
+        # Deactivate old tokens and authcodes
+        user_revoke_expired_tokens(user.userid)
 
-    body = {
-        "code": RETURN_API_SUCCESS,
-        "data": _get_login_details(apptype, countrycode, user, token),
-        "msg": "操作成功",
-        "time": get_current_time_as_millis(),
-    }
+        token = _generate_token(user, user_devid)
+        body = {
+            "code": RETURN_API_SUCCESS,
+            "data": _get_login_details(apptype, countrycode, user, token),
+            "msg": "操作成功",
+            "time": get_current_time_as_millis(),
+        }
 
-    return body
+        return body
 
 
 def _get_login_details(
-    apptype: str, countrycode: str, user: dict[str, Any], token: str
+    apptype: str, countrycode: str, user: BumperUser, token: str
 ) -> dict[str, Any]:
     details: dict[str, Any] = {
         "accessToken": token,
-        "uid": f"fuid_{user['userid']}",
-        "username": f"fusername_{user['userid']}",
+        "uid": f"fuid_{user.userid}",
+        "username": f"fusername_{user.userid}",
         "country": countrycode,
         "email": "null@null.com",
     }
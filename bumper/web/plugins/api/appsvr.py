@@ -1,5 +1,4 @@
 """Appsvr plugin module."""
-import copy
 import json
 import logging
 from collections.abc import Iterable
@@ -11,8 +10,9 @@ from aiohttp.web_request import Request
 from aiohttp.web_response import Response
 from aiohttp.web_routedef import AbstractRouteDef
 
-import bumper
-from bumper.db import _db_get, token_by_authcode, user_add_oauth
+from bumper import presence
+from bumper.db import aio as db_aio
+from bumper.models import VacBotDevice
 
 from .. import WebserverPlugin
 from .pim import get_product_iot_map
@@ -72,10 +72,10 @@ async def _handle_appsvr_app(request: Request) -> Response:
         todo = postbody["todo"]
 
         if todo == "GetGlobalDeviceList":
-            bots = _db_get().table("bots").all()
+            bots = await db_aio.bot_get_all()
             devices = []
             for bot in bots:
-                if bot["class"] != "":
+                if bot.vac_bot_device_class != "":
                     device = _include_product_iot_map_info(bot)
                     # Happens if the bot isn't on the EcoVacs Home list
                     if device is not None:
@@ -104,8 +104,8 @@ async def _handle_appsvr_app(request: Request) -> Response:
     raise HTTPInternalServerError
 
 
-def _include_product_iot_map_info(bot: dict[str, Any]) -> dict[str, Any]:
-    result = copy.deepcopy(bot)
+def _include_product_iot_map_info(bot: VacBotDevice) -> dict[str, Any]:
+    result = presence.with_status(presence.BOT, bot.asdict())
 
     for botprod in get_product_iot_map()[0]:
         if botprod["classid"] == result["class"]:
@@ -131,15 +131,9 @@ def _include_product_iot_map_info(bot: dict[str, Any]) -> dict[str, Any]:
             # }
 
             result["status"] = (
-                1 if bot["mqtt_connection"] or bot["xmpp_connection"] else 0
+                1 if result["mqtt_connection"] or result["xmpp_connection"] else 0
             )
 
-            # mqtt_connection is not always set correctly, therefore workaround until fixed properly
-            for session in bumper.mqtt_server.sessions:
-                did = session.client_id.split("@")[0]
-                if did == bot["did"] and session.transitions.state == "connected":
-                    result["status"] = 1
-
             break
     return result
 
@@ -179,9 +173,9 @@ async def _handle_appsvr_service_list(_: Request) -> Response:
 
 async def _handle_appsvr_oauth_callback(request: Request) -> Response:
     try:
-        token = token_by_authcode(request.query["code"])
+        token = await db_aio.token_by_authcode(request.query["code"])
         if token:
-            oauth = user_add_oauth(token["userid"])
+            oauth = await db_aio.user_add_oauth(token.userid)
             if oauth:
                 body = {
                     "code": 0,
@@ -12,7 +12,8 @@ from aiohttp.web_response import Response
 from aiohttp.web_routedef import AbstractRouteDef
 
 import bumper
-from bumper.db import bot_get
+from bumper import bot_state, presence
+from bumper.db import aio as db_aio
 from bumper.models import ERR_COMMON
 
 from .. import WebserverPlugin
@@ -29,8 +30,17 @@ async def _handle_dim_devmanager(request: Request) -> Response:
             did = json_body["toId"]
 
         if did != "":
-            bot = bot_get(did)
-            if bot and bot["company"] == "eco-ng" and bot["mqtt_connection"]:
+            bot = await db_aio.bot_get(did)
+            if (
+                bot
+                and bot.company == "eco-ng"
+                and presence.bot_is_connected(did, presence.MQTT)
+            ):
+                # State getters are answered from the last events of the bot
+                cached = bot_state.getter_response(json_body, randomid)
+                if cached is not None:
+                    return web.json_response(cached)
+
                 retcmd = await bumper.mqtt_helperbot.send_command(json_body, randomid)
                 body = retcmd
                 logging.debug("Send Bot - %s", json_body)
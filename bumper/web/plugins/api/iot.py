@@ -12,7 +12,8 @@ from aiohttp.web_response import Response
 from aiohttp.web_routedef import AbstractRouteDef
 
 import bumper
-from bumper.db import bot_get
+from bumper import bot_state
+from bumper.db import aio as db_aio
 
 from .. import WebserverPlugin
 
@@ -27,8 +28,13 @@ async def _handle_devmanager_bot_command(request: Request) -> Response:
             did = json_body["toId"]
 
         if did != "":
-            bot = bot_get(did)
-            if bot and bot["company"] == "eco-ng":
+            bot = await db_aio.bot_get(did)
+            if bot and bot.company == "eco-ng":
+                # State getters are answered from the last events of the bot
+                cached = bot_state.getter_response(json_body, randomid)
+                if cached is not None:
+                    return web.json_response(cached)
+
                 retcmd = await bumper.mqtt_helperbot.send_command(json_body, randomid)
                 body = retcmd
                 logging.debug("Send Bot - %s", json_body)
@@ -12,7 +12,7 @@ from aiohttp.web_response import Response
 from aiohttp.web_routedef import AbstractRouteDef
 
 import bumper
-from bumper.db import bot_get
+from bumper.db import aio as db_aio
 from bumper.models import ERR_COMMON
 
 from .. import WebserverPlugin
@@ -27,7 +27,7 @@ async def _handle_lg_log(request: Request) -> Response:
 
         did = json_body["did"]
 
-        botdetails = bot_get(did)
+        botdetails = await db_aio.bot_get(did)
         if botdetails:
             if "cmdName" not in json_body:
                 if "td" in json_body:
@@ -37,10 +37,10 @@ async def _handle_lg_log(request: Request) -> Response:
                 json_body["toId"] = did
 
             if "toType" not in json_body:
-                json_body["toType"] = botdetails["class"]
+                json_body["toType"] = botdetails.vac_bot_device_class
 
             if "toRes" not in json_body:
-                json_body["toRes"] = botdetails["resource"]
+                json_body["toRes"] = botdetails.resource
 
             if "payloadType" not in json_body:
                 json_body["payloadType"] = "x"
@@ -52,8 +52,8 @@ async def _handle_lg_log(request: Request) -> Response:
                     json_body["payload"] = '<ctl count="30"/>'
 
         if did != "":
-            bot = bot_get(did)
-            if bot and bot["company"] == "eco-ng":
+            bot = await db_aio.bot_get(did)
+            if bot and bot.company == "eco-ng":
                 retcmd = await bumper.mqtt_helperbot.send_command(json_body, randomid)
                 body = retcmd
                 logging.debug("Send Bot - %s", json_body)
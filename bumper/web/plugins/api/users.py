@@ -9,14 +9,8 @@ from aiohttp.abc import Request
 from aiohttp.web_response import Response
 from aiohttp.web_routedef import AbstractRouteDef
 
-from bumper import bumper_announce_ip
-from bumper.db import (
-    _db_get,
-    bot_remove,
-    bot_set_nick,
-    check_authcode,
-    login_by_it_token,
-)
+from bumper import bumper_announce_ip, presence
+from bumper.db import aio as db_aio
 
 from .. import WebserverPlugin
 
@@ -78,7 +72,9 @@ async def _handle_usersapi(request: Request) -> Response:
 
             elif todo == "loginByItToken":
                 if "userId" in postbody:
-                    if check_authcode(postbody["userId"], postbody["token"]):
+                    if await db_aio.check_authcode(
+                        postbody["userId"], postbody["token"]
+                    ):
                         body = {
                             "resource": postbody["resource"],
                             "result": "ok",
@@ -87,7 +83,7 @@ async def _handle_usersapi(request: Request) -> Response:
                             "userId": postbody["userId"],
                         }
                 else:  # EcoVacs Home LoginByITToken
-                    login_token = login_by_it_token(postbody["token"])
+                    login_token = await db_aio.login_by_it_token(postbody["token"])
                     if login_token:
                         body = {
                             "resource": postbody["resource"],
@@ -101,21 +97,24 @@ async def _handle_usersapi(request: Request) -> Response:
 
             elif todo == "GetDeviceList":
                 body = {
-                    "devices": _db_get().table("bots").all(),
+                    "devices": [
+                        presence.with_status(presence.BOT, bot.asdict())
+                        for bot in await db_aio.bot_get_all()
+                    ],
                     "result": "ok",
                     "todo": "result",
                 }
 
             elif todo == "SetDeviceNick":
-                bot_set_nick(postbody["did"], postbody["nick"])
+                await db_aio.bot_set_nick(postbody["did"], postbody["nick"])
                 body = {"result": "ok", "todo": "result"}
 
             elif todo == "AddOneDevice":
-                bot_set_nick(postbody["did"], postbody["nick"])
+                await db_aio.bot_set_nick(postbody["did"], postbody["nick"])
                 body = {"result": "ok", "todo": "result"}
 
             elif todo == "DeleteOneDevice":
-                bot_remove(postbody["did"])
+                await db_aio.bot_remove(postbody["did"])
                 body = {"result": "ok", "todo": "result"}
 
             return web.json_response(body)
@@ -8,7 +8,7 @@ from aiohttp.web_request import Request
 from aiohttp.web_response import Response
 from aiohttp.web_routedef import AbstractRouteDef
 
-from bumper.db import check_token, user_by_device_id, user_revoke_token
+from bumper.db import aio as db_aio
 from bumper.web import auth_util
 
 from ... import WebserverPlugin, get_success_response
@@ -84,11 +84,12 @@ async def _logout(request: Request) -> Response:
     try:
         user_device_id = request.match_info.get("devid", None)
         if user_device_id:
-            user = user_by_device_id(user_device_id)
+            user = await db_aio.user_by_device_id(user_device_id)
             if user:
-                if check_token(user["userid"], request.query["accessToken"]):
+                token = request.query["accessToken"]
+                if await db_aio.check_token(user.userid, token):
                     # Deactivate old tokens and authcodes
-                    user_revoke_token(user["userid"], request.query["accessToken"])
+                    await db_aio.user_revoke_token(user.userid, token)
 
         return get_success_response(None)
 
@@ -101,15 +102,15 @@ async def _logout(request: Request) -> Response:
 async def _get_user_account_info(request: Request) -> Response:
     try:
         user_devid = request.match_info.get("devid", "")
-        user = user_by_device_id(user_devid)
+        user = await db_aio.user_by_device_id(user_devid)
         if user:
-            username = f"fusername_{user['userid']}"
+            username = f"fusername_{user.userid}"
             return get_success_response(
                 {
                     "email": "null@null.com",
                     "hasMobile": "N",
                     "hasPassword": "Y",
-                    "uid": f"fuid_{user['userid']}",
+                    "uid": f"fuid_{user.userid}",
                     "userName": username,
                     "obfuscatedMobile": None,
                     "mobile": None,
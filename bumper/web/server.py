@@ -5,6 +5,7 @@ import json
 import logging
 import os
 import ssl
+import time
 from typing import Any
 
 import aiohttp
@@ -16,7 +17,8 @@ from aiohttp.web_request import Request
 from aiohttp.web_response import Response
 
 import bumper
-from bumper.db import _db_get, bot_get, bot_remove, client_get, client_remove
+from bumper import bot_state, presence
+from bumper.db import aio as db_aio
 from bumper.dns import get_resolver_with_public_nameserver
 from bumper.util import get_logger
 from bumper.web.middlewares import CustomEncoder, log_all_requests
@@ -84,6 +86,7 @@ class WebServer:
         self._app.add_routes(
             [
                 web.get("/bot/remove/{did}", self._handle_remove_bot),
+                web.get("/bot/state", self._handle_bot_state),
                 web.get(
                     "/client/remove/{resource}",
                     self._handle_remove_client,
@@ -92,6 +95,9 @@ class WebServer:
                     "/restart_{service}",
                     self._handle_restart_service,
                 ),
+                web.get("/stats/tokens", self._handle_token_stats),
+                web.get("/stats/mqtt", self._handle_mqtt_stats),
+                web.get("/db/snapshot", self._handle_db_snapshot),
             ]
         )
 
@@ -159,8 +165,14 @@ class WebServer:
 
     async def _handle_base(self, request: Request) -> Response:
         try:
-            bots = _db_get().table("bots").all()
-            clients = _db_get().table("clients").all()
+            bots = [
+                presence.with_status(presence.BOT, bot.asdict())
+                for bot in await db_aio.bot_get_all()
+            ]
+            clients = [
+                presence.with_status(presence.CLIENT, client.asdict())
+                for client in await db_aio.client_get_all()
+            ]
             mq_sessions = []
             for session in bumper.mqtt_server.sessions:
                 mq_sessions.append(
@@ -178,6 +190,7 @@ class WebServer:
                     "state": bumper.mqtt_server.state,
                     "sessions": {
                         "count": len(mq_sessions),
+                        "states": bumper.mqtt_server.session_counts(),
                         "clients": mq_sessions,
                     },
                 },
@@ -196,10 +209,12 @@ class WebServer:
         asyncio.create_task(bumper.mqtt_helperbot.start())
 
     async def _restart_mqtt_server(self) -> None:
+        start = time.monotonic()
         if bumper.mqtt_server.state not in ["stopped", "not_started"]:
             await bumper.mqtt_server.shutdown()
 
-        asyncio.create_task(bumper.mqtt_server.start())
+        await bumper.mqtt_server.start()
+        _LOGGER.info("MQTT Server restarted in %.2fs", time.monotonic() - start)
 
     async def _handle_restart_service(self, request: Request) -> Response:
         try:
@@ -229,8 +244,8 @@ class WebServer:
     async def _handle_remove_bot(self, request: Request) -> Response:
         try:
             did = request.match_info.get("did", "")
-            bot_remove(did)
-            if bot_get(did):
+            await db_aio.bot_remove(did)
+            if await db_aio.bot_get(did):
                 return web.json_response({"status": "failed to remove bot"})
 
             return web.json_response({"status": "successfully removed bot"})
@@ -240,11 +255,54 @@ class WebServer:
 
         raise HTTPInternalServerError
 
+    async def _handle_bot_state(self, request: Request) -> Response:
+        try:
+            dids = request.query.getall("did", []) or [
+                bot.did for bot in await db_aio.bot_get_all()
+            ]
+            bots = {
+                did: {
+                    name: state.asdict()
+                    for (name, state) in bot_state.get_all(did).items()
+                }
+                for did in dids
+            }
+            return web.json_response({"bots": bots, "stats": bot_state.stats()})
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("An exception occurred", exc_info=True)
+
+        raise HTTPInternalServerError
+
+    async def _handle_token_stats(self, _: Request) -> Response:
+        try:
+            return web.json_response(await db_aio.token_stats())
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("An exception occurred", exc_info=True)
+
+        raise HTTPInternalServerError
+
+    async def _handle_mqtt_stats(self, _: Request) -> Response:
+        try:
+            return web.json_response(bumper.mqtt_server.stats())
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("An exception occurred", exc_info=True)
+
+        raise HTTPInternalServerError
+
+    async def _handle_db_snapshot(self, request: Request) -> Response:
+        try:
+            compact = bumper.strtobool(request.query.get("compact"))
+            return web.json_response(await db_aio.snapshot(compact=compact))
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("An exception occurred", exc_info=True)
+
+        raise HTTPInternalServerError
+
     async def _handle_remove_client(self, request: Request) -> Response:
         try:
             resource = request.match_info.get("resource", "")
-            client_remove(resource)
-            if client_get(resource):
+            await db_aio.client_remove(resource)
+            if await db_aio.client_get(resource):
                 return web.json_response({"status": "failed to remove client"})
 
             return web.json_response({"status": "successfully removed client"})
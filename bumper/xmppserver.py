@@ -9,15 +9,10 @@ from asyncio import transports
 from typing import Optional
 
 import bumper
-from bumper.db import (
-    bot_add,
-    bot_get,
-    bot_set_xmpp,
-    check_authcode,
-    client_add,
-    client_get,
-    client_set_xmpp,
-)
+from bumper import bot_state, presence
+from bumper.admission import Admission, AdmissionRejected, create_admission
+from bumper.db import aio as db_aio
+from bumper.db import bot_add, client_add
 
 xmppserverlog = bumper.get_logger("xmppserver")
 boterrorlog = bumper.get_logger("boterror")
@@ -35,7 +30,8 @@ class XMPPServer:
         # Initialize bot server
         self._host = host
         self._port = port
-        self.xmpp_protocol = lambda: XMPPServer_Protocol()
+        self.admission = create_admission()
+        self.xmpp_protocol = lambda: XMPPServer_Protocol(self.admission)
 
     async def start_async_server(self) -> None:
         """Start server."""
@@ -72,13 +68,24 @@ class XMPPServer_Protocol(asyncio.Protocol):
     exit_flag = False
     _client: Optional["XMPPAsyncClient"] = None
 
+    def __init__(self, admission: Admission | None = None) -> None:
+        self._admission = admission
+
     def connection_made(self, transport: transports.BaseTransport) -> None:
         """Establish connection."""
         if self._client:  # Existing client... upgrading to TLS
             xmppserverlog.debug(f"Upgraded connection for {self._client.address}")
             self._client.transport = transport
         else:
-            client = XMPPAsyncClient(transport)
+            if self._admission:
+                peer = transport.get_extra_info("peername")
+                try:
+                    self._admission.admit(peer[0] if peer else "")
+                except AdmissionRejected as e:
+                    xmppserverlog.info(f"Connection from {peer} rejected: {e}")
+                    _reject_connection(transport, e)
+                    return
+            client = XMPPAsyncClient(transport, self._admission)
             self._client = client
             XMPPServer.clients.append(client)
             self._client.state = getattr(client, "CONNECT")
@@ -103,6 +110,30 @@ class XMPPServer_Protocol(asyncio.Protocol):
             self._client.parse_data(data)
 
 
+def _reject_connection(
+    transport: transports.BaseTransport,
+    error: AdmissionRejected,
+    stream_open: bool = False,
+) -> None:
+    """Close the stream with a resource-constraint error and a retry hint."""
+    if isinstance(transport, transports.WriteTransport):
+        header = (
+            ""
+            if stream_open
+            else "<stream:stream xmlns:stream='http://etherx.jabber.org/streams' "
+            "xmlns='jabber:client' version='1.0'>"
+        )
+        transport.write(
+            f"{header}<stream:error>"
+            "<resource-constraint xmlns='urn:ietf:params:xml:ns:xmpp-streams'/>"
+            "<text xmlns='urn:ietf:params:xml:ns:xmpp-streams'>"
+            f"retry after {error.retry_after:.1f}s"
+            "</text>"
+            "</stream:error></stream:stream>".encode()
+        )
+    transport.close()
+
+
 class XMPPAsyncClient:
     """XMPP client."""
 
@@ -117,7 +148,10 @@ class XMPPAsyncClient:
     CONTROLLER = 2
     TLSUpgraded = False
 
-    def __init__(self, transport: transports.BaseTransport):
+    def __init__(
+        self, transport: transports.BaseTransport, admission: Admission | None = None
+    ):
+        self._admission = admission or Admission(rate=0)
         self.type = self.UNKNOWN
         self.state = self.IDLE
         self.address = transport.get_extra_info("peername")
@@ -126,6 +160,7 @@ class XMPPAsyncClient:
         self.devclass = ""
         self.bumper_jid = ""
         self.uid = ""
+        self._presence_set = False
         self.log_sent_message = True  # Set to true to log sends
         self.log_incoming_data = True  # Set to true to log sends
         xmppserverlog.debug(f"new client with ip {self.address}")
@@ -147,20 +182,23 @@ class XMPPAsyncClient:
 
     def _disconnect(self) -> None:
         try:
-
-            bot = bot_get(self.uid)
-            if bot:
-                bot_set_xmpp(bot["did"], False)
-
-            client = client_get(self.clientresource)
-            if client:
-                client_set_xmpp(client["resource"], False)
+            self._set_connected(False)
 
             self.transport.close()
 
         except Exception as e:
             xmppserverlog.error(f"{e}")
 
+    def _set_connected(self, connected: bool) -> None:
+        if connected == self._presence_set:
+            return
+
+        self._presence_set = connected
+        if self.type == self.BOT:
+            presence.bot_set_connected(self.uid, presence.XMPP, connected)
+        elif self.type == self.CONTROLLER:
+            presence.client_set_connected(self.clientresource, presence.XMPP, connected)
+
     def _tag_strip_uri(self, tag: str) -> str:
         try:
             if tag[0] == "{":
@@ -239,6 +277,14 @@ class XMPPAsyncClient:
 
             if len(xml[0]) > 0:
                 ctl = xml[0][0]
+                if ctl.get("td") and self.type == self.BOT:
+                    # Event of the bot, keep it as its last known state
+                    bot_state.update(
+                        self.uid,
+                        ctl.get("td", ""),
+                        bot_state.XML,
+                        ET.tostring(ctl).decode("utf-8"),
+                    )
                 if ctl.get("admin") and self.type == self.BOT:
                     xmppserverlog.debug(
                         "admin username received from bot: {}".format(ctl.get("admin"))
@@ -496,22 +542,29 @@ class XMPPAsyncClient:
                         self.address[0], self.address[1]
                     )
                 )
-                self.send(
-                    "<proceed xmlns='urn:ietf:params:xml:ns:xmpp-tls'/>"
-                )  # send process to client
+                try:
+                    # Handshakes are expensive, only a limited number run at once
+                    async with self._admission.handshake():
+                        self.send(
+                            "<proceed xmlns='urn:ietf:params:xml:ns:xmpp-tls'/>"
+                        )  # send process to client
 
-                # After proceed the connection should be upgraded to TLS
-                loop = asyncio.get_event_loop()
-                transport = self.transport
-                protocol = self.transport.get_protocol()
+                        # After proceed the connection should be upgraded to TLS
+                        loop = asyncio.get_event_loop()
+                        transport = self.transport
+                        protocol = self.transport.get_protocol()
 
-                ssl_ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-                ssl_ctx.load_cert_chain(bumper.server_cert, bumper.server_key)
-                ssl_ctx.load_verify_locations(cafile=bumper.ca_cert)
+                        ssl_ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+                        ssl_ctx.load_cert_chain(bumper.server_cert, bumper.server_key)
+                        ssl_ctx.load_verify_locations(cafile=bumper.ca_cert)
 
-                new_transport = await loop.start_tls(
-                    transport, protocol, ssl_ctx, server_side=True
-                )
+                        new_transport = await loop.start_tls(
+                            transport, protocol, ssl_ctx, server_side=True
+                        )
+                except AdmissionRejected as e:
+                    xmppserverlog.info(f"TLS upgrade of {self.address} rejected: {e}")
+                    _reject_connection(self.transport, e, stream_open=True)
+                    return
                 protocol.connection_made(new_transport)
 
         except Exception as e:
@@ -536,7 +589,9 @@ class XMPPAsyncClient:
                 authcode = saslauth[2]
 
             if self.devclass:  # if there is a devclass it is a bot
-                bot_add(self.uid, self.uid, self.devclass, "atom", "eco-legacy")
+                db_aio.submit(
+                    bot_add, self.uid, self.uid, self.devclass, "atom", "eco-legacy"
+                )
                 self.type = self.BOT
                 xmppserverlog.info(f"bot authenticated SN: {self.uid}")
                 # Send response
@@ -547,46 +602,40 @@ class XMPPAsyncClient:
                 # Client authenticated, move to next state
                 self.set_state("INIT")
 
+            elif not bumper.use_auth:
+                self._handle_sasl_auth_result(True)
             else:
-                auth = False
-                if check_authcode(self.uid, authcode):
-                    auth = True
-                elif not bumper.use_auth:
-                    auth = True
-
-                if auth:
-                    self.type = self.CONTROLLER
-                    client_add(self.uid, "bumper", self.clientresource)
-                    xmppserverlog.info(f"client authenticated {self.uid}")
-
-                    # Client authenticated, move to next state
-                    self.set_state("INIT")
-
-                    # Send response
-                    self.send(
-                        '<success xmlns="urn:ietf:params:xml:ns:xmpp-sasl"/>'
-                    )  # Success
-
-                else:
-                    # Failed to authenticate
-                    self.send(
-                        '<response xmlns="urn:ietf:params:xml:ns:xmpp-sasl"/>'
-                    )  # Fail
+                # Respond once the authcode is checked on the database thread
+                asyncio.Task(self._check_sasl_authcode(authcode))
 
         except Exception as e:
             xmppserverlog.exception(f"{e}")
 
-    def _handle_bind(self, xml: ET.Element) -> None:
+    async def _check_sasl_authcode(self, authcode: str) -> None:
         try:
+            auth = await db_aio.check_authcode(self.uid, authcode)
+            self._handle_sasl_auth_result(auth)
+        except Exception as e:
+            xmppserverlog.exception(f"{e}")
 
-            bot = bot_get(self.uid)
-            if bot:
-                bot_set_xmpp(bot["did"], True)
+    def _handle_sasl_auth_result(self, auth: bool) -> None:
+        if auth:
+            self.type = self.CONTROLLER
+            db_aio.submit(client_add, self.uid, "bumper", self.clientresource)
+            xmppserverlog.info(f"client authenticated {self.uid}")
 
-            client = client_get(self.clientresource)
-            if client:
-                client_set_xmpp(client["resource"], True)
+            # Client authenticated, move to next state
+            self.set_state("INIT")
 
+            # Send response
+            self.send('<success xmlns="urn:ietf:params:xml:ns:xmpp-sasl"/>')  # Success
+
+        else:
+            # Failed to authenticate
+            self.send('<response xmlns="urn:ietf:params:xml:ns:xmpp-sasl"/>')  # Fail
+
+    def _handle_bind(self, xml: ET.Element) -> None:
+        try:
             clientbindxml = list(xml)
             clientresourcexml = list(clientbindxml[0])
             if self.devclass:  # its a bot
@@ -629,6 +678,7 @@ class XMPPAsyncClient:
                     xml.get("id"), self.bumper_jid
                 )
 
+            self._set_connected(True)
             self.set_state("BIND")
             self.send(res)
 
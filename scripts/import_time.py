@@ -0,0 +1,57 @@
+"""Measure the import time of bumper modules.
+
+Runs each import in a fresh interpreter with -X importtime, so no module is
+cached, and prints the median total and the slowest imported packages:
+
+    python scripts/import_time.py [module ...] [--runs N] [--top N]
+
+Run it on the target (e.g. the arm32 image) to compare startup changes.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from collections import Counter
+
+DEFAULT_MODULES = ["bumper.mqtt.server", "bumper"]
+
+
+def import_times(module: str) -> tuple[int, Counter[str]]:
+    """Return total and self time per top level package of an import in us."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    total = 0
+    packages: Counter[str] = Counter()
+    # Lines: "import time: <self us> | <cumulative us> | <indented name>"
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        (self_us, cumulative_us, name) = line[len("import time:") :].split("|")
+        packages[name.strip().split(".")[0]] += int(self_us)
+        if name == f" {module}":
+            total = int(cumulative_us)
+    return (total, packages)
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    for module in args.modules:
+        runs = [import_times(module) for _ in range(args.runs)]
+        total = statistics.median(total for (total, _) in runs)
+        print(f"{module}: {total / 1000:.1f} ms (median of {args.runs} runs)")
+        for (package, self_us) in runs[-1][1].most_common(args.top):
+            print(f"  {package:<24} {self_us / 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+from bumper import presence
+from bumper.mqtt.acl import TopicTrie, bot_acl, client_acl, session_kind
+from bumper.mqtt.helper_bot import HELPER_BOT_CLIENT_ID
+
+
+def test_topic_trie():
+    trie = TopicTrie(["iot/atr/+/bot_serial/#", "iot/p2p/+/user_123"])
+    assert trie.matches("iot/atr/onBattery/bot_serial/ls1ok3/wC3g/j")
+    assert trie.matches("iot/atr/onBattery/bot_serial")  # # matches the parent
+    assert not trie.matches("iot/atr/onBattery/other_serial/ls1ok3/wC3g/j")
+    assert trie.matches("iot/p2p/getBattery/user_123")
+    assert not trie.matches("iot/p2p/getBattery/user_123/ecouser")
+    assert not trie.matches("iot/p2p/getBattery")
+
+    # Wildcards of filters are only matched by the same or broader ones
+    assert trie.matches("iot/atr/+/bot_serial/+/+/+")
+    assert trie.matches("iot/atr/+/bot_serial/#")
+    assert not trie.matches("iot/atr/onBattery/+/ls1ok3/wC3g/j")
+    assert not trie.matches("iot/#")
+    assert not TopicTrie().matches("iot/atr/onBattery/bot_serial/ls1ok3/wC3g/j")
+    assert TopicTrie(["#"]).matches("iot/#")
+
+
+def test_bot_acl():
+    acl = bot_acl("bot_serial")
+    assert acl.publish.matches("iot/atr/onBattery/bot_serial/ls1ok3/wC3g/j")
+    assert acl.publish.matches(
+        "iot/p2p/getBattery/bot_serial/ls1ok3/wC3g/helperbot/bumper/helperbot/p/a/j"
+    )
+    assert not acl.publish.matches("iot/atr/onBattery/other_serial/ls1ok3/wC3g/j")
+    assert acl.subscribe.matches("iot/p2p/+/+/+/+/bot_serial/ls1ok3/wC3g/+/+/+")
+    assert not acl.subscribe.matches("iot/p2p/+/+/+/+/other_serial/ls1ok3/wC3g/+/+/+")
+    assert not acl.subscribe.matches("iot/atr/+/+/+/+/+")
+
+
+def test_client_acl():
+    acl = client_acl("user_123", "resource_123", ["bot_serial"])
+    assert acl.publish.matches(
+        "iot/p2p/getBattery/user_123/ecouser/resource_123/bot_serial/ls1ok3/wC3g/q/a/j"
+    )
+    assert not acl.publish.matches(
+        "iot/p2p/getBattery/user_123/ecouser/resource_123/other_serial/ls1ok3/wC3g/q/a/j"
+    )
+    assert not acl.publish.matches(
+        "iot/p2p/getBattery/user_456/ecouser/resource_123/bot_serial/ls1ok3/wC3g/q/a/j"
+    )
+    assert not acl.publish.matches("iot/atr/onBattery/bot_serial/ls1ok3/wC3g/j")
+    assert acl.subscribe.matches("iot/atr/+/bot_serial/+/+/+")
+    assert acl.subscribe.matches("iot/p2p/+/+/+/+/user_123/+/resource_123/+/+/+")
+    assert not acl.subscribe.matches("iot/atr/+/other_serial/+/+/+")
+    assert not acl.subscribe.matches("iot/p2p/+/+/+/+/user_456/+/resource_123/+/+/+")
+
+    # Without bots a client may only receive what is addressed to it
+    acl = client_acl("user_123", "resource_123", [])
+    assert not acl.publish.matches(
+        "iot/p2p/getBattery/user_123/ecouser/resource_123/bot_serial/ls1ok3/wC3g/q/a/j"
+    )
+    assert acl.subscribe.matches("iot/p2p/+/+/+/+/user_123/+/resource_123/+/+/+")
+
+
+def test_session_kind():
+    assert session_kind("bot_serial@ls1ok3/wC3g") == (presence.BOT, "bot_serial", "")
+    assert session_kind("user_123@ecouser.net/resource_123") == (
+        presence.CLIENT,
+        "user_123",
+        "resource_123",
+    )
+    assert session_kind(HELPER_BOT_CLIENT_ID) is None
+    assert session_kind("test-file-auth") is None
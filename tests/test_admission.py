@@ -0,0 +1,128 @@
+import asyncio
+from unittest import mock
+
+import pytest
+from amqtt.adapters import StreamWriterAdapter
+from amqtt.session import Session
+
+from bumper.admission import Admission, AdmissionRejected
+from bumper.mqtt import server as mqtt_server_module
+from bumper.mqtt.server import MQTTServer
+from bumper.xmppserver import XMPPServer, XMPPServer_Protocol
+from tests import HOST, MQTT_PORT
+
+# CONNECT of MQTT 3.1.1 with client id "test" and CONNACK "server unavailable"
+CONNECT = b"\x10\x10\x00\x04MQTT\x04\x02\x00\x3c\x00\x04test"
+CONNACK_SERVER_UNAVAILABLE = b"\x20\x02\x00\x03"
+
+
+def test_admit_rate():
+    admission = Admission(rate=1, burst=2)
+    admission.admit("10.0.0.1")
+    admission.admit("10.0.0.1")
+    with pytest.raises(AdmissionRejected) as exc_info:
+        admission.admit("10.0.0.1")
+    assert 0 < exc_info.value.retry_after <= 1
+
+    # Other sources have their own bucket
+    admission.admit("10.0.0.2")
+    assert admission.stats["rejected_rate"] == 1
+
+    # Rate 0 disables the limit
+    admission = Admission(rate=0)
+    for _ in range(100):
+        admission.admit("10.0.0.1")
+
+
+async def test_handshake_limit():
+    admission = Admission(max_handshakes=1, max_waiting=1)
+    release = asyncio.Event()
+
+    async def handshake() -> None:
+        async with admission.handshake():
+            await release.wait()
+
+    running = asyncio.create_task(handshake())
+    waiting = asyncio.create_task(handshake())
+    await asyncio.sleep(0)
+
+    # The slot is taken and the queue is full
+    with pytest.raises(AdmissionRejected):
+        async with admission.handshake():
+            pass
+    assert admission.stats["rejected_busy"] == 1
+
+    release.set()
+    await asyncio.gather(running, waiting)
+    assert admission.stats["admitted"] == 2
+
+    async with admission.handshake():
+        pass
+
+
+def _mock_transport() -> mock.Mock:
+    transport = mock.Mock()
+    transport.get_extra_info = mock.Mock(return_value=("127.0.0.1", 5223))
+    return transport
+
+
+def test_xmpp_connection_rejected():
+    admission = Admission(rate=1, burst=1)
+    clients = len(XMPPServer.clients)
+
+    protocol = XMPPServer_Protocol(admission)
+    protocol.connection_made(_mock_transport())
+    assert len(XMPPServer.clients) == clients + 1
+    protocol.connection_lost(None)
+
+    transport = _mock_transport()
+    protocol = XMPPServer_Protocol(admission)
+    protocol.connection_made(transport)
+    assert len(XMPPServer.clients) == clients
+    transport.close.assert_called_once()
+    protocol.connection_lost(None)
+
+
+def _mock_writer() -> mock.Mock:
+    writer = mock.Mock()
+    writer.get_extra_info = mock.Mock(return_value=("127.0.0.1", 8883))
+    writer.drain = mock.AsyncMock()
+    return writer
+
+
+def _written(writer: mock.Mock) -> bytes:
+    return b"".join(call.args[0] for call in writer.write.call_args_list)
+
+
+async def test_mqtt_connection_rejected():
+    admission = Admission(rate=1, burst=1)
+    admission.admit("127.0.0.1")  # Bucket is empty now
+    with mock.patch.object(
+        mqtt_server_module, "create_admission", return_value=admission
+    ):
+        broker = MQTTServer(HOST, MQTT_PORT)._broker
+
+    reader = asyncio.StreamReader()
+    reader.feed_data(CONNECT)
+    writer = _mock_writer()
+    await broker.stream_connected(reader, writer, "tcp-tsl")
+
+    # The client is told to retry later, not that its credentials are bad
+    assert _written(writer) == CONNACK_SERVER_UNAVAILABLE
+    writer.close.assert_called_once()
+
+
+async def test_mqtt_handshake_rejected():
+    admission = Admission(max_handshakes=1, max_waiting=0, rate=0)
+    with mock.patch.object(
+        mqtt_server_module, "create_admission", return_value=admission
+    ):
+        broker = MQTTServer(HOST, MQTT_PORT)._broker
+
+    writer = _mock_writer()
+    mqtt_server_module._connection_writer.set(StreamWriterAdapter(writer))
+    session = Session()
+    session.client_id = "test"
+    async with admission.handshake():
+        assert not await broker.authenticate(session, {})
+    assert _written(writer) == CONNACK_SERVER_UNAVAILABLE
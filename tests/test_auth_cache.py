@@ -0,0 +1,31 @@
+import asyncio
+
+from bumper.mqtt.auth_cache import AuthCache
+
+
+async def test_auth_cache():
+    cache = AuthCache(failure_ttl=0)
+    calls = []
+
+    async def check() -> bool:
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return True
+
+    key = cache.key("file", "user", "secret")
+    assert b"secret" not in key
+    assert key != AuthCache().key("file", "user", "secret")  # Salted
+
+    # Concurrent checks share one verification
+    results = await asyncio.gather(*(cache.verify(key, check) for _ in range(5)))
+    assert results == [True] * 5
+    assert await cache.verify(key, check)
+    assert len(calls) == 1
+
+    cache.clear()
+    assert cache.get(key) is None
+
+    # Failures expire after failure_ttl
+    bad_key = cache.key("file", "user", "wrong")
+    cache.set(bad_key, False)
+    assert cache.get(bad_key) is None
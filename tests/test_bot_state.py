@@ -0,0 +1,67 @@
+import json
+from unittest import mock
+
+from bumper import bot_state, presence
+
+
+def _getter(name: str, did: str = "did_123") -> dict:
+    return {"cmdName": name, "payloadType": "j", "toId": did}
+
+
+def test_getter_response():
+    bot_state.clear()
+    event = {"header": {"ver": "0.0.1"}, "body": {"data": {"value": 80}}}
+    assert bot_state.update("did_123", "onBattery", "j", json.dumps(event))
+    assert not bot_state.update("did_123", "onBattery", "j", json.dumps(event))
+
+    response = bot_state.getter_response(_getter("getBattery"), "abcd")
+    assert response == {
+        "id": "abcd",
+        "ret": "ok",
+        "resp": {
+            "header": {"ver": "0.0.1"},
+            "body": {"code": 0, "msg": "ok", "data": {"value": 80}},
+        },
+    }
+
+    # Unknown bot, getter with arguments or xml
+    assert bot_state.getter_response(_getter("getBattery", "other"), "abcd") is None
+    assert bot_state.getter_response(_getter("getMapSet"), "abcd") is None
+    assert (
+        bot_state.getter_response({**_getter("getBattery"), "payloadType": "x"}, "abcd")
+        is None
+    )
+    assert bot_state.stats() == {"bots": 1, "events": 1, "hits": 1, "misses": 1}
+
+    # Outdated or disabled
+    with mock.patch("bumper.bot_state_max_age", 0):
+        assert bot_state.getter_response(_getter("getBattery"), "abcd") is None
+
+
+def test_update_from_response():
+    bot_state.clear()
+    response = {
+        "header": {"ver": "0.0.1"},
+        "body": {"code": 0, "msg": "ok", "data": {"isCharging": 1}},
+    }
+    bot_state.update_from_response(
+        "did_123", "getChargeState", "j", json.dumps(response)
+    )
+    assert bot_state.get("did_123", "onChargeState") is not None
+
+    # Failed responses and other commands are ignored
+    response["body"]["code"] = 500
+    bot_state.update_from_response("did_123", "getBattery", "j", json.dumps(response))
+    bot_state.update_from_response("did_123", "clean", "j", "{}")
+    assert list(bot_state.get_all("did_123")) == ["onChargeState"]
+
+
+def test_remove_on_disconnect():
+    bot_state.clear()
+    presence.clear()
+    presence.bot_set_connected("did_123", presence.MQTT, True)
+    bot_state.update("did_123", "DustCaseST", "x", "<ctl td='DustCaseST' st='0'/>")
+    assert bot_state.get("did_123", "DustCaseST") is not None
+
+    presence.bot_set_connected("did_123", presence.MQTT, False)
+    assert bot_state.get_all("did_123") == {}
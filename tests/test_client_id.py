@@ -0,0 +1,14 @@
+from bumper import presence
+from bumper.mqtt.client_id import parse_client_id
+from bumper.mqtt.helper_bot import HELPER_BOT_CLIENT_ID
+
+
+def test_parse_client_id():
+    assert parse_client_id("bot_serial@ls1ok3/wC3g") == (presence.BOT, "bot_serial")
+    assert parse_client_id("user_123@ecouser.net/resource_123") == (
+        presence.CLIENT,
+        "resource_123",
+    )
+    assert parse_client_id("user_123@ecouser.net") is None
+    assert parse_client_id(HELPER_BOT_CLIENT_ID) is None
+    assert parse_client_id("test-file-auth") is None
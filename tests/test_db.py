@@ -1,10 +1,20 @@
+import multiprocessing
 import os
-from datetime import datetime, timedelta
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 from unittest import mock
 
-from tinydb import TinyDB
+import pytest
+from testfixtures import LogCapture
+from tinydb import Query, TinyDB
 
 from bumper import data_dir, db
+from bumper.db import aio, signed_tokens
+from bumper.db.serializer import get_serializer
+from bumper.db.sqlite_repository import SQLiteRepository, migrate_json
+from bumper.db.tinydb_repository import BufferedJSONStorage, TinyDBRepository
+from bumper.util import convert_to_millis, get_current_time_as_millis
 
 
 def test_db_path():
@@ -18,28 +28,28 @@ def test_user_db():
     db.user_add("testuser")  # Add testuser
 
     assert (
-        db.user_get("testuser")["userid"] == "testuser"
+        db.user_get("testuser").userid == "testuser"
     )  # Test that testuser was created and returned
 
     db.user_add_device("testuser", "dev_1234")  # Add device to testuser
 
     assert (
-        db.user_by_device_id("dev_1234")["userid"] == "testuser"
+        db.user_by_device_id("dev_1234").userid == "testuser"
     )  # Test that testuser was found by deviceid
 
     db.user_remove_device("testuser", "dev_1234")  # Remove device from testuser
 
-    assert "dev_1234" not in db.user_get("testuser")["devices"]
+    assert "dev_1234" not in db.user_get("testuser").devices
     # Test that dev_1234 was not found in testuser devices
 
     db.user_add_bot("testuser", "bot_1234")  # Add bot did to testuser
 
-    assert "bot_1234" in db.user_get("testuser")["bots"]
+    assert "bot_1234" in db.user_get("testuser").bots
     # Test that bot was found in testuser's bot list
 
     db.user_remove_bot("testuser", "bot_1234")  # Remove bot did from testuser
 
-    assert "bot_1234" not in db.user_get("testuser")["bots"]
+    assert "bot_1234" not in db.user_get("testuser").bots
     # Test that bot was not found in testuser's bot list
 
     db.user_add_token("testuser", "token_1234")  # Add token to testuser
@@ -69,30 +79,20 @@ def test_user_db():
     db.user_revoke_all_tokens("testuser")  # Revoke all tokens
     assert len(db.user_get_tokens("testuser")) == 0  # Test 0 tokens are available
 
-    db_test = TinyDB("tests/tmp.db")
-    tokens = db_test.table("tokens")
-    tokens.insert(
+    db._db_get().insert(
+        "tokens",
         {
             "userid": "testuser",
             "token": "token_123456",
-            "expiration": f"{datetime.now() + timedelta(seconds=-10)}",
-        }
+            "expiration": get_current_time_as_millis() - 10000,
+        },
     )  # Add expired token
-    db_test.close()
     assert len(db.user_get_tokens("testuser")) == 1  # Test 1 tokens are available
     db.user_revoke_expired_tokens("testuser")  # Revoke expired tokens
     assert len(db.user_get_tokens("testuser")) == 0  # Test 0 tokens are available
 
-    db_test = TinyDB("tests/tmp.db")
-    tokens = db_test.table("tokens")
-    tokens.insert(
-        {
-            "userid": "testuser",
-            "token": "token_1234",
-            "expiration": f"{datetime.now() + timedelta(seconds=-10)}",
-        }
-    )  # Add expired token
-    db_test.close()
+    with mock.patch("bumper.token_validity_seconds", -10):
+        db.user_add_token("testuser", "token_1234")  # Add expired token
     assert len(db.user_get_tokens("testuser")) == 1  # Test 1 tokens are available
     db.revoke_expired_tokens()  # Revoke expired tokens
     assert len(db.user_get_tokens("testuser")) == 0  # Test 0 tokens are available
@@ -103,19 +103,7 @@ def test_bot_db():
     assert db.bot_get("did_123")  # Test that bot was added to db
 
     db.bot_set_nick("did_123", "nick_123")
-    assert (
-        db.bot_get("did_123")["nick"] == "nick_123"
-    )  # Test that nick was added to bot
-
-    db.bot_set_mqtt("did_123", True)
-    assert db.bot_get("did_123")[
-        "mqtt_connection"
-    ]  # Test that mqtt was set True for bot
-
-    db.bot_set_xmpp("did_123", True)
-    assert db.bot_get("did_123")[
-        "xmpp_connection"
-    ]  # Test that xmpp was set True for bot
+    assert db.bot_get("did_123").nick == "nick_123"  # Test that nick was added to bot
 
     db.bot_remove("did_123")
     assert db.bot_get("did_123") == None  # Test that bot is no longer in db
@@ -125,18 +113,438 @@ def test_client_db():
     db.client_add("user_123", "realm_123", "resource_123")
     assert db.client_get("resource_123")  # Test client was added
 
-    db.client_set_mqtt("resource_123", True)
-    assert db.client_get("resource_123")[
-        "mqtt_connection"
-    ]  # Test that mqtt was set True for client
-
-    db.client_set_xmpp("resource_123", False)
-    assert (
-        db.client_get("resource_123")["xmpp_connection"] == False
-    )  # Test that xmpp was set False for client
-    assert (
-        len(db.get_disconnected_xmpp_clients()) > 0
-    )  # Test len of connected xmpp clients is 1
-
     db.client_remove("resource_123")
     assert db.client_get("resource_123") == None
+
+
+def test_write_coalescing(tmp_path):
+    db_file = tmp_path / "coalesce.db"
+    db_test = TinyDB(db_file, storage=BufferedJSONStorage, flush_threshold=3)
+    tokens = db_test.table("tokens")
+
+    tokens.insert({"token": "token_1"})
+    tokens.insert({"token": "token_2"})
+    assert not db_file.exists()  # Writes are kept in memory
+    assert db_test.storage.pending_writes == 2
+
+    tokens.insert({"token": "token_3"})  # Threshold reached
+    assert db_test.storage.pending_writes == 0
+    assert len(TinyDB(db_file).table("tokens")) == 3
+
+    tokens.insert({"token": "token_4"})
+    db_test.close()  # Flush on close
+    assert len(TinyDB(db_file).table("tokens")) == 4
+    assert list(tmp_path.iterdir()) == [db_file]  # No temp files left
+
+
+@pytest.mark.parametrize("name", ["json", "orjson"])
+def test_serializer(tmp_path, name):
+    db_file = tmp_path / "serializer.db"
+    storage_kwargs = {"flush_threshold": 1, "serializer": get_serializer(name)}
+    db_test = TinyDB(db_file, storage=BufferedJSONStorage, **storage_kwargs)
+    db_test.table("bots").insert({"did": "did_ß", "nick": "nick"})
+    db_test.close()
+
+    content = db_file.read_text(encoding="utf-8")
+    assert " " not in content  # Compact
+    assert db_test.storage.last_flush.size == len(content.encode())
+    assert db_test.storage.last_flush.writes == 1
+    assert TinyDB(db_file).table("bots").all() == [{"did": "did_ß", "nick": "nick"}]
+
+    db_test = TinyDB(db_file, storage=BufferedJSONStorage, **storage_kwargs)
+    assert db_test.table("bots").all() == [{"did": "did_ß", "nick": "nick"}]
+
+
+def test_shared_handle():
+    assert db._db_get() is db._db_get()
+    db.close()
+    assert db._db_get() is not None
+
+
+def test_indexes():
+    db.user_add("indexuser")
+    db.user_add_device("indexuser", "dev_index")
+    db.user_add_token("indexuser", "token_index")
+    db.user_add_authcode("indexuser", "token_index", "auth_index")
+
+    # Lookups with and without fuid_ prefix
+    assert db.check_token("fuid_indexuser", "token_index")
+    assert db.check_authcode("fuid_indexuser", "auth_index")
+    assert not db.check_token("otheruser", "token_index")
+    assert db.token_by_authcode("auth_index").token == "token_index"
+    assert db.user_by_device_id("dev_index").userid == "indexuser"
+
+    # Index follows updates
+    db.user_add_authcode("indexuser", "token_index", "auth_index2")
+    assert not db.check_authcode("indexuser", "auth_index")
+    assert db.check_authcode("indexuser", "auth_index2")
+    db.user_revoke_authcode("indexuser", "token_index")
+    assert not db.check_authcode("indexuser", "")  # Revoked authcode is not indexed
+    db.user_remove_device("indexuser", "dev_index")
+    assert db.user_by_device_id("dev_index") is None
+
+    # Index follows removes
+    db.user_revoke_token("indexuser", "token_index")
+    assert not db.check_token("indexuser", "token_index")
+
+    db.bot_add("sn_index", "did_index", "dev_index", "res_index", "co_index")
+    db.bot_set_nick("did_index", "nick_index")
+    assert db.bot_get("did_index").nick == "nick_index"
+    db.bot_remove("did_index")
+    assert db.bot_get("did_index") is None
+
+    # Indexes are rebuilt when the database is reopened
+    db.user_add_token("indexuser", "token_index")
+    db.close()
+    assert db.check_token("indexuser", "token_index")
+
+
+def test_sqlite_repository(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / "bumper.sqlite"))
+    doc_id = repository.insert("tokens", {"userid": "fuid_user", "token": "token_1"})
+    repository.insert("tokens", {"userid": "user", "token": "token_2"})
+
+    assert repository.get_by("tokens", "token", "token_1").doc_id == doc_id
+    assert len(repository.lookup("tokens", "userid", "user")) == 2
+
+    repository.update("tokens", [doc_id], {"authcode": "auth_1"})
+    assert repository.get_by("tokens", "authcode", "auth_1")["token"] == "token_1"
+
+    repository.upsert_by("bots", "did", "did_1", {"did": "did_1", "nick": "a"})
+    repository.upsert_by("bots", "did", "did_1", {"nick": "b"})
+    assert [bot["nick"] for bot in repository.all("bots")] == ["b"]
+
+    changes = repository._conn.total_changes
+    repository.upsert_by("bots", "did", "did_1", {"did": "did_1", "nick": "b"})
+    assert repository._conn.total_changes == changes  # Unchanged, no write
+
+    repository.remove_by("tokens", "token", "token_1")
+    assert repository.get_by("tokens", "authcode", "auth_1") is None
+    assert len(repository.all("tokens")) == 1
+    assert repository.count("tokens") == 1
+    assert repository.count("clients") == 0
+    repository.close()
+
+
+def _upsert_bots(path: str, worker: int) -> None:
+    repository = SQLiteRepository(path)
+    try:
+        for index in range(200):
+            did = f"did_{index}"
+            repository.upsert_by("bots", "did", did, {"did": did, "nick": str(worker)})
+    finally:
+        repository.close()
+
+
+def test_sqlite_processes(tmp_path):
+    path = str(tmp_path / "bumper.sqlite")
+    SQLiteRepository(path).close()
+
+    # Workers of the sharded MQTT server write to the same file
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=_upsert_bots, args=(path, worker)) for worker in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+    assert [process.exitcode for process in processes] == [0, 0, 0, 0]
+
+    # No did was inserted twice
+    repository = SQLiteRepository(path)
+    assert repository.count("bots") == 200
+    repository.close()
+
+
+def test_sqlite_migration(tmp_path):
+    json_file = tmp_path / "bumper.db"
+    db_json = TinyDB(json_file)
+    db_json.table("users").insert({"userid": "user", "devices": ["dev_1"]})
+    db_json.table("bots").insert({"did": "did_1"})
+    db_json.close()
+
+    repository = SQLiteRepository(str(tmp_path / "bumper.sqlite"))
+
+    # A failed migration is rolled back and retried
+    insert_multiple = repository.insert_multiple
+
+    def fail_on_bots(table, docs):
+        if table == "bots":
+            raise OSError("disk full")
+        insert_multiple(table, docs)
+
+    with mock.patch.object(repository, "insert_multiple", fail_on_bots):
+        with pytest.raises(OSError):
+            migrate_json(repository, str(json_file))
+    assert repository.count("users") == 0
+
+    assert migrate_json(repository, str(json_file)) == 2
+    assert repository.get_by("users", "devices", "dev_1")["userid"] == "user"
+    assert repository.get_by("bots", "did", "did_1")
+    assert repository.all("migrations")[0]["documents"] == 2
+
+    # Completed migrations aren't repeated
+    assert migrate_json(repository, str(json_file)) == 0
+    assert repository.count("users") == 1
+    repository.close()
+
+
+def test_sqlite_backend(tmp_path):
+    db.close()
+    with mock.patch("bumper.db_backend", "sqlite"), mock.patch.dict(
+        os.environ, {"DB_FILE": str(tmp_path / "bumper.sqlite")}
+    ):
+        db.bot_add("sn_sqlite", "did_sqlite", "dev_sqlite", "res_sqlite", "co_sqlite")
+        db.bot_set_nick("did_sqlite", "nick_sqlite")
+        db.close()
+        assert db.bot_get("did_sqlite").nick == "nick_sqlite"
+        db.close()
+
+
+def test_expiry_index():
+    pending = len(db._expiry_get("tokens"))
+    with mock.patch("bumper.token_validity_seconds", -10):
+        db.user_add_token("expiryuser", "token_expired")
+    db.user_add_token("expiryuser", "token_valid")
+    db.user_add_token("expiryuser", "token_revoked")
+    db.user_revoke_token("expiryuser", "token_revoked")
+
+    db.revoke_expired_tokens()
+    assert not db.check_token("expiryuser", "token_expired")
+    assert db.check_token("expiryuser", "token_valid")
+    # Only entries, which are not yet due, are left (including the revoked one)
+    assert len(db._expiry_get("tokens")) == pending + 2
+
+    # The index is rebuilt from the table after reopening
+    db.close()
+    assert len(db._expiry_get("tokens")) == len(db._db_get().all("tokens"))
+    db.user_revoke_all_tokens("expiryuser")
+
+
+def test_user_add_bots():
+    db.user_add("bulkuser")
+    db.user_add_bot("bulkuser", "did_bulk1")
+    db.flush()
+    db.user_add_bots("bulkuser", ["did_bulk1", "did_bulk2", "did_bulk2"])
+    assert db._db_get().storage.pending_writes == 1  # One write
+    assert db.user_get("bulkuser").bots == ["did_bulk1", "did_bulk2"]
+
+
+async def test_aio():
+    main_thread = threading.get_ident()
+    assert await aio.run(threading.get_ident) != main_thread
+
+    # Queued writes are executed in order with awaited calls
+    aio.submit(db.bot_add, "sn_aio", "did_aio", "dev_aio", "res_aio", "co_aio")
+    aio.submit(db.bot_set_nick, "did_aio", "nick_aio")
+    assert (await aio.bot_get("did_aio")).nick == "nick_aio"
+
+    await aio.bot_remove("did_aio")
+    assert await aio.bot_get("did_aio") is None
+    await aio.close()
+
+
+def test_skip_unchanged_writes():
+    storage = db._db_get().storage
+    db.bot_add("sn_dirty", "did_dirty", "dev_dirty", "res_dirty", "co_dirty")
+    db.client_add("user_dirty", "realm_dirty", "res_dirty")
+    db.user_add("user_dirty")
+    db.user_add_device("user_dirty", "dev_dirty")
+    db.flush()
+
+    # Reconnect with unchanged data
+    db.bot_add("sn_dirty", "did_dirty", "dev_dirty", "res_dirty", "co_dirty")
+    db.client_add("user_dirty", "realm_dirty", "res_dirty")
+    db.user_add("user_dirty")
+    db.user_add_device("user_dirty", "dev_dirty")
+    db.bot_set_nick("did_dirty", db.bot_get("did_dirty").nick)
+    assert storage.pending_writes == 0
+
+    db.bot_add("sn_dirty", "did_dirty", "dev_dirty", "res_new", "co_dirty")
+    assert storage.pending_writes == 1
+    assert db.bot_get("did_dirty").resource == "res_new"
+
+
+def test_signed_tokens():
+    with mock.patch("bumper.signed_tokens", True), mock.patch(
+        "bumper.token_secret", "test_secret"
+    ):
+        signed_tokens.reset_secret()
+        tokens = len(db._db_get().all("tokens"))
+        token = db.user_create_token("signeduser")
+        authcode = db.user_create_authcode("signeduser", token, "de")
+        assert len(db._db_get().all("tokens")) == tokens  # Nothing stored
+
+        assert authcode.startswith("de_")
+        assert db.check_token("fuid_signeduser", token)
+        assert not db.check_token("otheruser", token)
+        assert db.check_authcode("signeduser", authcode)
+        assert db.login_by_it_token(authcode) == {
+            "token": token,
+            "userid": "signeduser",
+        }
+        assert db.token_by_authcode(authcode).userid == "signeduser"
+        assert db.user_get_token("signeduser", token).token == token
+
+        # Tampered or expired
+        assert not db.check_token("signeduser", token[:-2] + "xx")
+        assert not db.check_token("signeduser", token[:-2] + "\u00e9")
+        assert not db.check_token("u1", "abc.def.gh\u00e9")
+        assert not db.check_authcode("signeduser", authcode.replace("de_", "us_"))
+        expired = signed_tokens.create_token("signeduser", 1)
+        assert not db.check_token("signeduser", expired)
+
+        # Revocation also invalidates the authcode
+        revoked = []
+        unsubscribe = db.subscribe_revocations(revoked.append)
+        db.user_revoke_token("signeduser", token)
+        unsubscribe()
+        assert revoked == [token]
+        assert not db.check_token("signeduser", token)
+        assert not db.check_authcode("signeduser", authcode)
+        assert db.signed_tokens_ready()
+
+        # Authcode revocation keeps the token valid
+        token = db.user_create_token("authcodeuser")
+        authcode = db.user_create_authcode("authcodeuser", token, "de")
+        db.user_revoke_authcode("authcodeuser", token)
+        assert db.check_token("authcodeuser", token)
+        assert not db.check_authcode("authcodeuser", authcode)
+        assert db.login_by_it_token(authcode) == {}
+
+        # Revoking all tokens isn't supported, as they aren't stored
+        with LogCapture() as log:
+            db.user_revoke_all_tokens("authcodeuser")
+        assert "isn't supported with signed tokens" in str(log)
+        assert db.check_token("authcodeuser", token)
+
+        # Revocations of other processes are applied
+        token = db.user_create_token("signeduser")
+        revocations = db.revocation_count()
+        db.apply_revocation(token)
+        assert not db.check_token("signeduser", token)
+        assert db.revocation_count() == revocations + 1
+    signed_tokens.reset_secret()
+
+
+def test_token_limit():
+    with mock.patch("bumper.token_limit_per_user", 2):
+        stats = db.token_stats()
+        token_1 = db.user_create_token("limituser", "dev_1")
+        assert db.user_create_token("limituser", "dev_1") == token_1  # Reused
+        time.sleep(0.002)  # last_used has millisecond resolution
+        token_2 = db.user_create_token("limituser", "dev_2")
+        time.sleep(0.002)
+        db.user_create_token("limituser", "dev_1")  # Token 1 is now most recent
+        token_3 = db.user_create_token("limituser", "dev_3")
+
+        # Least recently used token 2 was evicted
+        assert db.check_token("limituser", token_1)
+        assert not db.check_token("limituser", token_2)
+        assert db.check_token("limituser", token_3)
+        assert len(db.user_get_tokens("limituser")) == 2
+
+        new_stats = db.token_stats()
+        assert new_stats["reuse_hits"] == stats["reuse_hits"] + 2
+        assert new_stats["evictions"] == stats["evictions"] + 1
+        assert new_stats["limit_per_user"] == 2
+        assert new_stats["tokens"] == len(db._db_get().all("tokens"))
+
+
+def test_token_reuse_renews_expiration():
+    token = db.user_create_token("renewuser", "dev_1")
+    doc = db._db_get().get_by("tokens", "token", token)
+    soon = get_current_time_as_millis() + 1000
+    db._db_get().update("tokens", [doc.doc_id], {"expiration": soon})
+
+    # A new login gets the full validity, also for the expiry index
+    assert db.user_create_token("renewuser", "dev_1") == token
+    assert db.user_get_token("renewuser", token).expiration > soon + 60 * 1000
+    with mock.patch("bumper.db.get_current_time_as_millis", return_value=soon + 1):
+        db.revoke_expired_tokens()
+    assert db.check_token("renewuser", token)
+
+
+def test_timestamp_migration():
+    expiration = datetime.now() + timedelta(hours=1)
+    expire_at = datetime.utcnow() + timedelta(days=1)
+    db._db_get().insert(
+        "tokens",
+        {
+            "userid": "legacyuser",
+            "token": "token_legacy",
+            "expiration": f"{expiration}",
+        },
+    )
+    db._db_get().insert("oauth", {"userId": "legacyuser", "expire_at": f"{expire_at}"})
+
+    db.close()  # Migrated on reopen
+    token = db.user_get_token("legacyuser", "token_legacy")
+    assert token.expiration == convert_to_millis(expiration.timestamp())
+    oauth = db.user_add_oauth("legacyuser")
+    assert oauth.expire_at == convert_to_millis(
+        expire_at.replace(tzinfo=timezone.utc).timestamp()
+    )
+    assert oauth.expire_at > get_current_time_as_millis()  # Not revoked early
+    db.user_revoke_all_tokens("legacyuser")
+
+
+def test_snapshot(tmp_path):
+    db.user_add("snapshotuser")
+    with mock.patch("bumper.token_validity_seconds", -10):
+        db.user_add_token("snapshotuser", "token_snapshot")
+
+    db.flush()
+    result = db.snapshot(str(tmp_path / "snapshot.db"), compact=True)
+    assert result["compacted"]
+    assert db._db_get().storage.pending_writes == 0  # The purge was written
+    assert result["size"] == os.path.getsize(tmp_path / "snapshot.db")
+    snapshot = TinyDB(tmp_path / "snapshot.db")
+    assert snapshot.table("users").search(Query().userid == "snapshotuser")
+    assert not snapshot.table("tokens").search(Query().token == "token_snapshot")
+
+
+def test_sqlite_snapshot(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / "bumper.sqlite"))
+    doc_id = repository.insert("bots", {"did": "did_1"})
+    repository.insert("bots", {"did": "did_2"})
+    repository.remove("bots", [doc_id])
+    repository.compact()
+    repository.backup(str(tmp_path / "snapshot.sqlite"))
+    repository.close()
+
+    snapshot = SQLiteRepository(str(tmp_path / "snapshot.sqlite"))
+    assert [bot["did"] for bot in snapshot.all("bots")] == ["did_2"]
+    snapshot.close()
+
+
+async def test_aio_snapshot(tmp_path):
+    result = await aio.snapshot(str(tmp_path / "snapshot.db"))
+    assert os.path.exists(result["path"])
+    assert result["loop_blocked_ms"] >= 0
+
+
+def test_transaction(tmp_path):
+    repository = TinyDBRepository(str(tmp_path / "tx.db"), flush_threshold=1)
+    with repository.transaction():
+        repository.insert("bots", {"did": "did_1"})
+        repository.insert("bots", {"did": "did_2"})
+        repository.upsert_by("bots", "did", "did_1", {"nick": "nick"})
+        assert not (tmp_path / "tx.db").exists()  # Nothing flushed yet
+    assert repository.storage.last_flush.writes == 3  # Flushed once
+    repository.close()
+
+    repository = SQLiteRepository(str(tmp_path / "tx.sqlite"))
+    try:
+        with repository.transaction():
+            repository.insert("bots", {"did": "did_1"})
+            raise ValueError
+    except ValueError:
+        pass
+    assert repository.all("bots") == []  # Rolled back
+    with repository.transaction():
+        repository.insert("bots", {"did": "did_1"})
+        repository.insert("bots", {"did": "did_2"})
+    assert len(repository.all("bots")) == 2
+    repository.close()
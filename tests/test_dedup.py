@@ -0,0 +1,41 @@
+from unittest import mock
+
+from bumper.mqtt.dedup import EventDedup
+
+TOPIC = "iot/atr/onBattery/bot_serial/ls1ok3/wC3g/j"
+APP = "fuid_user_123@ecouser.net/resource_123"
+OTHER_APP = "fuid_user_123@ecouser.net/resource_456"
+
+
+def test_dedup():
+    dedup = EventDedup(interval=60)
+    assert dedup.forward(APP, TOPIC, b'{"value":100}')
+    assert not dedup.forward(APP, TOPIC, b'{"value":100}')
+    assert dedup.forward(APP, TOPIC, b'{"value":99}')  # Changed
+
+    # Other topics and commands are always forwarded
+    assert dedup.forward(APP, TOPIC.replace("onBattery", "onStats"), b'{"value":99}')
+    p2p = "iot/p2p/getBattery/helperbot/bumper/helperbot/bot_serial/ls1ok3/wC3g/q/a/j"
+    assert dedup.forward(APP, p2p, b"{}")
+    assert dedup.forward(APP, p2p, b"{}")
+
+    assert dedup.stats == {"events": 4, "suppressed": 1, "suppressed_bytes": 13}
+
+    # Other subscribers get the event once as well
+    assert dedup.forward(OTHER_APP, TOPIC, b'{"value":99}')
+    assert not dedup.forward(OTHER_APP, TOPIC, b'{"value":99}')
+
+    # Unless they reconnected
+    dedup.forget(OTHER_APP)
+    assert dedup.forward(OTHER_APP, TOPIC, b'{"value":99}')
+
+    # Unchanged events are forwarded again after the interval
+    with mock.patch("time.monotonic", return_value=10**9):
+        assert dedup.forward(APP, TOPIC, b'{"value":99}')
+
+
+def test_dedup_disabled():
+    dedup = EventDedup()
+    assert dedup.forward(APP, TOPIC, b'{"value":100}')
+    assert dedup.forward(APP, TOPIC, b'{"value":100}')
+    assert not dedup.stats
@@ -5,7 +5,7 @@ import pytest
 from testfixtures import LogCapture
 
 import bumper
-from bumper import strtobool
+from bumper import db, strtobool
 
 
 def test_strtobool():
@@ -17,6 +17,7 @@ def test_strtobool():
 @pytest.mark.parametrize("debug", [False, True])
 async def test_start_stop(debug: bool):
     with LogCapture() as l:
+        db.close()
         if os.path.exists("tests/tmp.db"):
             os.remove("tests/tmp.db")  # Remove existing db
 
@@ -41,3 +42,27 @@ async def test_start_stop(debug: bool):
             ("bumper", "INFO", "Shutting down"), ("bumper", "INFO", "Shutdown complete")
         )
         assert bumper.shutting_down is True
+
+
+def test_snapshot(tmp_path):
+    with LogCapture() as l:
+        assert bumper.snapshot(["--output", str(tmp_path / "snapshot.db")]) == 0
+        assert os.path.exists(tmp_path / "snapshot.db")
+        assert any(
+            message.startswith("Database snapshot written")
+            for (_, _, message) in l.actual()
+        )
+
+        # The output is a directory
+        assert bumper.snapshot(["--output", str(tmp_path)]) == 1
+        l.check_present(("bumper", "ERROR", "Database snapshot failed"))
+
+        # The database is held by a running server
+        db.hold()
+        try:
+            assert db.is_held()
+            assert bumper.snapshot(["--output", str(tmp_path / "held.db")]) == 1
+            assert not os.path.exists(tmp_path / "held.db")
+        finally:
+            db.release()
+        assert not db.is_held()
@@ -0,0 +1,34 @@
+from bumper.mqtt.message import ATR, P2P, Payload, Topic, parse_topic
+
+
+def test_parse_topic():
+    topic = parse_topic(
+        "iot/p2p/GetWKVer/helperbot/bumper/helperbot/bot_serial/ls1ok3/wC3g/q/iCmuqp/j"
+    )
+    assert topic.kind == P2P
+    assert topic.name == "GetWKVer"
+    assert topic.sender_id == "helperbot"
+    assert topic.receiver_id == "bot_serial"
+    assert topic.receiver_class == "ls1ok3"
+    assert topic.direction == "q"
+    assert topic.request_id == "iCmuqp"
+    assert topic.payload_type == "j"
+
+    topic = parse_topic("iot/atr/onBattery/bot_serial/ls1ok3/wC3g/j")
+    assert topic.kind == ATR
+    assert topic.name == "onBattery"
+    assert topic.sender_id == "bot_serial"
+    assert topic.sender_resource == "wC3g"
+    assert topic.receiver_id == ""
+    assert topic.payload_type == "j"
+
+    assert parse_topic("unknown/topic") == Topic("unknown/topic")
+    assert parse_topic("iot/atr/onBattery/bot_serial/ls1ok3/wC3g/j") is topic  # Cached
+
+
+def test_payload():
+    data = bytearray(b'{"ret":"ok"}')
+    payload = Payload(memoryview(data))
+    assert payload.data == b'{"ret":"ok"}'
+    assert payload.text == '{"ret":"ok"}'
+    assert f"{payload}" == '{"ret":"ok"}'
@@ -1,4 +1,4 @@
-from bumper.models import OAuth
+from bumper.models import BumperToken, BumperUser, OAuth, VacBotClient, VacBotDevice
 
 
 def test_oauth():
@@ -12,3 +12,25 @@ def test_oauth():
 
     data = o_auth.toResponse()
     assert data is not None
+    assert isinstance(data["expire_at"], int)
+    assert OAuth.from_row(o_auth.toDB()) == o_auth  # Not changed by toResponse
+
+
+def test_from_row():
+    bot = VacBotDevice("did", "class", "atom", "sn", "nick", "eco-ng")
+    assert VacBotDevice.from_row(bot.asdict()) == bot
+    # Unknown fields of old databases are ignored
+    assert VacBotDevice.from_row({**bot.asdict(), "mqtt_connection": True}) == bot
+
+    user = BumperUser("user", ["dev"], ["did"])
+    assert BumperUser.from_row(user.asdict()) == user
+    assert BumperUser.from_row({"userid": "user"}) == BumperUser("user")
+
+    client = VacBotClient("user", "realm", "resource")
+    assert VacBotClient.from_row(client.asdict()) == client
+
+    token = BumperToken("user", "token", 1672531200000)
+    assert "authcode" not in token.asdict()
+    assert BumperToken.from_row(token.asdict()) == token
+
+    assert not hasattr(bot, "__dict__")  # Slotted
@@ -2,13 +2,17 @@ import asyncio
 import os
 import ssl
 import time
+from unittest import mock
 
+from amqtt.session import Session
 from gmqtt import Client
 from gmqtt.mqtt.constants import MQTTv311
 from testfixtures import LogCapture
 
-from bumper import MQTTServer, db
-from bumper.mqtt.helper_bot import HelperBot
+import bumper
+from bumper import MQTTServer, db, presence
+from bumper.mqtt.helper_bot import HELPER_BOT_CLIENT_ID, HelperBot
+from bumper.mqtt.server import BumperMQTTServerPlugin
 from tests import HOST, MQTT_PORT
 
 
@@ -272,6 +276,7 @@ async def test_helperbot_sendcommand(mqtt_client: Client, helper_bot: HelperBot)
 
 
 async def test_mqttserver():
+    db.close()
     if os.path.exists("tests/tmp.db"):
         os.remove("tests/tmp.db")  # Remove existing db
 
@@ -298,6 +303,8 @@ async def test_mqttserver():
         client = Client("user_123@ecouser.net/resource_123")
         await client.connect(HOST, MQTT_PORT, ssl=ssl_ctx, version=MQTTv311)
         assert client.is_connected
+        assert presence.client_is_connected("resource_123", presence.MQTT)
+        assert mqtt_server.session_counts()["connected"] == 1
         await client.disconnect()
         assert not client.is_connected
 
@@ -305,6 +312,7 @@ async def test_mqttserver():
         client = Client("bot_serial@ls1ok3/wC3g")
         await client.connect(HOST, MQTT_PORT, ssl=ssl_ctx, version=MQTTv311)
         assert client.is_connected
+        assert presence.bot_is_connected("bot_serial", presence.MQTT)
         await client.disconnect()
 
         # Test file auth client connect
@@ -355,6 +363,8 @@ async def test_nofileauth_mqttserver():
         mqtt_server = MQTTServer(HOST, MQTT_PORT, password_file="tests/passwd-notfound")
         await mqtt_server.start()
         try:
+            plugin = mqtt_server._broker.plugins_manager.get_plugin("bumper")
+            assert isinstance(plugin.object, BumperMQTTServerPlugin)
             l.check_present(
                 (
                     "amqtt.broker.plugins.bumper",
@@ -365,3 +375,189 @@ async def test_nofileauth_mqttserver():
             )
         finally:
             await mqtt_server.shutdown()
+
+
+@mock.patch.object(bumper, "mqtt_acl", True)
+async def test_mqttserver_acl():
+    db.close()
+    if os.path.exists("tests/tmp.db"):
+        os.remove("tests/tmp.db")  # Remove existing db
+
+    mqtt_server = MQTTServer(
+        HOST, MQTT_PORT, password_file="tests/passwd", allow_anonymous=True
+    )
+    await mqtt_server.start()
+
+    try:
+        db.user_add("user_123")
+        db.client_add("fuid_user_123", "ecouser.net", "resource_123")
+        db.user_add_bot("user_123", "bot_serial")
+
+        ssl_ctx = ssl.create_default_context()
+        ssl_ctx.check_hostname = False
+        ssl_ctx.verify_mode = ssl.CERT_NONE
+        bot = Client("bot_serial@ls1ok3/wC3g")
+        received: list[str] = []
+        bot.on_message = (
+            lambda client, topic, payload, qos, properties: received.append(topic)
+        )
+        await bot.connect(HOST, MQTT_PORT, ssl=ssl_ctx, version=MQTTv311)
+        client = Client("fuid_user_123@ecouser.net/resource_123")
+        await client.connect(HOST, MQTT_PORT, ssl=ssl_ctx, version=MQTTv311)
+
+        with LogCapture() as l:
+            bot.subscribe("iot/p2p/+/+/+/+/bot_serial/ls1ok3/wC3g/+/+/+")
+            bot.subscribe("iot/p2p/+/+/+/+/other_serial/ls1ok3/wC3g/+/+/+")
+            await asyncio.sleep(0.1)
+            l.check_present(
+                (
+                    "mqtt_server",
+                    "INFO",
+                    "Topic denied - Action: subscribe - Topic: iot/p2p/+/+/+/+/other_serial/ls1ok3/wC3g/+/+/+ - ClientID: bot_serial@ls1ok3/wC3g",
+                ),
+                order_matters=False,
+            )
+
+            # Commands to own bots are delivered, impersonation is dropped
+            own = "iot/p2p/getBattery/fuid_user_123/ecouser/resource_123/bot_serial/ls1ok3/wC3g/q/1/j"
+            forged = "iot/p2p/getBattery/fuid_user_456/ecouser/resource_123/bot_serial/ls1ok3/wC3g/q/2/j"
+            client.publish(own, "{}")
+            client.publish(forged, "{}")
+            await asyncio.sleep(0.1)
+            assert received == [own]
+
+            # The app receives the events of its own bots
+            events: list[str] = []
+            client.on_message = (
+                lambda client, topic, payload, qos, properties: events.append(topic)
+            )
+            client.subscribe("iot/atr/+/bot_serial/+/+/+")
+            await asyncio.sleep(0.1)
+            bot.publish("iot/atr/onBattery/bot_serial/ls1ok3/wC3g/j", "{}")
+            await asyncio.sleep(0.1)
+            assert events == ["iot/atr/onBattery/bot_serial/ls1ok3/wC3g/j"]
+            l.check_present(
+                (
+                    "mqtt_server",
+                    "INFO",
+                    f"Topic denied - Action: publish - Topic: {forged} - ClientID: fuid_user_123@ecouser.net/resource_123",
+                ),
+                order_matters=False,
+            )
+
+        await client.disconnect()
+        await bot.disconnect()
+    finally:
+        await mqtt_server.shutdown()
+
+
+@mock.patch.object(bumper, "mqtt_dedup_interval", 60)
+async def test_mqttserver_dedup():
+    mqtt_server = MQTTServer(
+        HOST, MQTT_PORT, password_file="tests/passwd", allow_anonymous=True
+    )
+    await mqtt_server.start()
+
+    try:
+        ssl_ctx = ssl.create_default_context()
+        ssl_ctx.check_hostname = False
+        ssl_ctx.verify_mode = ssl.CERT_NONE
+        bot = Client("bot_serial@ls1ok3/wC3g")
+        await bot.connect(HOST, MQTT_PORT, ssl=ssl_ctx, version=MQTTv311)
+        received: dict[str, list[str]] = {}
+        subscribers = []
+        for client_id in [
+            HELPER_BOT_CLIENT_ID,
+            "fuid_user_123@ecouser.net/resource_123",
+            "fuid_user_123@ecouser.net/resource_456",
+        ]:
+            events = received[client_id] = []
+            subscriber = Client(client_id)
+            subscriber.on_message = lambda client, topic, payload, qos, properties, events=events: events.append(
+                payload
+            )
+            await subscriber.connect(HOST, MQTT_PORT, ssl=ssl_ctx, version=MQTTv311)
+            subscribers.append(subscriber)
+
+        topic = "iot/atr/onBattery/bot_serial/ls1ok3/wC3g/j"
+        subscribers[0].subscribe("iot/atr/+/bot_serial/+/+/+")
+        subscribers[1].subscribe("iot/atr/+/bot_serial/+/+/+")
+        await asyncio.sleep(0.1)
+        bot.publish(topic, '{"value":100}')
+        await asyncio.sleep(0.1)
+
+        # A later subscriber gets the unchanged event, the others only the helper bot
+        subscribers[2].subscribe("iot/atr/+/bot_serial/+/+/+")
+        await asyncio.sleep(0.1)
+        bot.publish(topic, '{"value":100}')
+        await asyncio.sleep(0.1)
+        assert len(received[HELPER_BOT_CLIENT_ID]) == 2
+        assert len(received["fuid_user_123@ecouser.net/resource_123"]) == 1
+        assert len(received["fuid_user_123@ecouser.net/resource_456"]) == 1
+
+        for subscriber in subscribers:
+            await subscriber.disconnect()
+        await bot.disconnect()
+    finally:
+        await mqtt_server.shutdown()
+
+
+@mock.patch.object(bumper, "use_auth", True)
+async def test_mqttserver_revoked_authcode():
+    mqtt_server = MQTTServer(HOST, MQTT_PORT, password_file="tests/passwd")
+    plugin = mqtt_server._broker.plugins_manager.get_plugin("bumper").object
+
+    db.user_add("user_123")
+    token = db.user_create_token("user_123")
+    session = Session()
+    session.client_id = "fuid_user_123@ecouser.net/resource_123"
+    session.username = "fuid_user_123"
+    session.password = db.user_create_authcode("user_123", token, "de")
+    assert await plugin.authenticate(session=session)
+    assert await plugin.authenticate(session=session)  # Cached
+
+    # A revoked authcode is rejected at once, although its success was cached
+    db.user_revoke_authcode("user_123", token)
+    assert not await plugin.authenticate(session=session)
+
+    # Also a new authcode replacing the cached one
+    session.password = db.user_create_authcode("user_123", token, "de")
+    assert await plugin.authenticate(session=session)
+    db.user_create_authcode("user_123", token, "de")
+    assert not await plugin.authenticate(session=session)
+
+
+@mock.patch.object(bumper, "mqtt_stop_timeout", 0.5)
+async def test_mqttserver_shutdown():
+    mqtt_server = MQTTServer(HOST, MQTT_PORT, allow_anonymous=True)
+    await mqtt_server.start()
+
+    ssl_ctx = ssl.create_default_context()
+    ssl_ctx.check_hostname = False
+    ssl_ctx.verify_mode = ssl.CERT_NONE
+    clients = [Client(f"bot_{index}@ls1ok3/wC3g") for index in range(3)]
+    for client in clients:
+        await client.connect(HOST, MQTT_PORT, ssl=ssl_ctx, version=MQTTv311)
+
+    # A session, which doesn't stop, is aborted after the timeout
+    handler = mqtt_server._broker._sessions["bot_0@ls1ok3/wC3g"][1]
+    stop = handler.stop
+
+    async def stop_hanging() -> None:
+        handler.stop = stop
+        await stop()
+        await asyncio.Event().wait()  # e.g. closing writer waits for a dead peer
+
+    handler.stop = stop_hanging
+
+    start = time.monotonic()
+    await mqtt_server.shutdown()
+    assert time.monotonic() - start < 5
+    stats = mqtt_server.stats()["shutdown"]
+    assert stats["sessions"] == 3
+    assert stats["aborted"] == 1
+    assert stats["duration_ms"] >= 500
+    assert mqtt_server.state == "stopped"
+
+    for client in clients:
+        await client.disconnect()
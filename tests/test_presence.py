@@ -0,0 +1,49 @@
+from bumper import presence
+
+
+def test_presence():
+    presence.clear()
+    changes = []
+    unsubscribe = presence.subscribe(lambda *args: changes.append(args))
+
+    presence.bot_set_connected("did_1", presence.MQTT, True)
+    assert presence.bot_is_connected("did_1")
+    assert presence.bot_is_connected("did_1", presence.MQTT)
+    assert not presence.bot_is_connected("did_1", presence.XMPP)
+    assert presence.connected(presence.BOT, presence.MQTT) == {"did_1"}
+
+    # Reconnect before the old connection is closed
+    presence.bot_set_connected("did_1", presence.MQTT, True)
+    presence.bot_set_connected("did_1", presence.MQTT, False)
+    assert presence.bot_is_connected("did_1")
+    presence.bot_set_connected("did_1", presence.MQTT, False)
+    assert not presence.bot_is_connected("did_1")
+    presence.bot_set_connected("did_1", presence.MQTT, False)  # Ignored
+
+    presence.client_set_connected("res_1", presence.XMPP, True)
+    assert presence.client_is_connected("res_1", presence.XMPP)
+    assert not presence.bot_is_connected("res_1")
+
+    assert changes == [
+        (presence.BOT, "did_1", presence.MQTT, True),
+        (presence.BOT, "did_1", presence.MQTT, False),
+        (presence.CLIENT, "res_1", presence.XMPP, True),
+    ]
+    unsubscribe()
+    presence.client_set_connected("res_1", presence.XMPP, False)
+    assert len(changes) == 3
+
+
+def test_with_status():
+    presence.clear()
+    bot = {"did": "did_1", "mqtt_connection": True}  # Stale value from old db
+    assert presence.with_status(presence.BOT, bot) == {
+        "did": "did_1",
+        "mqtt_connection": False,
+        "xmpp_connection": False,
+    }
+
+    presence.client_set_connected("res_1", presence.XMPP, True)
+    client = presence.with_status(presence.CLIENT, {"resource": "res_1"})
+    assert client["xmpp_connection"] and not client["mqtt_connection"]
+    presence.clear()
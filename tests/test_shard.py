@@ -0,0 +1,97 @@
+import asyncio
+import json
+from unittest import mock
+
+import pytest
+
+from bumper import presence
+from bumper.mqtt.server import MQTTServer
+from bumper.mqtt.shard import (
+    PUBLISH,
+    REVOKE,
+    ShardBus,
+    ShardedMQTTServer,
+    encode_frame,
+    read_frames,
+)
+from tests import HOST, MQTT_PORT
+
+TOPIC = "iot/atr/onBattery/bot_serial/ls1ok3/wC3g/j"
+
+
+async def test_frames():
+    reader = asyncio.StreamReader()
+    reader.feed_data(encode_frame(PUBLISH, TOPIC, "bot_serial@ls1ok3/wC3g", b"{}"))
+    reader.feed_data(encode_frame(PUBLISH, "töpic", "", b""))
+    reader.feed_data(encode_frame(PUBLISH, TOPIC, "", b"{}")[:5])  # Incomplete
+    reader.feed_eof()
+
+    frames = [frame async for frame in read_frames(reader)]
+    assert frames == [
+        (PUBLISH, TOPIC, "bot_serial@ls1ok3/wC3g", b"{}"),
+        (PUBLISH, "töpic", "", b""),
+    ]
+
+
+def test_requires_sqlite():
+    with mock.patch("bumper.db_backend", "tinydb"), pytest.raises(ValueError):
+        ShardedMQTTServer("127.0.0.1", 8883, 2)
+
+
+async def test_hub(tmp_path):
+    presence.clear()
+    with mock.patch("bumper.db_backend", "sqlite"):
+        hub = ShardedMQTTServer("127.0.0.1", 8883, 2)
+    server = await asyncio.start_unix_server(
+        hub._handle_worker, path=str(tmp_path / "bus.sock")
+    )
+    (reader_1, writer_1) = await asyncio.open_unix_connection(tmp_path / "bus.sock")
+    (reader_2, writer_2) = await asyncio.open_unix_connection(tmp_path / "bus.sock")
+    worker_1 = ShardBus(writer_1)
+    worker_2 = ShardBus(writer_2)
+
+    # Presence and counters are reported to the hub
+    worker_1.presence(presence.BOT, "bot_serial", True)
+    worker_1.stats({"sessions": {"connected": 1}})
+    worker_2.stats({"sessions": {"connected": 2}})
+    await asyncio.sleep(0.1)
+    assert presence.bot_is_connected("bot_serial", presence.MQTT)
+    assert hub.session_counts() == {"connected": 3}
+
+    # Publishes are routed to the other workers only
+    worker_1.publish(TOPIC, "bot_serial@ls1ok3/wC3g", json.dumps({}).encode())
+    frames = read_frames(reader_2)
+    assert await anext(frames) == (PUBLISH, TOPIC, "bot_serial@ls1ok3/wC3g", b"{}")
+    await asyncio.sleep(0.1)
+    assert hub.stats()["bus"]["routed"] == 1
+
+    # Revocations are sent to all workers
+    hub._revoke("signed_token")
+    assert await anext(frames) == (REVOKE, "", "", b"signed_token")
+    assert await anext(read_frames(reader_1)) == (REVOKE, "", "", b"signed_token")
+
+    # Connections of a stopped worker are gone
+    writer_1.close()
+    await writer_1.wait_closed()
+    await asyncio.sleep(0.1)
+    assert not presence.bot_is_connected("bot_serial")
+    assert hub.session_counts() == {"connected": 2}
+
+    writer_2.close()
+    await writer_2.wait_closed()
+    await asyncio.sleep(0.1)
+    server.close()
+    await server.wait_closed()
+
+
+async def test_workers_share_ports():
+    servers = [
+        MQTTServer(HOST, MQTT_PORT, bus=mock.Mock(), password_file="tests/passwd")
+        for _ in range(2)
+    ]
+    for server in servers:
+        await server.start()
+        assert server.state == "started"
+
+    for server in servers:
+        await server.shutdown()
@@ -6,7 +6,16 @@ from unittest import mock
 import pytest
 
 import bumper
-from bumper import HelperBot, WebServer, WebserverBinding, XMPPServer, db
+from bumper import (
+    HelperBot,
+    MQTTServer,
+    WebServer,
+    WebserverBinding,
+    XMPPServer,
+    bot_state,
+    db,
+    presence,
+)
 from bumper.models import ERR_TOKEN_INVALID, RETURN_API_SUCCESS
 from tests import HOST, MQTT_PORT, WEBSERVER_PORT
 
@@ -22,6 +31,9 @@ def async_return(result):
 
 
 def remove_existing_db():
+    db.close()
+    presence.clear()
+    bot_state.clear()
     if os.path.exists("tests/tmp.db"):
         os.remove("tests/tmp.db")  # Remove existing db
 
@@ -51,6 +63,69 @@ async def test_base(webserver_client):
     bumper.xmpp_server.disconnect()
 
 
+async def test_token_stats(webserver_client):
+    remove_existing_db()
+    db.user_add_token("testuser", "token_1234")
+
+    resp = await webserver_client.get("/stats/tokens")
+    assert resp.status == 200
+    jsonresp = json.loads(await resp.text())
+    assert jsonresp["tokens"] == 1
+    assert jsonresp["limit_per_user"] == bumper.token_limit_per_user
+
+
+async def test_bot_state(webserver_client):
+    remove_existing_db()
+    db.bot_add("sn_123", "did_123", "dev_123", "res_123", "eco-ng")
+    battery = {"header": {"ver": "0.0.1"}, "body": {"data": {"value": 80}}}
+    bot_state.update("did_123", "onBattery", "j", json.dumps(battery))
+
+    resp = await webserver_client.get("/bot/state")
+    assert resp.status == 200
+    jsonresp = json.loads(await resp.text())
+    assert jsonresp["bots"]["did_123"]["onBattery"]["payload"] == battery
+    assert jsonresp["stats"]["events"] == 1
+
+    # Getter is answered without asking the bot
+    postbody = {
+        "cmdName": "getBattery",
+        "payload": {"header": {}, "body": {"data": {}}},
+        "payloadType": "j",
+        "td": "q",
+        "toId": "did_123",
+        "toRes": "res_123",
+        "toType": "dev_123",
+    }
+    with mock.patch.object(bumper, "mqtt_helperbot", create=True) as helperbot:
+        resp = await webserver_client.post("/api/iot/devmanager.do", json=postbody)
+    helperbot.send_command.assert_not_called()
+    assert resp.status == 200
+    jsonresp = json.loads(await resp.text())
+    assert jsonresp["ret"] == "ok"
+    assert jsonresp["resp"]["body"] == {"code": 0, "msg": "ok", "data": {"value": 80}}
+
+
+async def test_mqtt_stats(webserver_client):
+    mqtt_server = MQTTServer(HOST, MQTT_PORT, password_file="tests/passwd")
+    with mock.patch.object(bumper, "mqtt_server", mqtt_server, create=True):
+        resp = await webserver_client.get("/stats/mqtt")
+    assert resp.status == 200
+    jsonresp = json.loads(await resp.text())
+    assert jsonresp["sessions"] == {}
+    assert jsonresp["dedup"] == {}
+
+
+async def test_db_snapshot(webserver_client, tmp_path):
+    remove_existing_db()
+    with mock.patch("bumper.data_dir", str(tmp_path)):
+        resp = await webserver_client.get("/db/snapshot?compact=true")
+    assert resp.status == 200
+    jsonresp = json.loads(await resp.text())
+    assert jsonresp["compacted"] is True
+    assert os.path.dirname(jsonresp["path"]) == str(tmp_path / "backups")
+    assert "loop_blocked_ms" in jsonresp
+
+
 @pytest.mark.usefixtures("helper_bot")
 async def test_restartService(webserver_client):
     remove_existing_db()
@@ -693,6 +768,7 @@ async def test_appsvr_api(webserver_client):
     assert jsonresp["ret"] == "ok"
 
     db.bot_add("sn_1234", "did_1234", "ls1ok3", "res_1234", "eco-ng")
+    presence.bot_set_connected("did_1234", presence.MQTT, True)
 
     # Test again with bot added
     resp = await webserver_client.post("/api/appsvr/app.do", json=postbody)
@@ -700,12 +776,18 @@ async def test_appsvr_api(webserver_client):
     text = await resp.text()
     jsonresp = json.loads(text)
     assert jsonresp["ret"] == "ok"
+    device = jsonresp["devices"][0]
+    assert device["mqtt_connection"]
+    assert not device["xmpp_connection"]
+    assert device["status"] == 1
+
+    presence.bot_set_connected("did_1234", presence.MQTT, False)
 
 
 async def test_lg_logs(webserver_client, helper_bot: HelperBot):
     remove_existing_db()
     db.bot_add("sn_1234", "did_1234", "ls1ok3", "res_1234", "eco-ng")
-    db.bot_set_mqtt("did_1234", True)
+    presence.bot_set_connected("did_1234", presence.MQTT, True)
     confserver = create_webserver()
 
     # Test return get status
@@ -781,7 +863,7 @@ async def test_devmgr(webserver_client, helper_bot: HelperBot):
 
     # Test BotCommand
     db.bot_add("sn_1234", "did_1234", "dev_1234", "res_1234", "eco-ng")
-    db.bot_set_mqtt("did_1234", True)
+    presence.bot_set_connected("did_1234", presence.MQTT, True)
     postbody = {"toId": "did_1234"}
 
     # Test return get status
@@ -834,7 +916,7 @@ async def test_dim_devmanager(webserver_client, helper_bot: HelperBot):
 
     # Test BotCommand
     db.bot_add("sn_1234", "did_1234", "dev_1234", "res_1234", "eco-ng")
-    db.bot_set_mqtt("did_1234", True)
+    presence.bot_set_connected("did_1234", presence.MQTT, True)
     postbody = {"toId": "did_1234"}
 
     # Test return get status
@@ -865,7 +947,7 @@ async def test_dim_devmanager(webserver_client, helper_bot: HelperBot):
     assert test_resp["errno"] == "timeout"
 
     # Set bot not on mqtt
-    db.bot_set_mqtt("did_1234", False)
+    presence.bot_set_connected("did_1234", presence.MQTT, False)
     helper_bot.send_command = mock.MagicMock(
         return_value=async_return(command_getstatus_resp)
     )